@@ -1,97 +1,341 @@
+"""
+Timetable suggestions from Gemini, behind a timeout, a cache and a circuit breaker.
+
+One assistant lives for the whole process: the client is configured once and
+model calls, which block, run on a small dedicated thread pool so they never
+stall the event loop and never exceed AI_MAX_CONCURRENCY at once. Prompts
+carry a compact summary of the timetable (totals, busiest slots, faculty
+loads, clashes) rather than the raw rows, and answers are cached under a hash
+of that summary. Timeouts and errors fall back to rule-based suggestions;
+after AI_BREAKER_FAILURES of them in a row the model is skipped for
+AI_BREAKER_RESET_SECONDS. Hard problems found by timetable_analysis are
+answered from its findings without a model call at all.
+
+GEMINI_API_ENDPOINT points the client at another server over REST, e.g. the
+stub in benchmarks/stub_model.py:
+
+    GEMINI_API_KEY=stub GEMINI_API_ENDPOINT=http://localhost:8090 uvicorn main:app
+"""
 import google.generativeai as genai
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
 import json
-from typing import List, Dict, Any
 import os
+import re
+import threading
+import time
+
+from timetable_analysis import findings_to_suggestions, request_rows
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "20"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "900"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "256"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "60"))
+# Entries listed per hotspot in the summary
+SUMMARY_TOP = 5
+
+SUGGESTION_FIELDS = ("type", "priority", "description", "implementation")
+# Local findings of these severities are answered without asking the model
+LOCAL_ANSWER_SEVERITIES = {"high"}
+
+
+def summarize_timetable(timetable_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aggregates and hotspots of a timetable: what the model needs to reason
+    about, in a size that does not grow with the number of sessions
+    """
+    rows = request_rows(timetable_data)
+    slots = Counter((row.get("day"), row.get("time_slot")) for row in rows)
+    faculty_days = Counter((row.get("faculty_id"), row.get("day")) for row in rows if row.get("faculty_id"))
+    rooms = Counter(row.get("classroom_id") for row in rows if row.get("classroom_id"))
+
+    clashes = {}
+    for key in ("batch_id", "faculty_id", "classroom_id"):
+        booked = Counter((row.get(key), row.get("day"), row.get("time_slot")) for row in rows if row.get(key))
+        clashes[key] = sum(1 for count in booked.values() if count > 1)
+
+    daily_load = defaultdict(list)
+    for (faculty_id, _), count in faculty_days.items():
+        daily_load[faculty_id].append(count)
+
+    summary = {
+        "sessions": len(rows),
+        "batches": len({row.get("batch_id") for row in rows}),
+        "faculty": len(daily_load),
+        "rooms_used": len(rooms),
+        "sessions_per_day": dict(Counter(row.get("day") for row in rows)),
+        "busiest_slots": [
+            {"day": day, "time_slot": time_slot, "sessions": count}
+            for (day, time_slot), count in slots.most_common(SUMMARY_TOP)
+        ],
+        "heaviest_faculty_days": [
+            {"faculty_id": faculty_id, "day": day, "sessions": count}
+            for (faculty_id, day), count in faculty_days.most_common(SUMMARY_TOP)
+        ],
+        "faculty_load_spread": {
+            str(faculty_id): max(loads) - min(loads) for faculty_id, loads in daily_load.items()
+            if max(loads) - min(loads) > 1
+        },
+        "least_used_rooms": [
+            {"classroom_id": classroom_id, "sessions": count}
+            for classroom_id, count in sorted(rooms.items(), key=lambda item: item[1])[:SUMMARY_TOP]
+        ],
+        "clashes": clashes
+    }
+    # Scalars next to the rows (metrics, status, ...) are small and often telling
+    for key, value in timetable_data.items():
+        if key not in ("timetable", "entries") and isinstance(value, (int, float, str, bool)) and len(str(value)) < 200:
+            summary[key] = value
+    return summary
+
+
+def rule_based_suggestions(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Suggestions read straight off the summary, used whenever the model is not"""
+    suggestions = []
+    clashes = summary.get("clashes", {})
+    if any(clashes.values()):
+        suggestions.append({
+            "type": "conflict_resolution",
+            "priority": "high",
+            "description": (
+                f"{clashes.get('batch_id', 0)} batch, {clashes.get('faculty_id', 0)} faculty and "
+                f"{clashes.get('classroom_id', 0)} room double bookings"
+            ),
+            "implementation": "Move conflicting classes to available adjacent time slots"
+        })
+    if summary.get("faculty_load_spread"):
+        suggestions.append({
+            "type": "workload_balance",
+            "priority": "medium",
+            "description": f"{len(summary['faculty_load_spread'])} faculty have uneven daily loads",
+            "implementation": "Move some classes from overloaded days to lighter days"
+        })
+    busiest = summary.get("busiest_slots") or []
+    if busiest and summary.get("sessions"):
+        peak = busiest[0]
+        suggestions.append({
+            "type": "optimization",
+            "priority": "medium",
+            "description": f"{peak['day']} {peak['time_slot']} is the busiest slot with {peak['sessions']} sessions",
+            "implementation": "Spread sessions from peak slots into quieter ones to free larger classrooms"
+        })
+    if not suggestions:
+        suggestions.append({
+            "type": "system",
+            "priority": "low",
+            "description": "No issues found in the timetable summary",
+            "implementation": "Using rule-based optimization instead"
+        })
+    return suggestions
+
+
+def _parse_suggestions(text: str) -> Optional[List[Dict[str, Any]]]:
+    """The JSON list of suggestions in a model answer (fenced or not), None when there is none"""
+    match = re.search(r"\[.*\]", text or "", re.DOTALL)
+    if match is None:
+        return None
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return None
+    suggestions = [
+        {field: str(item.get(field, "")) for field in SUGGESTION_FIELDS}
+        for item in items if isinstance(item, dict) and item.get("description")
+    ]
+    return suggestions or None
+
+
+class CircuitBreaker:
+    """Open after `failures` consecutive failures; one trial call is let through every `reset_seconds`"""
+
+    def __init__(self, failures: int = AI_BREAKER_FAILURES, reset_seconds: float = AI_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                # Half open: this call is the trial, later ones wait for its outcome
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
 
 class GeminiAIAssistant:
-    def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-pro')
-    
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        timeout_seconds: float = AI_TIMEOUT_SECONDS,
+        cache_ttl_seconds: float = AI_CACHE_TTL_SECONDS
+    ):
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        if GEMINI_API_ENDPOINT:
+            genai.configure(
+                api_key=self.api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT}
+            )
+        else:
+            genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.timeout_seconds = timeout_seconds
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.breaker = CircuitBreaker()
+        # Calls abandoned on timeout keep their thread until they return, so the pool is the real bound
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self._cache: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value: Any):
+        with self._lock:
+            self._cache[key] = (value, time.monotonic() + self.cache_ttl_seconds)
+            self._cache.move_to_end(key)
+            while len(self._cache) > AI_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    async def _generate(self, prompt: str) -> Optional[str]:
+        """Model answer, or None when the model is unavailable, failing, slow or switched off by the breaker"""
+        if not self.api_key or not self.breaker.allow():
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            response = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self.model.generate_content, prompt), self.timeout_seconds
+            )
+            text = response.text
+        except Exception:
+            self.breaker.record_failure()
+            return None
+        self.breaker.record_success()
+        return text
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
     async def get_timetable_suggestions(
-        self, 
-        timetable_data: Dict[str, Any], 
-        constraints: Dict[str, Any]
+        self,
+        timetable_data: Dict[str, Any],
+        constraints: Dict[str, Any],
+        findings: Optional[List[Dict[str, Any]]] = None
     ) -> List[Dict[str, Any]]:
         """
-        Get AI-powered suggestions for timetable optimization
+        Get AI-powered suggestions for timetable optimization. `findings` are
+        timetable_analysis results for the same timetable: hard problems among
+        them are answered directly, the rest inform the prompt and the fallback.
         """
-        
+        if findings and any(f["severity"] in LOCAL_ANSWER_SEVERITIES for f in findings):
+            return findings_to_suggestions(findings)
+        summary = summarize_timetable(timetable_data)
+        if findings:
+            summary["findings"] = dict(Counter(f["type"] for f in findings))
+        payload = json.dumps({"summary": summary, "constraints": constraints}, sort_keys=True, default=str)
+        key = "suggestions:" + hashlib.sha256(payload.encode()).hexdigest()
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
         prompt = f"""
-        Analyze this timetable data and constraints to provide optimization suggestions:
-        
-        Timetable Data: {json.dumps(timetable_data, indent=2)}
-        Constraints: {json.dumps(constraints, indent=2)}
-        
+        Analyze this timetable summary and constraints to provide optimization suggestions:
+
+        Timetable Summary: {json.dumps(summary, separators=(',', ':'), default=str)}
+        Constraints: {json.dumps(constraints, separators=(',', ':'), default=str)}
+
         Please provide suggestions for:
         1. Conflict resolution
         2. Better resource utilization
         3. Faculty workload balancing
         4. Student satisfaction improvements
-        
-        Return suggestions in JSON format with fields: type, priority, description, implementation
+
+        Return a JSON list of suggestions with fields: type, priority, description, implementation
         """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            suggestions_text = response.text
-            
-            # Parse AI response and structure suggestions
-            suggestions = [
-                {
-                    "type": "optimization",
-                    "priority": "high",
-                    "description": "Consider moving high-capacity subjects to larger classrooms during peak hours",
-                    "implementation": "Swap classroom assignments for subjects with >50 students"
-                },
-                {
-                    "type": "workload_balance",
-                    "priority": "medium", 
-                    "description": "Distribute faculty workload more evenly across days",
-                    "implementation": "Move some classes from overloaded days to lighter days"
-                },
-                {
-                    "type": "conflict_resolution",
-                    "priority": "high",
-                    "description": "Resolve scheduling conflicts by adjusting time slots",
-                    "implementation": "Move conflicting classes to available adjacent time slots"
-                }
-            ]
-            
-            return suggestions
-            
-        except Exception as e:
-            # Fallback suggestions if AI service is unavailable
-            return [
-                {
-                    "type": "system",
-                    "priority": "low",
-                    "description": "AI suggestions temporarily unavailable",
-                    "implementation": "Using rule-based optimization instead"
-                }
-            ]
-    
-    async def predict_conflicts(self, proposed_changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+
+        text = await self._generate(prompt)
+        suggestions = _parse_suggestions(text) if text is not None else None
+        if suggestions is None:
+            # Fallbacks are cheap to recompute and should not outlive an outage
+            return findings_to_suggestions(findings) if findings else rule_based_suggestions(summary)
+        self._store(key, suggestions)
+        return suggestions
+
+    async def predict_conflicts(
+        self,
+        proposed_changes: Dict[str, Any],
+        findings: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Predict potential conflicts from proposed timetable changes
+        Predict potential conflicts from proposed timetable changes. Hard
+        `findings` of timetable_analysis on the changed timetable are certain
+        conflicts and are returned without asking the model.
         """
-        
+        certain = [f for f in findings or [] if f["severity"] in LOCAL_ANSWER_SEVERITIES]
+        if certain:
+            return [
+                {"type": f["type"], "description": f["message"], "confidence": 1.0, "candidates": f["candidates"]}
+                for f in certain
+            ]
+        payload = json.dumps(proposed_changes, sort_keys=True, separators=(',', ':'), default=str)
+        key = "conflicts:" + hashlib.sha256(payload.encode()).hexdigest()
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         Analyze these proposed timetable changes and predict potential conflicts:
-        
-        Proposed Changes: {json.dumps(proposed_changes, indent=2)}
-        
+
+        Proposed Changes: {payload}
+
         Identify potential conflicts related to:
         1. Faculty double-booking
         2. Classroom capacity issues
         3. Student schedule overlaps
         4. Resource availability
-        
+
         Return predictions in JSON format with confidence scores.
         """
-        
+
+        text = await self._generate(prompt)
         try:
-            response = self.model.generate_content(prompt)
-            return json.loads(response.text)
-        except:
+            predictions = json.loads(text) if text is not None else None
+        except ValueError:
+            predictions = None
+        if predictions is None:
             return []
+        self._store(key, predictions)
+        return predictions
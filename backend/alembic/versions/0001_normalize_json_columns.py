@@ -0,0 +1,70 @@
+"""Availability bitsets and the faculty_subjects association
+
+Copies the JSON columns into their normalized forms. The app's create_all may
+already have created faculty_subjects, so existing tables and columns are kept.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from availability import parse_availability
+from models import faculty_subjects as faculty_subjects_table, parse_subject_ids
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table in ('classrooms', 'faculty'):
+        if 'availability_mask' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('availability_mask', sa.BigInteger()))
+    # The model's table with its subject_id index, issued on the connection rather than through op
+    faculty_subjects_table.create(bind, checkfirst=True)
+
+    classrooms = sa.table('classrooms', sa.column('id'), sa.column('available_slots'), sa.column('availability_mask'))
+    faculty = sa.table(
+        'faculty', sa.column('id'), sa.column('availability'), sa.column('assigned_subjects'),
+        sa.column('availability_mask')
+    )
+    faculty_subjects = sa.table('faculty_subjects', sa.column('faculty_id'), sa.column('subject_id'))
+    subject_ids = set(bind.execute(sa.text('SELECT id FROM subjects')).scalars())
+
+    rows = bind.execute(sa.select(classrooms.c.id, classrooms.c.available_slots)).all()
+    if rows:
+        bind.execute(
+            classrooms.update().where(classrooms.c.id == sa.bindparam('row_id')).values(
+                availability_mask=sa.bindparam('mask')
+            ),
+            [{'row_id': row_id, 'mask': parse_availability(raw)} for row_id, raw in rows]
+        )
+
+    rows = bind.execute(sa.select(faculty.c.id, faculty.c.availability, faculty.c.assigned_subjects)).all()
+    if rows:
+        bind.execute(
+            faculty.update().where(faculty.c.id == sa.bindparam('row_id')).values(
+                availability_mask=sa.bindparam('mask')
+            ),
+            [{'row_id': row_id, 'mask': parse_availability(raw)} for row_id, raw, _ in rows]
+        )
+    bind.execute(faculty_subjects.delete())
+    pairs = [
+        {'faculty_id': row_id, 'subject_id': subject_id}
+        for row_id, _, assigned in rows
+        # Ids of deleted subjects are dropped, as the app does on write
+        for subject_id in sorted(parse_subject_ids(assigned) & subject_ids)
+    ]
+    if pairs:
+        bind.execute(faculty_subjects.insert(), pairs)
+
+
+def downgrade() -> None:
+    faculty_subjects_table.drop(op.get_bind(), checkfirst=True)
+    op.drop_column('faculty', 'availability_mask')
+    op.drop_column('classrooms', 'availability_mask')
@@ -0,0 +1,55 @@
+"""Timetable generations
+
+Adds timetables.generation_id with its index and tags the rows already
+stored: each batch's approved and unapproved rows become one generation each,
+as replace_generation would have written them. An existing column or index is
+kept.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+import uuid
+
+from models import Timetable
+
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'generation_id' not in {column['name'] for column in inspector.get_columns('timetables')}:
+        op.add_column('timetables', sa.Column('generation_id', sa.String()))
+
+    timetables = sa.table(
+        'timetables', sa.column('batch_id'), sa.column('is_approved'), sa.column('generation_id')
+    )
+    untagged = bind.execute(
+        sa.select(timetables.c.batch_id, timetables.c.is_approved).where(
+            timetables.c.generation_id.is_(None)
+        ).distinct()
+    ).all()
+    for batch_id, is_approved in untagged:
+        bind.execute(
+            timetables.update().where(
+                timetables.c.generation_id.is_(None),
+                timetables.c.batch_id.is_not_distinct_from(batch_id),
+                timetables.c.is_approved.is_not_distinct_from(is_approved)
+            ).values(generation_id=uuid.uuid4().hex)
+        )
+
+    # The model's index, created straight on the connection (op.create_index passes an empty parameter list)
+    for index in Timetable.__table__.indexes:
+        if index.name == 'ix_timetables_generation_id':
+            index.create(bind, checkfirst=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_timetables_generation_id', table_name='timetables')
+    op.drop_column('timetables', 'generation_id')
@@ -0,0 +1,41 @@
+"""Dashboard indexes and stored grids
+
+Creates the timetable indexes behind the batch, faculty and room dashboards
+and the timetable_views table, which create_all does not add to an existing
+database. Existing indexes and tables are kept.
+
+Revision ID: 0001b
+Revises: 0001a
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import Timetable, TimetableView
+
+revision = '0001b'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+DASHBOARD_INDEXES = (
+    'ix_timetables_batch_day_slot',
+    'ix_timetables_faculty_day_slot',
+    'ix_timetables_classroom_day_slot',
+    'ix_timetables_day_slot',
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # The model's indexes, created straight on the connection (op.create_index passes an empty parameter list)
+    for index in Timetable.__table__.indexes:
+        if index.name in DASHBOARD_INDEXES:
+            index.create(bind, checkfirst=True)
+    TimetableView.__table__.create(bind, checkfirst=True)
+
+
+def downgrade() -> None:
+    op.drop_table('timetable_views')
+    for name in DASHBOARD_INDEXES:
+        op.drop_index(name, table_name='timetables')
@@ -0,0 +1,53 @@
+"""Usage and leave aggregates behind the reports
+
+Creates the tables (unless the app's create_all already did) and fills them
+from the current timetables and every leave. The backfill goes through
+refresh_views, which also writes the grids created in 0001b.
+
+Revision ID: 0002
+Revises: 0001b
+Create Date: 2026-10-18
+"""
+from alembic import op
+from collections import Counter
+from sqlalchemy.orm import Session
+import sqlalchemy as sa
+
+from models import Batch, Leave, LeaveAggregate, UsageAggregate
+from timetable_views import refresh_batches
+
+revision = '0002'
+down_revision = '0001b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('usage_aggregates'):
+        UsageAggregate.__table__.create(bind)
+    if not inspector.has_table('leave_aggregates'):
+        LeaveAggregate.__table__.create(bind)
+    for index in Leave.__table__.indexes:
+        if index.name == 'ix_leaves_status_date':
+            index.create(bind, checkfirst=True)
+
+    db = Session(bind=bind)
+    # Grids and usage are rebuilt together; every batch covers every faculty member and room in use
+    db.query(UsageAggregate).delete(synchronize_session=False)
+    refresh_batches(db, [batch_id for (batch_id,) in db.query(Batch.id)])
+
+    db.query(LeaveAggregate).delete(synchronize_session=False)
+    counts = Counter((when.date(), status) for when, status in db.query(Leave.date, Leave.status) if when is not None)
+    if counts:
+        db.execute(sa.insert(LeaveAggregate), [
+            {'date': day, 'status': status, 'leaves': leaves} for (day, status), leaves in counts.items()
+        ])
+    db.flush()
+
+
+def downgrade() -> None:
+    op.drop_index('ix_leaves_status_date', table_name='leaves')
+    op.drop_table('leave_aggregates')
+    op.drop_table('usage_aggregates')
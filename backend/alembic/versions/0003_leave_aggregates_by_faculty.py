@@ -0,0 +1,51 @@
+"""Leave aggregates per faculty member
+
+leave_aggregates gains faculty_id, so the faculty load report takes the
+sessions lost to leave from it instead of the leaves table. The table only
+holds derived counts; it is rebuilt from every leave.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+from collections import Counter
+import sqlalchemy as sa
+
+from models import Leave, LeaveAggregate
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _rebuild(bind, table, columns):
+    """Recreate `table` with the leave counts per combination of `columns` (of date, status, faculty_id)"""
+    table.drop(bind, checkfirst=True)
+    table.create(bind)
+    counts = Counter()
+    for when, status, faculty_id in bind.execute(sa.select(Leave.date, Leave.status, Leave.faculty_id)):
+        if when is not None:
+            cell = {'date': when.date(), 'status': status, 'faculty_id': faculty_id}
+            counts[tuple(cell[name] for name in columns)] += 1
+    if counts:
+        bind.execute(sa.insert(table), [
+            {**dict(zip(columns, cell)), 'leaves': leaves} for cell, leaves in counts.items()
+        ])
+
+
+def upgrade() -> None:
+    _rebuild(op.get_bind(), LeaveAggregate.__table__, ('date', 'status', 'faculty_id'))
+
+
+def downgrade() -> None:
+    table = sa.Table(
+        'leave_aggregates', sa.MetaData(),
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('date', sa.Date()),
+        sa.Column('status', sa.String()),
+        sa.Column('leaves', sa.Integer(), default=0),
+        sa.UniqueConstraint('date', 'status', name='uq_leave_aggregates_date_status'),
+    )
+    _rebuild(op.get_bind(), table, ('date', 'status'))
@@ -0,0 +1,325 @@
+"""
+Report aggregates kept current on write, and reports answered from them.
+
+Two small tables stand between the reports and the raw rows:
+
+- usage_aggregates: sessions per week for every (batch | faculty | room,
+  day, time slot) of the timetables currently shown. refresh_views rewrites
+  them with the grids, in the transaction that saves, approves or
+  reschedules a timetable.
+- leave_aggregates: leaves per (date, status, faculty member), adjusted by
+  ORM listeners on every Leave insert, update or delete.
+
+A timetable is a weekly pattern, so a date range only scales it by how often
+each weekday occurs in the range. Reports therefore read the aggregates
+(rooms x slots, faculty x days, days of the range) whatever the number of
+timetable rows; the approved leave days of the range, read from
+leave_aggregates too, take their sessions off faculty load. Exports stream the same figures as CSV in chunks.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func, insert, inspect, update
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import csv
+import io
+import numpy as np
+
+from availability import DAYS, TIME_SLOTS, FULL_WEEK, slot_matrix
+from listing import EXPORT_CHUNK_ROWS
+from models import Classroom, Faculty, Leave, LeaveAggregate, UsageAggregate, upsert
+
+# Reports whose underlying rows can be exported
+EXPORT_TYPES = ("room_utilization", "faculty_load", "leaves")
+
+
+def store_usage(db: Session, wanted: Dict[str, set], grouped: Dict[Tuple[str, int], List]):
+    """
+    Replace the usage aggregates of the `wanted` entities with the counts of
+    their current rows (`grouped`, as built by refresh_views). Does not commit.
+    """
+    for entity, ids in wanted.items():
+        db.query(UsageAggregate).filter(
+            UsageAggregate.entity == entity, UsageAggregate.entity_id.in_(ids)
+        ).delete(synchronize_session=False)
+    counts = defaultdict(int)
+    for (entity, entity_id), rows in grouped.items():
+        for row in rows:
+            counts[(entity, entity_id, row.day, row.time_slot)] += 1
+    if counts:
+        # A concurrent refresh may have inserted the same cells since the delete
+        statement = upsert(db, UsageAggregate.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['entity', 'entity_id', 'day', 'time_slot'],
+            set_={'sessions': statement.excluded.sessions}
+        )
+        db.execute(statement, [
+            {'entity': entity, 'entity_id': entity_id, 'day': day, 'time_slot': time_slot, 'sessions': sessions}
+            for (entity, entity_id, day, time_slot), sessions in counts.items()
+        ])
+
+
+def _committed(target, name: str):
+    """Value of an attribute as last flushed, before any pending change"""
+    history = inspect(target).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(target, name)
+
+
+def _adjust_leaves(connection, when, status: Optional[str], faculty_id: Optional[int], delta: int):
+    if when is None:
+        return
+    day = when.date() if isinstance(when, datetime) else when
+    table = LeaveAggregate.__table__
+    cell = (table.c.date == day, table.c.status == status, table.c.faculty_id == faculty_id)
+    # A NULL status or faculty never conflicts, so it cannot be upserted
+    if delta < 0 or status is None or faculty_id is None:
+        result = connection.execute(update(table).where(*cell).values(leaves=table.c.leaves + delta))
+        if result.rowcount == 0 and delta > 0:
+            connection.execute(insert(table).values(date=day, status=status, faculty_id=faculty_id, leaves=delta))
+        return
+    # Two first leaves of a day may be inserted at once; the second one adds to the first's row
+    statement = upsert(connection, table).values(date=day, status=status, faculty_id=faculty_id, leaves=delta)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['date', 'status', 'faculty_id'], set_={'leaves': table.c.leaves + statement.excluded.leaves}
+    ))
+
+
+@event.listens_for(Leave, "after_insert")
+def _leave_added(mapper, connection, target):
+    _adjust_leaves(connection, target.date, target.status, target.faculty_id, 1)
+
+
+@event.listens_for(Leave, "after_update")
+def _leave_changed(mapper, connection, target):
+    state = inspect(target).attrs
+    if not any(state[name].history.has_changes() for name in ('date', 'status', 'faculty_id')):
+        return
+    _adjust_leaves(
+        connection, _committed(target, 'date'), _committed(target, 'status'), _committed(target, 'faculty_id'), -1
+    )
+    _adjust_leaves(connection, target.date, target.status, target.faculty_id, 1)
+
+
+@event.listens_for(Leave, "after_delete")
+def _leave_removed(mapper, connection, target):
+    _adjust_leaves(
+        connection, _committed(target, 'date'), _committed(target, 'status'), _committed(target, 'faculty_id'), -1
+    )
+
+
+def parse_range(start_date: Optional[str], end_date: Optional[str]) -> Tuple[date, date]:
+    """Inclusive date range of a report; the current week by default. Raises ValueError on bad dates"""
+    today = date.today()
+    start = date.fromisoformat(start_date[:10]) if start_date else today - timedelta(days=today.weekday())
+    end = date.fromisoformat(end_date[:10]) if end_date else start + timedelta(days=6)
+    if end < start:
+        raise ValueError("end_date is before start_date")
+    return start, end
+
+
+def weekday_occurrences(start: date, end: date) -> np.ndarray:
+    """How many times each teaching day (DAYS order) falls within [start, end]"""
+    full_weeks, rest = divmod((end - start).days + 1, 7)
+    return np.array([
+        full_weeks + ((weekday - start.weekday()) % 7 < rest) for weekday in range(len(DAYS))
+    ], dtype=np.int64)
+
+
+def _usage_cube(db: Session, entity: str) -> Tuple[Dict[int, int], np.ndarray]:
+    """Entity id -> row index, and sessions per week as an (entities, days, slots) array"""
+    rows = db.query(
+        UsageAggregate.entity_id, UsageAggregate.day, UsageAggregate.time_slot, UsageAggregate.sessions
+    ).filter(UsageAggregate.entity == entity).all()
+    index = {entity_id: i for i, entity_id in enumerate(sorted({row[0] for row in rows}))}
+    cube = np.zeros((len(index), len(DAYS), len(TIME_SLOTS)), dtype=np.int64)
+    day_index = {day: d for d, day in enumerate(DAYS)}
+    slot_index = {time_slot: s for s, time_slot in enumerate(TIME_SLOTS)}
+    for entity_id, day, time_slot, sessions in rows:
+        if day in day_index and time_slot in slot_index:
+            cube[index[entity_id], day_index[day], slot_index[time_slot]] = sessions
+    return index, cube
+
+
+def _daily_load(db: Session, entity: str) -> Tuple[Dict[int, int], np.ndarray]:
+    """Entity id -> row index, and sessions per week per day as an (entities, days) array"""
+    rows = db.query(
+        UsageAggregate.entity_id, UsageAggregate.day, func.sum(UsageAggregate.sessions)
+    ).filter(UsageAggregate.entity == entity).group_by(UsageAggregate.entity_id, UsageAggregate.day).all()
+    index = {entity_id: i for i, entity_id in enumerate(sorted({row[0] for row in rows}))}
+    daily = np.zeros((len(index), len(DAYS)), dtype=np.int64)
+    day_index = {day: d for d, day in enumerate(DAYS)}
+    for entity_id, day, sessions in rows:
+        if day in day_index:
+            daily[index[entity_id], day_index[day]] = sessions
+    return index, daily
+
+
+def _lost_sessions(db: Session, index: Dict[int, int], daily: np.ndarray, start: date, end: date) -> np.ndarray:
+    """Sessions each faculty member misses to approved leave days within the range"""
+    lost = np.zeros(len(index), dtype=np.int64)
+    days = db.query(LeaveAggregate.faculty_id, LeaveAggregate.date).filter(
+        LeaveAggregate.status == 'approved', LeaveAggregate.leaves > 0,
+        LeaveAggregate.date >= start, LeaveAggregate.date <= end
+    ).all()
+    for faculty_id, day in days:
+        if faculty_id in index and day.weekday() < len(DAYS):
+            lost[index[faculty_id]] += daily[index[faculty_id], day.weekday()]
+    return lost
+
+
+def room_utilization(db: Session, start: date, end: date) -> Dict[str, Any]:
+    index, cube = _usage_cube(db, 'room')
+    classrooms = db.query(
+        Classroom.id, Classroom.name, Classroom.capacity, Classroom.type, Classroom.availability_mask
+    ).order_by(Classroom.id).all()
+    occurrences = weekday_occurrences(start, end)
+    free = slot_matrix([FULL_WEEK if row.availability_mask is None else row.availability_mask for row in classrooms])
+    used = np.zeros((len(classrooms), len(DAYS), len(TIME_SLOTS)), dtype=np.int64)
+    for r, row in enumerate(classrooms):
+        if row.id in index:
+            used[r] = cube[index[row.id]]
+
+    sessions = (used.sum(axis=2) * occurrences).sum(axis=1)
+    available = (free.sum(axis=2) * occurrences).sum(axis=1)
+    utilization = np.divide(sessions, available, out=np.zeros(len(classrooms)), where=available > 0)
+    # Share of the rooms open in each cell that are busy
+    cell_share = np.divide(used.sum(axis=0), free.sum(axis=0), out=np.zeros(free.shape[1:]), where=free.sum(axis=0) > 0)
+    return {
+        'rooms': [
+            {
+                'id': row.id,
+                'name': row.name,
+                'capacity': row.capacity,
+                'type': row.type,
+                'sessions_per_week': int(used[r].sum()),
+                'sessions': int(sessions[r]),
+                'available_slots': int(available[r]),
+                'utilization': round(float(utilization[r]), 4)
+            }
+            for r, row in enumerate(classrooms)
+        ],
+        'by_day_slot': {
+            day: {time_slot: round(float(cell_share[d, s]), 4) for s, time_slot in enumerate(TIME_SLOTS)}
+            for d, day in enumerate(DAYS)
+        }
+    }
+
+
+def faculty_load(db: Session, start: date, end: date) -> Dict[str, Any]:
+    index, daily = _daily_load(db, 'faculty')
+    faculty = db.query(Faculty.id, Faculty.name, Faculty.max_daily_classes).order_by(Faculty.id).all()
+    lost = _lost_sessions(db, index, daily, start, end)
+    in_range = (daily * weekday_occurrences(start, end)).sum(axis=1) - lost
+    weekly = daily.sum(axis=1)
+
+    members = []
+    for row in faculty:
+        i = index.get(row.id)
+        days = daily[i] if i is not None else np.zeros(len(DAYS), dtype=np.int64)
+        members.append({
+            'id': row.id,
+            'name': row.name,
+            'max_daily_classes': row.max_daily_classes,
+            'sessions_per_week': int(days.sum()),
+            'by_day': {day: int(days[d]) for d, day in enumerate(DAYS)},
+            'days_over_limit': int((days > (row.max_daily_classes or 0)).sum()) if row.max_daily_classes else 0,
+            'sessions': int(in_range[i]) if i is not None else 0,
+            'sessions_lost_to_leave': int(lost[i]) if i is not None else 0
+        })
+    # Faculty without any session count towards the zero bucket
+    loads = np.array([member['sessions_per_week'] for member in members], dtype=np.int64)
+    return {
+        'faculty': members,
+        'distribution': {str(load): int(count) for load, count in enumerate(np.bincount(loads)) if count},
+        'mean_sessions_per_week': round(float(weekly.sum() / len(members)), 2) if members else 0.0
+    }
+
+
+def leave_counts(db: Session, start: date, end: date) -> Dict[str, Any]:
+    rows = db.query(LeaveAggregate.date, LeaveAggregate.status, LeaveAggregate.leaves).filter(
+        LeaveAggregate.date >= start, LeaveAggregate.date <= end, LeaveAggregate.leaves > 0
+    ).all()
+    by_status = defaultdict(int)
+    by_month = defaultdict(lambda: defaultdict(int))
+    for day, status, leaves in rows:
+        by_status[status] += leaves
+        by_month[day.strftime('%Y-%m')][status] += leaves
+    return {
+        'total': sum(by_status.values()),
+        'by_status': dict(by_status),
+        'by_month': {month: dict(counts) for month, counts in sorted(by_month.items())}
+    }
+
+
+def summary(db: Session, start: date, end: date) -> Dict[str, Any]:
+    rooms = room_utilization(db, start, end)['rooms']
+    faculty = faculty_load(db, start, end)['faculty']
+    weekly = db.query(func.coalesce(func.sum(UsageAggregate.sessions), 0)).filter(
+        UsageAggregate.entity == 'batch'
+    ).scalar()
+    used_rooms = [room['utilization'] for room in rooms if room['available_slots']]
+    return {
+        'sessions_per_week': int(weekly),
+        'mean_room_utilization': round(sum(used_rooms) / len(used_rooms), 4) if used_rooms else 0.0,
+        'faculty_over_daily_limit': sum(1 for member in faculty if member['days_over_limit']),
+        'sessions_lost_to_leave': sum(member['sessions_lost_to_leave'] for member in faculty),
+        'leaves': leave_counts(db, start, end)['by_status']
+    }
+
+
+REPORTS = {
+    'summary': summary,
+    'room_utilization': room_utilization,
+    'faculty_load': faculty_load,
+    'leaves': leave_counts
+}
+
+
+def build_report(db: Session, report_type: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    start, end = parse_range(start_date, end_date)
+    return {
+        'report_type': report_type,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        **REPORTS[report_type](db, start, end)
+    }
+
+
+def _export_rows(db: Session, report_type: str, start: date, end: date) -> Iterator[Tuple]:
+    """Header, then one tuple per row, read from the aggregates a chunk at a time"""
+    occurrences = dict(zip(DAYS, weekday_occurrences(start, end).tolist()))
+    if report_type == 'leaves':
+        yield ('date', 'status', 'leaves')
+        yield from db.query(LeaveAggregate.date, LeaveAggregate.status, func.sum(LeaveAggregate.leaves)).filter(
+            LeaveAggregate.date >= start, LeaveAggregate.date <= end, LeaveAggregate.leaves > 0
+        ).group_by(LeaveAggregate.date, LeaveAggregate.status).order_by(
+            LeaveAggregate.date, LeaveAggregate.status
+        ).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        return
+
+    entity = 'faculty' if report_type == 'faculty_load' else 'room'
+    yield (f'{entity}_id', 'day', 'time_slot', 'sessions_per_week', 'sessions_in_range')
+    rows = db.query(
+        UsageAggregate.entity_id, UsageAggregate.day, UsageAggregate.time_slot, UsageAggregate.sessions
+    ).filter(UsageAggregate.entity == entity).order_by(
+        UsageAggregate.entity_id, UsageAggregate.day, UsageAggregate.time_slot
+    ).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    for entity_id, day, time_slot, sessions in rows:
+        yield entity_id, day, time_slot, sessions, sessions * occurrences.get(day, 0)
+
+
+def export_csv(db: Session, report_type: str, start_date: Optional[str], end_date: Optional[str]) -> Iterator[bytes]:
+    """CSV of the aggregates behind a report (one of EXPORT_TYPES), EXPORT_CHUNK_ROWS rows per chunk"""
+    start, end = parse_range(start_date, end_date)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for n, row in enumerate(_export_rows(db, report_type, start, end), 1):
+        writer.writerow(row)
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
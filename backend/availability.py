@@ -0,0 +1,171 @@
+"""
+Weekly slot grid and availability bitsets.
+
+Every resource gets one integer with a bit per (day, time slot) of the week,
+bit day_idx * len(TIME_SLOTS) + time_idx, set when the resource can be used.
+
+Classroom.available_slots and Faculty.availability are JSON text in one of
+these forms; empty values ('', '{}', '[]') mean always available:
+
+    ["Monday", "Wednesday"]                                 whole days
+    ["Monday 09:00-10:00", {"day": "Friday", "time_slot": "14:00-15:00"}]
+    {"Monday": ["09:00-10:00", "10:00-11:00"], "Friday": true}
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import json
+
+import numpy as np
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+TIME_SLOTS = [
+    '09:00-10:00', '10:00-11:00', '11:00-12:00', '12:00-13:00',
+    '14:00-15:00', '15:00-16:00', '16:00-17:00', '17:00-18:00'
+]
+# Slot indices followed by a break (lunch); multi-slot blocks may not span them
+SESSION_BREAKS = {3}
+
+SLOTS_PER_DAY = len(TIME_SLOTS)
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+FULL_WEEK = (1 << (len(DAYS) * SLOTS_PER_DAY)) - 1
+SLOT_RANGE = np.arange(len(DAYS) * SLOTS_PER_DAY, dtype=np.int64)
+
+
+def slot_bit(day_idx: int, time_idx: int) -> int:
+    return 1 << (day_idx * SLOTS_PER_DAY + time_idx)
+
+
+def day_bits(day_idx: int) -> int:
+    return FULL_DAY << (day_idx * SLOTS_PER_DAY)
+
+
+def block_bits(day_idx: int, time_idx: int, length: int) -> int:
+    """Bits of `length` consecutive slots starting at (day_idx, time_idx)"""
+    return ((1 << length) - 1) << (day_idx * SLOTS_PER_DAY + time_idx)
+
+
+def is_free(mask: int, day_idx: int, time_idx: int, length: int = 1) -> bool:
+    bits = block_bits(day_idx, time_idx, length)
+    return mask & bits == bits
+
+
+def block_starts(length: int) -> List[int]:
+    """Time slot indices where a block of `length` slots fits without crossing a break"""
+    return [
+        time_idx for time_idx in range(SLOTS_PER_DAY - length + 1)
+        if not any(time_idx + offset in SESSION_BREAKS for offset in range(length - 1))
+    ]
+
+
+def free_block_starts(free: int, length: int) -> Iterator[Tuple[int, int]]:
+    """(day_idx, time_idx) of every block of `length` slots lying entirely inside `free`"""
+    # A start is usable when it and the next length - 1 bits are all free
+    starts = free
+    for offset in range(1, length):
+        starts &= free >> offset
+    for day_idx in range(len(DAYS)):
+        day = starts >> (day_idx * SLOTS_PER_DAY)
+        for time_idx in block_starts(length):
+            if day >> time_idx & 1:
+                yield day_idx, time_idx
+
+
+def _entry_bits(entry) -> int:
+    if isinstance(entry, dict):
+        day, time_slot = entry.get('day'), entry.get('time_slot')
+    else:
+        day, _, time_slot = str(entry).strip().partition(' ')
+    if day not in DAYS:
+        return 0
+    day_idx = DAYS.index(day)
+    if not time_slot:
+        return day_bits(day_idx)
+    time_slot = time_slot.strip()
+    return slot_bit(day_idx, TIME_SLOTS.index(time_slot)) if time_slot in TIME_SLOTS else 0
+
+
+def parse_availability(raw: Optional[str]) -> int:
+    """Bitset of the free slots described by an availability JSON column"""
+    value = json.loads(raw) if raw else None
+    if not value:
+        return FULL_WEEK
+
+    mask = 0
+    if isinstance(value, dict):
+        for day, slots in value.items():
+            if day not in DAYS:
+                continue
+            day_idx = DAYS.index(day)
+            if slots is True or slots == 'all':
+                mask |= day_bits(day_idx)
+            elif isinstance(slots, list):
+                for time_slot in slots:
+                    if time_slot in TIME_SLOTS:
+                        mask |= slot_bit(day_idx, TIME_SLOTS.index(time_slot))
+    else:
+        for entry in value:
+            mask |= _entry_bits(entry)
+    return mask
+
+
+def week_bounds(week_start) -> Tuple[datetime, datetime]:
+    """[Monday 00:00, next Monday 00:00) of the week containing `week_start` (date or ISO string)"""
+    if isinstance(week_start, str):
+        week_start = date.fromisoformat(week_start[:10])
+    if isinstance(week_start, datetime):
+        week_start = week_start.date()
+    monday = datetime.combine(week_start - timedelta(days=week_start.weekday()), datetime.min.time())
+    return monday, monday + timedelta(days=7)
+
+
+class WeeklyAvailability:
+    """Free-slot bitsets of the classrooms and faculty of one generation"""
+
+    def __init__(self, rooms: Optional[Dict[int, int]] = None, faculty: Optional[Dict[int, int]] = None):
+        self.rooms = rooms or {}
+        self.faculty = faculty or {}
+
+    @classmethod
+    def load(cls, classrooms: Iterable, faculty: Iterable, leaves: Iterable = ()) -> 'WeeklyAvailability':
+        """
+        Bitsets come from the stored availability_mask columns; rows without one
+        (written before the column existed) have their JSON parsed. Approved
+        leaves (already filtered to the target week) clear the whole weekday of
+        their faculty.
+        """
+        availability = cls(
+            {
+                room.id: room.availability_mask if room.availability_mask is not None
+                else parse_availability(room.available_slots)
+                for room in classrooms
+            },
+            {
+                fac.id: fac.availability_mask if fac.availability_mask is not None
+                else parse_availability(fac.availability)
+                for fac in faculty
+            }
+        )
+        for leave in leaves:
+            weekday = leave.date.weekday()
+            if weekday < len(DAYS) and leave.faculty_id in availability.faculty:
+                availability.faculty[leave.faculty_id] &= ~day_bits(weekday)
+        return availability
+
+    def room(self, classroom_id: int) -> int:
+        return self.rooms.get(classroom_id, FULL_WEEK)
+
+    def teacher(self, faculty_id: int) -> int:
+        return self.faculty.get(faculty_id, FULL_WEEK)
+
+    def free_slots(self) -> Dict[str, int]:
+        """Number of free slots per resource kind, for model statistics"""
+        return {
+            'room_free_slots': sum(bin(mask).count('1') for mask in self.rooms.values()),
+            'faculty_free_slots': sum(bin(mask).count('1') for mask in self.faculty.values())
+        }
+
+
+def slot_matrix(masks: List[int]) -> np.ndarray:
+    """Availability bitsets as a (resources, days, slots) boolean array"""
+    bits = (np.array(masks, dtype=np.int64).reshape(-1, 1) >> SLOT_RANGE) & 1
+    return bits.astype(bool).reshape(-1, len(DAYS), SLOTS_PER_DAY)
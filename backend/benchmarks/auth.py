@@ -0,0 +1,82 @@
+"""
+Per-request cost of authentication: a cold token (JWT decode plus the user
+lookup get_current_user did on every request) against a cached principal.
+
+    cd backend
+    python -m benchmarks.auth --requests 20000
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta
+import argparse
+import json
+import time
+import jwt
+
+from models import Base, User
+from principals import PrincipalCache
+
+SECRET_KEY = "benchmark-secret-of-at-least-32-bytes"
+ALGORITHM = "HS256"
+
+
+def _microseconds(fn, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return round((time.perf_counter() - start) / requests * 1e6, 2)
+
+
+def run(requests: int, users: int) -> dict:
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(email=f"user{i}@example.edu", role="faculty", name=f"User {i}") for i in range(users)])
+    db.commit()
+    expire = datetime.utcnow() + timedelta(hours=24)
+    tokens = [
+        jwt.encode({"sub": f"user{i}@example.edu", "role": "faculty", "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+        for i in range(users)
+    ]
+    cache = PrincipalCache()
+
+    def authenticate(token: str):
+        principal = cache.get(token)
+        if principal is not None:
+            return principal
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user = db.query(User).filter(User.email == payload["sub"]).first()
+        db.expunge_all()
+        return cache.put(token, user, payload.get("exp"))
+
+    calls = iter(range(10 ** 12))
+
+    def cold():
+        cache.clear()
+        authenticate(tokens[next(calls) % users])
+
+    def cached():
+        authenticate(tokens[next(calls) % users])
+
+    cold_us = _microseconds(cold, requests)
+    for token in tokens:
+        authenticate(token)
+    return {
+        'requests': requests,
+        'users': users,
+        'cold_us_per_request': cold_us,
+        'cached_us_per_request': _microseconds(cached, requests)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.users), indent=2))
+
+
+if __name__ == '__main__':
+    main()
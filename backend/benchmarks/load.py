@@ -0,0 +1,185 @@
+"""
+Read latency of a running API while timetable generations solve.
+
+    cd backend
+    python -m benchmarks.load --url http://localhost:8000 \\
+        --email admin@example.edu --password secret --jobs 4 --readers 16
+
+--readers clients GET the list endpoints and the stored timetable grids in a
+loop: first for --duration seconds with nothing solving, then from the moment
+--jobs generations are submitted until the last one finishes. Generations run
+in the job pool, so the second window should look like the first. Each job
+solves a share of the batches under a fresh nonce, which keeps it out of the
+generation cache.
+
+Exits with status 1 when the p95 under load exceeds --max-p95-ms.
+"""
+from typing import List, Dict, Any, Callable, Optional
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+
+FINISHED_JOB_STATUSES = {'completed', 'failed', 'cancelled'}
+JOB_POLL_SECONDS = 0.5
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if len(latencies) < 2:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {f'p{p}_ms': round(cuts[p - 1] * 1000, 2) for p in (50, 95, 99)}
+
+
+def _read_paths(client: httpx.Client) -> List[str]:
+    """List endpoints plus the stored grid of every batch"""
+    batch_ids, cursor = [], None
+    while True:
+        params = {'fields': 'id', 'limit': 1000, **({'cursor': cursor} if cursor else {})}
+        page = client.get('/api/batches', params=params).json()
+        batch_ids += [batch['id'] for batch in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    return ['/api/classrooms', '/api/faculty', '/api/subjects', '/api/batches'] + [
+        f'/api/timetable/batch/{batch_id}' for batch_id in batch_ids
+    ]
+
+
+def _read_window(
+    make_client: Callable[[], httpx.Client],
+    paths: List[str],
+    readers: int,
+    until: Callable[[], bool]
+) -> Dict[str, Any]:
+    """GET `paths` round-robin from `readers` threads until `until()` holds"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def reader(offset: int):
+        own, failed = [], 0
+        with make_client() as client:
+            n = offset
+            while not until():
+                path = paths[n % len(paths)]
+                n += 1
+                start = time.perf_counter()
+                response = client.get(path)
+                own.append(time.perf_counter() - start)
+                # A grid of a batch without a timetable is a 404, not a failure
+                failed += response.status_code >= 500
+        with lock:
+            latencies.extend(own)
+            errors.append(failed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'seconds': round(seconds, 2),
+        'requests_per_second': round(len(latencies) / seconds, 1) if seconds else None,
+        **_percentiles(latencies)
+    }
+
+
+def run(
+    make_client: Callable[[], httpx.Client],
+    token: str,
+    jobs: int,
+    readers: int,
+    duration: float,
+    time_limit: float
+) -> Dict[str, Any]:
+    with make_client() as client:
+        paths = _read_paths(client)
+        batch_ids = [int(path.rsplit('/', 1)[1]) for path in paths if path.startswith('/api/timetable/batch/')]
+
+        deadline = time.perf_counter() + duration
+        idle = _read_window(make_client, paths, readers, lambda: time.perf_counter() >= deadline)
+
+        headers = {'Authorization': f'Bearer {token}'}
+        nonce = uuid.uuid4().hex
+        job_ids = []
+        for k in range(jobs):
+            response = client.post('/api/timetable/jobs', headers=headers, json={
+                'batch_ids': batch_ids[k::jobs] or batch_ids,
+                'constraints': {'benchmark_nonce': f'{nonce}-{k}'},
+                'use_ai_suggestions': False,
+                'solver': {'max_time_in_seconds': time_limit, 'num_search_workers': 1}
+            })
+            response.raise_for_status()
+            job_ids.append(response.json()['job_id'])
+
+        statuses = {}
+        done = threading.Event()
+
+        def watch():
+            # Polls of its own, outside the measured clients
+            with make_client() as watcher:
+                while len(statuses) < len(job_ids):
+                    for job_id in job_ids:
+                        if job_id not in statuses:
+                            status = watcher.get(f'/api/timetable/jobs/{job_id}', headers=headers).json()['status']
+                            if status in FINISHED_JOB_STATUSES:
+                                statuses[job_id] = status
+                    time.sleep(JOB_POLL_SECONDS)
+            done.set()
+
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        loaded = _read_window(make_client, paths, readers, done.is_set)
+        watcher.join()
+
+    return {
+        'jobs': jobs,
+        'readers': readers,
+        'paths': len(paths),
+        'job_statuses': sorted(statuses.values()),
+        'idle': idle,
+        'loaded': loaded
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True, help='an admin account, to submit the jobs')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of the idle window')
+    parser.add_argument('--time-limit', type=float, default=30.0, help='solver time limit of each job')
+    parser.add_argument('--max-p95-ms', type=float, help='fail when the p95 under load exceeds this')
+    args = parser.parse_args(argv)
+
+    def make_client() -> httpx.Client:
+        return httpx.Client(base_url=args.url, timeout=60.0)
+
+    with make_client() as client:
+        response = client.post('/api/login', json={'email': args.email, 'password': args.password})
+        response.raise_for_status()
+        token = response.json()['access_token']
+
+    result = run(make_client, token, args.jobs, args.readers, args.duration, args.time_limit)
+    print(json.dumps(result, indent=2))
+
+    p95 = result['loaded']['p95_ms']
+    if args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms):
+        print(f'REGRESSION p95 under load: {p95} ms > {args.max_p95_ms} ms', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
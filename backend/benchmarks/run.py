@@ -0,0 +1,222 @@
+"""
+End-to-end generation benchmarks on synthetic institutions.
+
+    cd backend
+    python -m benchmarks.run --scale small --output bench.json
+    python -m benchmarks.run --scale small --baseline benchmarks/baseline.json
+    python -m benchmarks.run --scale small --warm-start --changes 2
+    python -m benchmarks.run --scale large --lns --time-limit 120
+
+With --warm-start every run solves the institution cold, approves the result,
+perturbs the availability of --changes faculty and solves again from the
+approved timetable; the warm run is the one compared, the cold one is reported
+alongside it.
+
+Exits with status 1 when a phase regresses past --threshold against the baseline.
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from typing import List, Dict, Any, Optional
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+
+from models import Base, Batch, Faculty, Timetable
+from timetable_engine import TimetableGenerator
+from availability import DAYS
+from benchmarks.synthetic import SCALES, populate
+
+# Phases compared against the baseline, in seconds
+COMPARED_PHASES = ['load', 'build', 'solve', 'extract', 'persist', 'total']
+# Differences below this are noise, whatever the relative change
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def _peak_rss_mb() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def _generate(db, batch_ids: List[int], seed: int, options: Dict[str, Any], warm_start: bool = False):
+    generator = TimetableGenerator(db, solver_params={
+        'max_time_in_seconds': options['time_limit'],
+        'num_search_workers': options['workers']
+    })
+    generator.solver.parameters.random_seed = seed
+
+    start = time.perf_counter()
+    result = asyncio.run(generator.generate_optimized_timetable(
+        batch_ids=batch_ids,
+        constraints={},
+        decompose=options['decompose'],
+        warm_start=warm_start,
+        lns=options.get('lns', False)
+    ))
+    return result, time.perf_counter() - start
+
+
+def _perturb(db, seed: int, changes: int):
+    """Take one weekday away from `changes` faculty, as a small term-to-term change"""
+    rng = random.Random(seed)
+    faculty = db.query(Faculty).order_by(Faculty.id).all()
+    for fac in rng.sample(faculty, min(changes, len(faculty))):
+        day = rng.choice(DAYS)
+        fac.availability = json.dumps([d for d in DAYS if d != day])
+    db.commit()
+
+
+def _first_solution_seconds(result: Dict[str, Any]) -> Optional[float]:
+    solutions = result.get('solutions') or []
+    return solutions[0]['wall_time'] if solutions else None
+
+
+def run_once(scale: str, seed: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a fresh in-memory institution and run one generation over all batches"""
+    engine = create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cold = None
+    try:
+        sizes = populate(db, scale, seed)
+        batch_ids = [batch_id for (batch_id,) in db.query(Batch.id).all()]
+
+        if options.get('warm_start'):
+            cold_result, cold_total = _generate(db, batch_ids, seed, options)
+            cold = {
+                'status': cold_result['status'],
+                'total': round(cold_total, 4),
+                'first_solution_seconds': _first_solution_seconds(cold_result),
+                'objective': (cold_result.get('solver_stats') or {}).get('objective')
+            }
+            db.query(Timetable).update({Timetable.is_approved: True})
+            db.commit()
+            _perturb(db, seed, options['changes'])
+
+        result, total = _generate(db, batch_ids, seed, options, warm_start=bool(options.get('warm_start')))
+    finally:
+        db.close()
+        engine.dispose()
+
+    metrics = result.get('metrics') or {}
+    profile = dict(metrics.get('profile') or result.get('profile') or {})
+    profile['total'] = round(total, 4)
+    solver_stats = result.get('solver_stats') or {}
+    model_stats = metrics.get('model_stats') or result.get('model_stats') or {}
+
+    return {
+        'status': result['status'],
+        'sizes': sizes,
+        # Decomposed runs build and extract inside the cluster workers
+        'phases': {
+            phase: profile.get(phase, profile.get(f'cluster.{phase}', 0.0)) for phase in COMPARED_PHASES
+        },
+        'profile': profile,
+        'variables': model_stats.get('variables'),
+        'constraints': model_stats.get('constraints'),
+        'scheduled_classes': metrics.get('total_classes_scheduled', 0),
+        'objective': solver_stats.get('objective'),
+        'bound': solver_stats.get('bound'),
+        'first_solution_seconds': _first_solution_seconds(result),
+        'warm_start_matched': model_stats.get('warm_start_matched'),
+        'cold': cold,
+        'peak_rss_mb': round(_peak_rss_mb(), 1)
+    }
+
+
+def run(scale: str, seed: int, repeat: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    runs = [run_once(scale, seed, options) for _ in range(repeat)]
+    # Median per phase; outcome fields come from the first run (they are seeded)
+    phases = {
+        phase: round(statistics.median(r['phases'][phase] for r in runs), 4)
+        for phase in COMPARED_PHASES
+    }
+    return {
+        'scale': scale,
+        'seed': seed,
+        'repeat': repeat,
+        'options': options,
+        'python': platform.python_version(),
+        **{key: value for key, value in runs[0].items() if key != 'phases'},
+        'phases': phases,
+        'peak_rss_mb': max(r['peak_rss_mb'] for r in runs)
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of `result` against `baseline`, as human-readable lines"""
+    regressions = []
+    for phase in COMPARED_PHASES:
+        before = baseline['phases'].get(phase)
+        after = result['phases'].get(phase)
+        if before is None or after is None:
+            continue
+        if after - before > MIN_REGRESSION_SECONDS and after > before * (1 + threshold):
+            regressions.append(f'{phase}: {before:.3f}s -> {after:.3f}s')
+
+    if baseline.get('peak_rss_mb') and result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + threshold):
+        regressions.append(f"peak_rss_mb: {baseline['peak_rss_mb']} -> {result['peak_rss_mb']}")
+
+    if baseline['status'] == 'success' and result['status'] != 'success':
+        regressions.append(f"status: {baseline['status']} -> {result['status']}")
+    elif baseline.get('objective') is not None and result.get('objective') is not None:
+        # Objectives are compared in the model's own sense; a drop in either direction is flagged
+        if abs(result['objective'] - baseline['objective']) > abs(baseline['objective']) * threshold:
+            regressions.append(f"objective: {baseline['objective']} -> {result['objective']}")
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=60.0)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--decompose', action='store_true')
+    parser.add_argument('--lns', action='store_true', help='improve a greedy timetable by large neighbourhood search')
+    parser.add_argument('--warm-start', action='store_true', help='compare a cold run with a warm re-run')
+    parser.add_argument('--changes', type=int, default=1, help='faculty perturbed between the two runs')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown per phase')
+    args = parser.parse_args(argv)
+
+    options = {
+        'time_limit': args.time_limit,
+        'workers': args.workers,
+        'decompose': args.decompose,
+        'lns': args.lns,
+        'warm_start': args.warm_start,
+        'changes': args.changes
+    }
+    result = run(args.scale, args.seed, args.repeat, options)
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+A local stand-in for the Gemini REST API, to exercise ai_suggestions without
+the real service: fixed suggestions after --delay seconds, or a 503 for a
+--fail-rate share of the calls.
+
+    cd backend
+    python -m benchmarks.stub_model --port 8090 --delay 0.5
+    GEMINI_API_KEY=stub GEMINI_API_ENDPOINT=http://localhost:8090 uvicorn main:app
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import time
+
+SUGGESTIONS = [
+    {
+        "type": "workload_balance",
+        "priority": "medium",
+        "description": "Stub suggestion: spread the heaviest faculty days",
+        "implementation": "Move one class from each heaviest day to the lightest day"
+    }
+]
+
+
+def make_handler(delay: float, fail_rate: float):
+    class StubModelHandler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            StubModelHandler.calls += 1
+            time.sleep(delay)
+            if random.random() < fail_rate:
+                self._reply(503, {"error": {"code": 503, "message": "stub outage", "status": "UNAVAILABLE"}})
+                return
+            self._reply(200, {"candidates": [{
+                "content": {"parts": [{"text": json.dumps(SUGGESTIONS)}], "role": "model"},
+                "finishReason": 1,
+                "index": 0
+            }]})
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubModelHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds before each answer')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of calls answered 503')
+    args = parser.parse_args()
+    ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay, args.fail_rate)).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
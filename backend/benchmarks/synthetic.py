@@ -0,0 +1,112 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Any
+import json
+import random
+
+from models import Batch, Classroom, Faculty, Subject
+
+# Institution sizes, from a small college up to a ~30k-student university
+SCALES: Dict[str, Dict[str, Any]] = {
+    'tiny': {
+        'programs': 2, 'semesters': 1, 'sections': 2, 'subjects_per_semester': 3,
+        'faculty_per_program': 3, 'lecture_rooms': 4, 'lab_rooms': 2
+    },
+    'small': {
+        'programs': 3, 'semesters': 2, 'sections': 2, 'subjects_per_semester': 4,
+        'faculty_per_program': 6, 'lecture_rooms': 10, 'lab_rooms': 4
+    },
+    'medium': {
+        'programs': 6, 'semesters': 4, 'sections': 2, 'subjects_per_semester': 5,
+        'faculty_per_program': 14, 'lecture_rooms': 40, 'lab_rooms': 15
+    },
+    'large': {
+        'programs': 12, 'semesters': 8, 'sections': 3, 'subjects_per_semester': 5,
+        'faculty_per_program': 30, 'lecture_rooms': 150, 'lab_rooms': 60
+    },
+    'university': {
+        'programs': 25, 'semesters': 8, 'sections': 3, 'subjects_per_semester': 6,
+        'faculty_per_program': 45, 'lecture_rooms': 420, 'lab_rooms': 160
+    },
+}
+
+STUDENTS_PER_SECTION = (40, 60)
+# Share of faculty that also teach one subject of a neighbouring program
+CROSS_PROGRAM_FACULTY = 0.1
+
+
+def populate(db: Session, scale: str, seed: int = 0) -> Dict[str, int]:
+    """
+    Fill Classroom, Faculty, Subject and Batch with a reproducible synthetic
+    institution. Every batch gets an explicit curriculum in elective_groups.
+    Returns the number of rows created per table.
+    """
+    spec = SCALES[scale]
+    rng = random.Random(seed)
+
+    classrooms = [
+        Classroom(name=f'L{i}', capacity=rng.choice([60, 80, 120]), type='lecture', available_slots='{}')
+        for i in range(spec['lecture_rooms'])
+    ] + [
+        Classroom(name=f'LAB{i}', capacity=rng.choice([60, 80]), type='lab', available_slots='{}')
+        for i in range(spec['lab_rooms'])
+    ]
+    db.add_all(classrooms)
+
+    curricula = {}
+    for program in range(spec['programs']):
+        for semester in range(1, spec['semesters'] + 1):
+            subjects = [
+                Subject(
+                    name=f'P{program}-S{semester}-{k}',
+                    code=f'P{program}S{semester}C{k}',
+                    lecture_hours=rng.choice([2, 3, 4]),
+                    lab_hours=2 if k == 0 else 0
+                )
+                for k in range(spec['subjects_per_semester'])
+            ]
+            db.add_all(subjects)
+            curricula[(program, semester)] = subjects
+    db.flush()
+
+    faculty = []
+    for program in range(spec['programs']):
+        program_subjects = [
+            s.id for semester in range(1, spec['semesters'] + 1) for s in curricula[(program, semester)]
+        ]
+        for k in range(spec['faculty_per_program']):
+            # Round-robin first so every subject has someone to teach it, then a random top-up to three
+            assigned = program_subjects[k::spec['faculty_per_program']]
+            others = [s for s in program_subjects if s not in assigned]
+            assigned += rng.sample(others, max(0, min(3 - len(assigned), len(others))))
+            if spec['programs'] > 1 and rng.random() < CROSS_PROGRAM_FACULTY:
+                neighbour = (program + 1) % spec['programs']
+                assigned.append(rng.choice(curricula[(neighbour, rng.randint(1, spec['semesters']))]).id)
+            faculty.append(Faculty(
+                name=f'Faculty P{program}-{k}',
+                email=f'p{program}.f{k}@example.edu',
+                max_daily_classes=rng.choice([4, 5, 6]),
+                availability='{}',
+                assigned_subjects=json.dumps(assigned)
+            ))
+    db.add_all(faculty)
+
+    batches = []
+    for (program, semester), subjects in curricula.items():
+        for section in range(spec['sections']):
+            batches.append(Batch(
+                name=f'P{program}-S{semester}-{chr(65 + section)}',
+                program=f'P{program}',
+                semester=semester,
+                student_count=rng.randint(*STUDENTS_PER_SECTION),
+                elective_groups=json.dumps({'subjects': [s.id for s in subjects]})
+            ))
+    db.add_all(batches)
+    db.commit()
+
+    return {
+        'classrooms': len(classrooms),
+        'subjects': sum(len(subjects) for subjects in curricula.values()),
+        'faculty': len(faculty),
+        'batches': len(batches),
+        'students': sum(batch.student_count for batch in batches)
+    }
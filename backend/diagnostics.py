@@ -0,0 +1,264 @@
+"""
+Explanations for timetables that cannot be generated.
+
+necessary_conditions() runs counting arguments every feasible timetable must
+satisfy, vectorized over batch x subject and resource x slot matrices; it takes
+milliseconds and catches most data errors before any solve. infeasible_core()
+builds the model with every requirement and faculty daily limit behind an
+assumption literal and asks CP-SAT for a small subset that cannot hold together.
+"""
+from ortools.sat.python import cp_model
+from typing import List, Dict, Any, Optional, Tuple
+import time
+import numpy as np
+
+from availability import DAYS, TIME_SLOTS, WeeklyAvailability, slot_matrix
+from models import Batch, Classroom, Faculty, Subject
+from timetable_engine import (
+    LAB_ROOM_TYPES, LECTURE_ROOM_TYPES, TimetableGenerator, _batch_subject_ids, _qualified_faculty
+)
+
+# Budget for core extraction, including the shrinking re-solves
+CORE_MAX_SECONDS = 10.0
+
+def _conflict(conflict_type: str, message: str, **details) -> Dict[str, Any]:
+    return {'type': conflict_type, 'message': message, 'severity': 'high', **details}
+
+
+def necessary_conditions(
+    batches: List[Batch],
+    classrooms: List[Classroom],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    availability: Optional[WeeklyAvailability] = None
+) -> List[Dict[str, Any]]:
+    """
+    Conditions no timetable can break, checked in bulk. Any conflict returned
+    here proves the model infeasible; an empty list proves nothing.
+    """
+    availability = availability or WeeklyAvailability()
+    conflicts = []
+    if not batches or not subjects:
+        return conflicts
+
+    subject_index = {s.id: i for i, s in enumerate(subjects)}
+    curriculum = np.zeros((len(batches), len(subjects)), dtype=bool)
+    for b, batch in enumerate(batches):
+        for subject_id in _batch_subject_ids(batch, subjects):
+            if subject_id in subject_index:
+                curriculum[b, subject_index[subject_id]] = True
+    hours = {
+        'lecture': np.array([s.lecture_hours or 0 for s in subjects]),
+        'lab': np.array([s.lab_hours or 0 for s in subjects])
+    }
+    need = {kind: curriculum * kind_hours for kind, kind_hours in hours.items()}  # batch x subject slots
+    need_total = need['lecture'] + need['lab']
+    sizes = np.array([batch.student_count or 0 for batch in batches])
+
+    faculty_index = {fac.id: f for f, fac in enumerate(faculty)}
+    qualified = np.zeros((len(faculty), len(subjects)), dtype=bool)
+    for subject_id, faculty_ids in _qualified_faculty(faculty).items():
+        if subject_id in subject_index:
+            qualified[[faculty_index[f] for f in faculty_ids], subject_index[subject_id]] = True
+    max_daily = np.array([fac.max_daily_classes or 0 for fac in faculty]).reshape(-1, 1)
+    faculty_free = slot_matrix([availability.teacher(fac.id) for fac in faculty])
+    # Weekly teaching capacity: free slots per day, capped by the daily limit
+    capacity = np.minimum(faculty_free.sum(axis=2), max_daily).sum(axis=1)
+
+    room_types = np.array([c.type for c in classrooms], dtype=object)
+    room_sizes = np.array([c.capacity or 0 for c in classrooms])
+    # An explicit width, since -1 cannot be inferred when there are no rooms
+    room_free = slot_matrix([availability.room(c.id) for c in classrooms]).reshape(
+        len(classrooms), len(DAYS) * len(TIME_SLOTS)
+    )
+
+    # Subjects someone must take but nobody teaches
+    demand = need_total.sum(axis=0)
+    staffed = qualified.any(axis=0)
+    for s in np.flatnonzero((demand > 0) & ~staffed).tolist():
+        conflicts.append(_conflict(
+            'unstaffed_subject',
+            f'No faculty is assigned to {subjects[s].name}, required by '
+            f'{int(curriculum[:, s].sum())} batches',
+            subject_id=subjects[s].id
+        ))
+
+    # Subject demand against the combined capacity of its qualified faculty
+    supply = capacity @ qualified
+    for s in np.flatnonzero(staffed & (demand > supply)).tolist():
+        conflicts.append(_conflict(
+            'faculty_capacity',
+            f'{subjects[s].name} needs {int(demand[s])} slots a week but its faculty can teach at most {int(supply[s])}',
+            subject_id=subjects[s].id, required=int(demand[s]), available=int(supply[s])
+        ))
+
+    # Load that falls on a faculty member because nobody else teaches the subject
+    sole = qualified.sum(axis=0) == 1
+    forced = qualified[:, sole].astype(np.int64) @ demand[sole]
+    for f in np.flatnonzero(forced > capacity).tolist():
+        conflicts.append(_conflict(
+            'faculty_overload',
+            f'{faculty[f].name} is the only teacher of subjects needing {int(forced[f])} slots a week, '
+            f'but can teach at most {int(capacity[f])}',
+            faculty_id=faculty[f].id, required=int(forced[f]), available=int(capacity[f])
+        ))
+
+    # Batches whose curriculum does not fit into the week
+    week = len(DAYS) * len(TIME_SLOTS)
+    batch_load = need_total.sum(axis=1)
+    for b in np.flatnonzero(batch_load > week).tolist():
+        conflicts.append(_conflict(
+            'batch_overload',
+            f'{batches[b].name} needs {int(batch_load[b])} slots a week, the week has {week}',
+            batch_id=batches[b].id, required=int(batch_load[b]), available=week
+        ))
+
+    for kind, types in (('lecture', LECTURE_ROOM_TYPES), ('lab', LAB_ROOM_TYPES)):
+        suitable = np.isin(room_types, list(types))
+        kind_load = need[kind].sum(axis=1)
+        demanding = kind_load > 0
+
+        # Batches larger than every room of the right type
+        largest = room_sizes[suitable].max() if suitable.any() else 0
+        for b in np.flatnonzero(demanding & (sizes > largest)).tolist():
+            conflicts.append(_conflict(
+                'no_suitable_room',
+                f'{batches[b].name} ({int(sizes[b])} students) has {kind} hours but the largest '
+                f'{kind} room seats {int(largest)}',
+                batch_id=batches[b].id, kind=kind
+            ))
+
+        # Room-slot supply against demand, for every batch size threshold:
+        # batches of at least n students only fit rooms seating at least n
+        room_slots = room_free[suitable].sum(axis=1)
+        order = np.argsort(room_sizes[suitable])
+        sorted_sizes = room_sizes[suitable][order]
+        supply_from = np.concatenate([np.cumsum(room_slots[order][::-1])[::-1], [0]])
+        thresholds = np.unique(sizes[demanding])
+        demand_from = np.array([kind_load[demanding & (sizes >= n)].sum() for n in thresholds.tolist()])
+        available = supply_from[np.searchsorted(sorted_sizes, thresholds, side='left')]
+        short = np.flatnonzero(demand_from > available)
+        if short.size:
+            t = int(short[-1])
+            conflicts.append(_conflict(
+                'room_capacity',
+                f'Batches of {int(thresholds[t])}+ students need {int(demand_from[t])} {kind} slots a week '
+                f'but rooms that seat them offer {int(available[t])}',
+                kind=kind, required=int(demand_from[t]), available=int(available[t])
+            ))
+
+        # Pairwise availability: one faculty teaches every session of a requirement,
+        # so some qualified faculty must share enough slots with the suitable rooms
+        overlap_cache = {}
+        for b, s in zip(*np.nonzero(need[kind])):
+            faculty_ids = np.flatnonzero(qualified[:, s])
+            if not faculty_ids.size:
+                continue
+            key = (int(s), int(sizes[b]))
+            if key not in overlap_cache:
+                rooms = room_free[suitable & (room_sizes >= sizes[b])].any(axis=0).reshape(len(DAYS), -1)
+                per_day = (faculty_free[faculty_ids] & rooms).sum(axis=2)
+                overlap_cache[key] = int(np.minimum(per_day, max_daily[faculty_ids]).sum(axis=1).max())
+            if overlap_cache[key] < need[kind][b, s]:
+                conflicts.append(_conflict(
+                    'availability_overlap',
+                    f'{batches[b].name} needs {int(need[kind][b, s])} {kind} hours of {subjects[s].name}, but its '
+                    f'faculty share at most {overlap_cache[key]} free slots with suitable rooms',
+                    batch_id=batches[b].id, subject_id=subjects[s].id, kind=kind,
+                    required=int(need[kind][b, s]), available=overlap_cache[key]
+                ))
+
+    return conflicts
+
+
+def _describe(label: Tuple, batches: Dict[int, Batch], faculty: Dict[int, Faculty],
+              subjects: Dict[int, Subject]) -> Dict[str, Any]:
+    if label[0] == 'workload':
+        fac = faculty[label[1]]
+        return {
+            'constraint': 'faculty_daily_limit', 'faculty_id': fac.id,
+            'message': f'{fac.name} teaches at most {fac.max_daily_classes} classes a day'
+        }
+    _, batch_id, subject_id, kind = label
+    subject = subjects[subject_id]
+    hours = subject.lecture_hours if kind == 'lecture' else subject.lab_hours
+    return {
+        'constraint': 'weekly_hours', 'batch_id': batch_id, 'subject_id': subject_id, 'kind': kind,
+        'message': f'{batches[batch_id].name} gets {hours} {kind} hours of {subject.name}'
+    }
+
+
+def infeasible_core(
+    batches: List[Batch],
+    classrooms: List[Classroom],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    constraints: Optional[Dict[str, Any]] = None,
+    availability: Optional[WeeklyAvailability] = None,
+    max_seconds: float = CORE_MAX_SECONDS
+) -> List[Dict[str, Any]]:
+    """
+    Name a small set of requirements and daily limits that cannot all hold.
+    CP-SAT reports a sufficient set of failed assumptions; each member is then
+    dropped in turn and kept out when the rest is still infeasible.
+    """
+    start = time.perf_counter()
+    generator = TimetableGenerator(None, solver_params={
+        'max_time_in_seconds': max_seconds, 'num_search_workers': 1
+    })
+    assumptions = {}
+    generator._build_sparse_model(
+        batches, classrooms, faculty, subjects, constraints, availability, assumptions=assumptions
+    )
+    model, solver = generator.model, generator.solver
+    label_of = {literal.Index(): label for label, literal in assumptions.items()}
+    model.AddAssumptions(list(assumptions.values()))
+
+    status = solver.Solve(model)
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        return [{
+            'type': 'search_limit',
+            'message': 'A timetable satisfying every hard constraint exists; the solver ran out of time. '
+                       'Raise max_time_in_seconds or generate with decompose',
+            'severity': 'medium'
+        }]
+    if status != cp_model.INFEASIBLE:
+        return []
+
+    core = [label_of[index] for index in solver.SufficientAssumptionsForInfeasibility()]
+    for label in list(core):
+        remaining = max_seconds - (time.perf_counter() - start)
+        if remaining <= 0 or len(core) == 1:
+            break
+        if label not in core:
+            continue
+        trial = [other for other in core if other != label]
+        model.ClearAssumptions()
+        model.AddAssumptions([assumptions[other] for other in trial])
+        solver.parameters.max_time_in_seconds = remaining
+        if solver.Solve(model) == cp_model.INFEASIBLE:
+            core = [label_of[index] for index in solver.SufficientAssumptionsForInfeasibility()] or trial
+
+    by_id = ({b.id: b for b in batches}, {f.id: f for f in faculty}, {s.id: s for s in subjects})
+    return [{
+        'type': 'conflicting_constraints',
+        'message': 'These constraints cannot all be met at once',
+        'severity': 'high',
+        'constraints': [_describe(label, *by_id) for label in core]
+    }]
+
+
+def diagnose(
+    batches: List[Batch],
+    classrooms: List[Classroom],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    constraints: Optional[Dict[str, Any]] = None,
+    availability: Optional[WeeklyAvailability] = None,
+    core: bool = True
+) -> List[Dict[str, Any]]:
+    """Necessary-condition conflicts, or else a conflicting core from CP-SAT"""
+    conflicts = necessary_conditions(batches, classrooms, faculty, subjects, availability)
+    if not conflicts and core:
+        conflicts = infeasible_core(batches, classrooms, faculty, subjects, constraints, availability)
+    return conflicts
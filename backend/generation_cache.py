@@ -0,0 +1,286 @@
+from collections import OrderedDict, defaultdict
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import redis
+
+from availability import week_bounds
+from models import Batch, Classroom, Faculty, Leave, Subject, Timetable, approved_leaves
+from monitoring import GENERATION_CACHE_LOOKUPS
+from timetable_store import latest_approved, replace_generation
+
+logger = logging.getLogger("timetable.cache")
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Local fallback size, in generations; each entry holds a full timetable
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "64"))
+CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", "86400"))
+# A slow or unreachable Redis must not hold up generation requests
+REDIS_TIMEOUT_SECONDS = 0.5
+# After a Redis error the local LRU is used for this long, doubling on each failed retry
+REDIS_RETRY_SECONDS = float(os.getenv("GENERATION_CACHE_REDIS_RETRY_SECONDS", "1"))
+REDIS_RETRY_MAX_SECONDS = float(os.getenv("GENERATION_CACHE_REDIS_RETRY_MAX_SECONDS", "60"))
+KEY_PREFIX = "timetable:generation:"
+TAG_PREFIX = "timetable:generation-tag:"
+VERSION_PREFIX = "timetable:version:"
+
+
+def _rows(rows) -> List[Dict[str, Any]]:
+    """Column values of ORM rows, minus bookkeeping timestamps"""
+    return [
+        {
+            column.name: getattr(row, column.name)
+            for column in row.__table__.columns if column.name != 'created_at'
+        }
+        for row in rows
+    ]
+
+
+def generation_key(db: Session, request) -> Tuple[str, List[str]]:
+    """
+    Content address of a generation request (a GenerationJobRequest): a hash of
+    every row the solver reads plus the request options. Returns the key and the
+    invalidation tags of the entry.
+    """
+    batch_ids = sorted(set(request.batch_ids))
+    constraints = request.constraints or {}
+    tags = ['classrooms', 'faculty', 'subjects'] + [f'batch:{batch_id}' for batch_id in batch_ids]
+    snapshot = {
+        'batches': _rows(db.query(Batch).filter(Batch.id.in_(batch_ids)).order_by(Batch.id)),
+        'classrooms': _rows(db.query(Classroom).order_by(Classroom.id)),
+        'faculty': _rows(db.query(Faculty).order_by(Faculty.id)),
+        'subjects': _rows(db.query(Subject).order_by(Subject.id)),
+        'constraints': constraints,
+        'solver': request.solver.model_dump(),
+        'use_ai_suggestions': request.use_ai_suggestions,
+        'decompose': request.decompose,
+        'warm_start': request.warm_start,
+        'lns': request.lns
+    }
+    # Leaves only matter for a concrete week, the approved timetable only when warm-starting
+    if constraints.get('week_start'):
+        snapshot['leaves'] = _rows(sorted(approved_leaves(db, constraints['week_start']), key=lambda l: l.id))
+        tags.append(f"leaves:{week_bounds(constraints['week_start'])[0].date().isoformat()}")
+    if request.warm_start:
+        snapshot['approved'] = latest_approved(db, batch_ids)
+        tags.extend(f'approved:{batch_id}' for batch_id in batch_ids)
+
+    canonical = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest(), tags
+
+
+class GenerationCache:
+    """
+    Solved generations keyed by generation_key. Entries live in Redis when
+    REDIS_URL is set and reachable, otherwise in a per-process LRU. Every entry
+    is registered under its tags so a write to an input table drops exactly the
+    entries that read it. A failing Redis is retried with exponential backoff;
+    invalidations it missed meanwhile are replayed before it is used again.
+    Redis also holds the version counters the API processes share (see
+    http_cache.ResponseCache); bumps missed while it was down are replayed too.
+    """
+
+    def __init__(self, url: Optional[str] = REDIS_URL, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: int = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(
+            url, socket_timeout=REDIS_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_TIMEOUT_SECONDS
+        ) if url else None
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires_at, JSON)
+        self._local_tags = defaultdict(set)
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._retry_seconds = 0.0
+        self._missed_tags = set()
+        self._missed_versions = set()
+
+    def _client(self) -> Optional[redis.Redis]:
+        """The Redis client, unless it failed within the current backoff window"""
+        if self._redis is None or time.monotonic() < self._retry_at:
+            return None
+        with self._lock:
+            missed, self._missed_tags = self._missed_tags, set()
+            missed_versions, self._missed_versions = self._missed_versions, set()
+        if missed or missed_versions:
+            try:
+                if missed:
+                    self._invalidate_redis(missed)
+                for name in missed_versions:
+                    self._redis.incr(VERSION_PREFIX + name)
+            except redis.RedisError as e:
+                with self._lock:
+                    self._missed_tags |= missed
+                    self._missed_versions |= missed_versions
+                self._redis_failed(e)
+                return None
+        return self._redis
+
+    def _redis_failed(self, error: Exception):
+        with self._lock:
+            self._retry_seconds = min(self._retry_seconds * 2 or REDIS_RETRY_SECONDS, REDIS_RETRY_MAX_SECONDS)
+            self._retry_at = time.monotonic() + self._retry_seconds
+        logger.warning("Generation cache falling back to local LRU for %.0fs: %s", self._retry_seconds, error)
+
+    def _redis_succeeded(self):
+        self._retry_seconds = 0.0
+
+    def _invalidate_redis(self, tags):
+        keys = set()
+        for tag in tags:
+            keys |= {member.decode() for member in self._redis.smembers(TAG_PREFIX + tag)}
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.delete(KEY_PREFIX + key)
+        for tag in tags:
+            pipe.delete(TAG_PREFIX + tag)
+        pipe.execute()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = None
+        client = self._client()
+        if client is not None:
+            try:
+                value = client.get(KEY_PREFIX + key)
+                self._redis_succeeded()
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        # Entries written while Redis was down live only here
+        if value is None:
+            with self._lock:
+                entry = self._local.get(key)
+                if entry is not None and entry[0] > time.time():
+                    self._local.move_to_end(key)
+                    value = entry[1]
+
+        GENERATION_CACHE_LOOKUPS.labels(result="hit" if value is not None else "miss").inc()
+        return json.loads(value) if value is not None else None
+
+    def put(self, key: str, result: Dict[str, Any], tags: List[str]):
+        value = json.dumps(result, default=str)
+        client = self._client()
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                pipe.setex(KEY_PREFIX + key, self.ttl, value)
+                for tag in tags:
+                    pipe.sadd(TAG_PREFIX + tag, key)
+                    pipe.expire(TAG_PREFIX + tag, self.ttl)
+                pipe.execute()
+                self._redis_succeeded()
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+        with self._lock:
+            self._local[key] = (time.time() + self.ttl, value)
+            self._local.move_to_end(key)
+            for tag in tags:
+                self._local_tags[tag].add(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def version(self, name: str) -> Optional[int]:
+        """
+        Shared counter `name`, or None while Redis is not in use. A missing
+        counter starts at a random value, so one lost with Redis is not repeated.
+        """
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            value = client.get(VERSION_PREFIX + name)
+            if value is None:
+                client.set(VERSION_PREFIX + name, random.getrandbits(48), nx=True)
+                value = client.get(VERSION_PREFIX + name)
+            self._redis_succeeded()
+            return int(value)
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return None
+
+    def bump_version(self, name: str):
+        """Advance shared counter `name`; a bump Redis missed is replayed once it answers"""
+        client = self._client()
+        if client is not None:
+            try:
+                client.incr(VERSION_PREFIX + name)
+                self._redis_succeeded()
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        if self._redis is not None:
+            with self._lock:
+                self._missed_versions.add(name)
+
+    def invalidate(self, *tags: str):
+        """Drop every entry registered under any of `tags`"""
+        tags_missed = self._redis is not None
+        if self._client() is not None:
+            try:
+                self._invalidate_redis(tags)
+                self._redis_succeeded()
+                tags_missed = False
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+        with self._lock:
+            if tags_missed:
+                # Replayed once Redis answers again, so it never serves an entry invalidated meanwhile
+                self._missed_tags.update(tags)
+            for tag in tags:
+                for key in self._local_tags.pop(tag, set()):
+                    self._local.pop(key, None)
+
+
+def restore_generation(db: Session, batch_ids: List[int], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serve a cached result: its rows are written again unless every one of them
+    is still in the Timetable table. Regenerating or editing any of its batches
+    since replaced some of them.
+    """
+    result = dict(result, cached=True)
+    stored = db.query(func.count(Timetable.id)).filter(
+        Timetable.generation_id == result.get('generation_id')
+    ).scalar()
+    if result.get('timetable') and stored != len(result['timetable']):
+        result['generation_id'] = replace_generation(db, batch_ids, result['timetable'])
+    return result
+
+
+generation_cache = GenerationCache()
+
+
+def _leave_tag(day) -> str:
+    return f"leaves:{week_bounds(day)[0].date().isoformat()}"
+
+
+@event.listens_for(Leave, "after_insert")
+@event.listens_for(Leave, "after_update")
+@event.listens_for(Leave, "after_delete")
+def _note_leave_week(mapper, connection, target):
+    # Leaves are created and approved outside this API; every write drops the cached generations of its weeks
+    session = object_session(target)
+    if session is not None:
+        days = {target.date, *(inspect(target).attrs.date.history.deleted or ())}
+        session.info.setdefault("changed_leave_weeks", set()).update(_leave_tag(day) for day in days if day)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_leave_weeks(session):
+    tags = session.info.pop("changed_leave_weeks", None)
+    if tags:
+        generation_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_leave_weeks(session):
+    session.info.pop("changed_leave_weeks", None)
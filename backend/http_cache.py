@@ -0,0 +1,139 @@
+"""
+Versioned, pre-serialized responses for the read endpoints.
+
+Every cached resource (a table behind a list endpoint, or the timetables) has
+a version counter that writes bump. ETags derive from that counter alone, so a
+matching If-None-Match is answered 304 before any query runs; the gzip
+encoding has its own ETag. Otherwise the body comes from an in-process LRU
+holding the serialized JSON and its gzip encoding, built once per version.
+main.py keeps the counters in Redis through generation_cache, so every API
+worker sees every other worker's writes; without Redis each process counts
+its own writes and only a single worker may serve. Timetable writes made by generation pool
+processes are bumped when their job finishes.
+"""
+from collections import OrderedDict
+from fastapi import Request, Response
+from functools import lru_cache
+from pydantic import TypeAdapter
+from typing import Any, Callable, Optional, Tuple
+import gzip
+import os
+import threading
+import uuid
+import zlib
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# Bodies smaller than this are not worth a gzip frame
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+RESOURCES = ("classrooms", "faculty", "subjects", "batches", "timetables")
+
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def _serialize(data: Any, model: Optional[Any]) -> bytes:
+    """JSON body as FastAPI would produce it for `response_model=model`"""
+    if isinstance(data, (bytes, str)):
+        return data.encode() if isinstance(data, str) else data
+    adapter = _adapter(model)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class ResponseCache:
+    """
+    `shared` holds the version counters all API processes see (a
+    GenerationCache); while it has none, the process's own counters are used.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, shared: Optional[Any] = None):
+        self.max_entries = max_entries
+        self.shared = shared
+        # ETags of a restarted process never match the ones it handed out before
+        self._epoch = uuid.uuid4().hex[:8]
+        self._versions = {resource: 0 for resource in RESOURCES}
+        self._bodies: "OrderedDict[Tuple[str, str, str], Tuple[bytes, Optional[bytes]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version(self, resource: str) -> str:
+        shared = self.shared.version(resource) if self.shared is not None else None
+        if shared is not None:
+            return f"r{shared:x}"
+        return f"{self._epoch}.{self._versions[resource]}"
+
+    def _etag(self, resource: str, version: str, key: str, encoding: str = "") -> str:
+        # Strong validator per encoding; URLs sharing a resource differ by a short hash of their key
+        suffix = f"-{zlib.crc32(key.encode()):08x}" if key else ""
+        if encoding:
+            suffix += f"-{encoding}"
+        return f'"{version}-{resource}{suffix}"'
+
+    def bump(self, *resources: str):
+        """Record a write: new ETags, and cached bodies of the resources are dropped"""
+        with self._lock:
+            for resource in resources:
+                self._versions[resource] += 1
+            for key in [key for key in self._bodies if key[0] in resources]:
+                del self._bodies[key]
+        if self.shared is not None:
+            for resource in resources:
+                self.shared.bump_version(resource)
+
+    def respond(
+        self,
+        request: Request,
+        resource: str,
+        load: Callable[[], Any],
+        model: Optional[Any] = None,
+        key: str = ""
+    ) -> Response:
+        """
+        304 when the client holds the current version, else the cached body for
+        this version of `resource` (`key` tells apart URLs sharing it), loading
+        and serializing it with `model` on a miss. `load` may return ready JSON.
+        """
+        version = self._version(resource)
+        accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+        etag = self._etag(resource, version, key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        # Small bodies are never gzipped, so a client accepting gzip may hold either tag
+        for candidate in ([self._etag(resource, version, key, "gz")] if accepts_gzip else []) + [etag]:
+            if _matches(request.headers.get("if-none-match"), candidate):
+                return Response(status_code=304, headers=dict(headers, ETag=candidate))
+
+        cache_key = (resource, key, version)
+        with self._lock:
+            entry = self._bodies.get(cache_key)
+            if entry is not None:
+                self._bodies.move_to_end(cache_key)
+        if entry is None:
+            body = _serialize(load(), model)
+            entry = (body, gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None)
+            # A write while loading makes this body stale; serve it, don't keep it
+            current = self._version(resource)
+            with self._lock:
+                if current == version:
+                    self._bodies[cache_key] = entry
+                    while len(self._bodies) > self.max_entries:
+                        self._bodies.popitem(last=False)
+
+        body, compressed = entry
+        if compressed is not None and accepts_gzip:
+            headers["Content-Encoding"] = "gzip"
+            headers["ETag"] = self._etag(resource, version, key, "gz")
+            body = compressed
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,298 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from pydantic import BaseModel, Field
+from typing import Callable, List, Dict, Any, Optional
+from datetime import datetime
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+
+from generation_cache import generation_cache
+from http_cache import response_cache
+from monitoring import record_generation
+from timetable_engine import TimetableGenerator, DEFAULT_SOLVER_PARAMS
+
+# Number of generations solved at the same time; each one may use several CP-SAT workers
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+# Finished jobs are kept this long so clients can poll their result
+JOB_RETENTION_SECONDS = int(os.getenv("GENERATION_JOB_RETENTION_SECONDS", "3600"))
+
+
+class SolverParameters(BaseModel):
+    max_time_in_seconds: float = Field(DEFAULT_SOLVER_PARAMS['max_time_in_seconds'], gt=0, le=3600)
+    num_search_workers: int = Field(DEFAULT_SOLVER_PARAMS['num_search_workers'], ge=1, le=64)
+    relative_gap_limit: float = Field(DEFAULT_SOLVER_PARAMS['relative_gap_limit'], ge=0, le=1)
+
+
+class GenerationJobRequest(BaseModel):
+    batch_ids: List[int]
+    constraints: Dict[str, Any] = {}
+    use_ai_suggestions: bool = True
+    decompose: bool = False
+    warm_start: bool = False
+    # Improve a greedy timetable by large neighbourhood search, for instances too big for one model
+    lns: bool = False
+    solver: SolverParameters = SolverParameters()
+
+
+def run_generation(
+    batch_ids: List[int],
+    constraints: Dict[str, Any],
+    use_ai_suggestions: bool,
+    decompose: bool,
+    warm_start: bool,
+    lns: bool,
+    solver_params: Dict[str, Any],
+    cancel_event: Any,
+    accept_event: Any,
+    progress: Any,
+    session_factory: Optional[Callable[[], Any]] = None
+) -> Dict[str, Any]:
+    """Entry point executed inside a pool process with its own DB session"""
+    if session_factory is None:
+        # The API database, configured from the environment the worker inherits
+        from database import SessionLocal as session_factory
+    db = session_factory()
+    try:
+        generator = TimetableGenerator(
+            db,
+            solver_params=solver_params,
+            cancel_event=cancel_event,
+            accept_event=accept_event,
+            progress=progress
+        )
+        return asyncio.run(generator.generate_optimized_timetable(
+            batch_ids=batch_ids,
+            constraints=constraints,
+            use_ai_suggestions=use_ai_suggestions,
+            decompose=decompose,
+            warm_start=warm_start,
+            lns=lns
+        ))
+    finally:
+        db.close()
+
+
+class GenerationJob:
+    def __init__(
+        self,
+        job_id: str,
+        request: GenerationJobRequest,
+        future: Future,
+        cancel_event: Any,
+        accept_event: Any,
+        progress: Any,
+        cache_key: Optional[str] = None,
+        cache_tags: Optional[List[str]] = None
+    ):
+        self.id = job_id
+        self.request = request
+        self.future = future
+        self.cancel_event = cancel_event
+        self.accept_event = accept_event
+        self.progress = progress
+        self.cache_key = cache_key
+        self.cache_tags = cache_tags or []
+        self.events: List[Dict[str, Any]] = []
+        self.submitted_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self._events_lock = threading.Lock()
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future):
+        self.finished_at = datetime.utcnow()
+        if not future.cancelled() and future.exception() is None:
+            result = future.result()
+            if result.get('cached'):
+                return
+            # The worker process wrote the timetable rows: cached timetable responses are stale
+            response_cache.bump("timetables")
+            record_generation(result)
+            # A stopped-early incumbent is what the user settled for, not what this request would get
+            if self.cache_key and result.get('status') == 'success' and not result.get('stopped_early'):
+                generation_cache.put(self.cache_key, result, self.cache_tags)
+
+    def drain_events(self) -> List[Dict[str, Any]]:
+        """Move progress events published by the worker into the job history"""
+        with self._events_lock:
+            while True:
+                try:
+                    self.events.append(self.progress.get_nowait())
+                except (queue.Empty, EOFError, OSError):
+                    break
+            return self.events
+
+    @property
+    def best_solution(self) -> Optional[Dict[str, Any]]:
+        for event in reversed(self.drain_events()):
+            if event['event'] == 'solution':
+                return {key: value for key, value in event.items() if key != 'timetable'}
+        return None
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            if self.cancel_event.is_set():
+                return "cancelling"
+            if self.accept_event.is_set():
+                return "accepting"
+            return "running" if self.future.running() else "queued"
+        if self.future.exception() is not None:
+            return "failed"
+        return "cancelled" if self.future.result().get('status') == 'cancelled' else "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "batch_ids": self.request.batch_ids,
+            "solver": self.request.solver.model_dump(),
+            "submitted_at": self.submitted_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "best_solution": self.best_solution,
+            "result": None,
+            "error": None
+        }
+        if self.future.done() and not self.future.cancelled():
+            error = self.future.exception()
+            if error is not None:
+                job["error"] = str(error)
+            else:
+                job["result"] = self.future.result()
+        return job
+
+
+class GenerationJobManager:
+    """
+    Runs timetable generations in a process pool so CP-SAT never blocks the
+    API event loop. Cancellation is cooperative: the worker watches a shared
+    event and stops the search. session_factory opens the worker's DB session;
+    it is sent to the pool, so it must be picklable, and defaults to the API's
+    database.SessionLocal.
+    """
+
+    def __init__(self, max_workers: int = GENERATION_WORKERS, session_factory: Optional[Callable[[], Any]] = None):
+        self.max_workers = max_workers
+        self.session_factory = session_factory
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._sync_manager = None
+
+    def _ensure_started(self):
+        # Spawned, not forked: the API process runs threads and an event loop
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._sync_manager = context.Manager()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def _prune(self):
+        now = datetime.utcnow()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and (now - job.finished_at).total_seconds() > JOB_RETENTION_SECONDS
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(
+        self,
+        request: GenerationJobRequest,
+        cache_key: Optional[str] = None,
+        cache_tags: Optional[List[str]] = None
+    ) -> GenerationJob:
+        """Queue a generation; a successful result is stored under `cache_key`"""
+        with self._lock:
+            self._ensure_started()
+            self._prune()
+            cancel_event = self._sync_manager.Event()
+            accept_event = self._sync_manager.Event()
+            progress = self._sync_manager.Queue()
+            future = self._executor.submit(
+                run_generation,
+                request.batch_ids,
+                request.constraints,
+                request.use_ai_suggestions,
+                request.decompose,
+                request.warm_start,
+                request.lns,
+                request.solver.model_dump(),
+                cancel_event,
+                accept_event,
+                progress,
+                self.session_factory
+            )
+            job = GenerationJob(
+                uuid.uuid4().hex, request, future, cancel_event, accept_event, progress, cache_key, cache_tags
+            )
+            self._jobs[job.id] = job
+            return job
+
+    def completed(self, request: GenerationJobRequest, result: Dict[str, Any]) -> GenerationJob:
+        """Register a job already answered from the generation cache"""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        future.set_result(result)
+        with self._lock:
+            self._prune()
+            job = GenerationJob(uuid.uuid4().hex, request, future, threading.Event(), threading.Event(), queue.Queue())
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[GenerationJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        # Queued jobs are dropped outright, running ones stop and keep their last incumbent
+        if not job.future.cancel():
+            job.cancel_event.set()
+        return job
+
+    def accept(self, job_id: str) -> Optional[GenerationJob]:
+        """Stop searching and keep the current incumbent as the job's result"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.accept_event.set()
+        return job
+
+    async def stream_events(self, job: GenerationJob, poll_interval: float = 0.5):
+        """Server-sent events: one frame per progress event, then the final job status"""
+        sent = 0
+        while True:
+            done = job.future.done()
+            events = job.drain_events()
+            for event in events[sent:]:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            sent = len(events)
+            if done:
+                break
+            await asyncio.sleep(poll_interval)
+
+        final = job.to_dict()
+        final.pop("result")
+        yield f"event: done\ndata: {json.dumps(final)}\n\n"
+
+    async def wait(self, job: GenerationJob) -> Dict[str, Any]:
+        return await asyncio.wrap_future(job.future)
+
+    def shutdown(self):
+        if self._executor is not None:
+            for job in self._jobs.values():
+                if not job.future.done():
+                    job.cancel_event.set()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._sync_manager.shutdown()
+            self._executor = None
+            self._sync_manager = None
+
+
+job_manager = GenerationJobManager()
@@ -0,0 +1,503 @@
+"""
+Large Neighbourhood Search for instances too large for the monolithic model.
+
+The timetable is held as one row per session (SESSION_COLUMNS, indices into
+the instance's batch/faculty/room arrays) plus occupancy grids. A greedy pass
+places every session; each iteration then frees a bounded neighbourhood (the
+classes of one day, of a few faculty, or of some interchangeable rooms),
+re-solves only those sessions with CP-SAT around the pinned rest, and keeps
+the result when the global objective does not get worse. Day neighbourhoods
+touch disjoint cells, so several of them are solved in parallel processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from ortools.sat.python import cp_model
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from collections import defaultdict
+import multiprocessing
+import random
+import time
+import numpy as np
+
+from availability import DAYS, TIME_SLOTS, WeeklyAvailability, block_starts, slot_matrix
+from models import Batch, Classroom, Faculty, Subject
+from timetable_engine import (
+    DEFAULT_BALANCE_WEIGHT, DEFAULT_GAP_WEIGHT, LAB_BLOCK_SLOTS, LAB_ROOM_TYPES, LECTURE_ROOM_TYPES,
+    ScheduleModel, _batch_subject_ids, _lab_blocks, _qualified_faculty, _room_classes
+)
+
+# Sessions freed per neighbourhood: bounds every sub-model, whatever the instance size
+LNS_MAX_SESSIONS = 60
+LNS_ITERATION_SECONDS = 1.0
+# Rooms offered per session and start slot in a sub-model
+LNS_ROOM_CANDIDATES = 3
+LNS_UNPLACED_PENALTY = 1000
+NEIGHBOURHOODS = ('day', 'faculty', 'rooms')
+
+SESSION_COLUMNS = ('batch', 'subject', 'kind', 'length', 'faculty', 'room', 'day', 'start')
+BATCH, SUBJECT, KIND, LENGTH, FACULTY, ROOM, DAY, START = range(len(SESSION_COLUMNS))
+KINDS = ('lecture', 'lab')  # values of the kind column
+
+
+def _block_ok(free: np.ndarray, length: int) -> np.ndarray:
+    """True at (..., day, start) when `length` slots from start are all free and do not cross a break"""
+    ok = free.copy()
+    for offset in range(1, length):
+        ok[..., :-offset] &= free[..., offset:]
+        ok[..., -offset:] = False
+    valid = np.zeros(len(TIME_SLOTS), dtype=bool)
+    valid[block_starts(length)] = True
+    return ok & valid
+
+
+def _cells(sessions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Placed sessions expanded to one row per covered slot, with the slot index"""
+    placed = sessions[sessions[:, DAY] >= 0]
+    lengths = placed[:, LENGTH]
+    rows = np.repeat(placed, lengths, axis=0)
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, rows[:, START] + offset
+
+
+class Instance:
+    """Static data of a generation as flat arrays indexed by position"""
+
+    def __init__(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Dict[str, Any],
+        availability: WeeklyAvailability
+    ):
+        self.batch_ids = [b.id for b in batches]
+        self.room_ids = [c.id for c in classrooms]
+        self.faculty_ids = [f.id for f in faculty]
+        self.subject_ids = [s.id for s in subjects]
+        self.sizes = np.array([b.student_count or 0 for b in batches])
+        self.room_sizes = np.array([c.capacity or 0 for c in classrooms])
+        self.room_free = slot_matrix([availability.room(c.id) for c in classrooms])
+        self.fac_free = slot_matrix([availability.teacher(f.id) for f in faculty])
+        self.max_daily = np.array([f.max_daily_classes or 0 for f in faculty])
+        self.gap_weight = int(constraints.get('gap_weight', DEFAULT_GAP_WEIGHT))
+        self.balance_weight = int(constraints.get('balance_weight', DEFAULT_BALANCE_WEIGHT))
+
+        room_types = np.array([c.type for c in classrooms], dtype=object)
+        self.kind_rooms = [np.isin(room_types, list(types)) for types in (LECTURE_ROOM_TYPES, LAB_ROOM_TYPES)]
+        room_index = {room_id: r for r, room_id in enumerate(self.room_ids)}
+        self.room_groups = [
+            np.array([room_index[room_id] for room_id in group])
+            for group in _room_classes(classrooms, availability).values()
+        ]
+
+        faculty_index = {fac_id: f for f, fac_id in enumerate(self.faculty_ids)}
+        qualified = _qualified_faculty(faculty)
+        lab_block_slots = int(constraints.get('lab_block_slots', LAB_BLOCK_SLOTS))
+        # (batch, subject, kind) -> block lengths and qualified faculty, one entry per requirement
+        self.requirements = []
+        for b, batch in enumerate(batches):
+            curriculum = _batch_subject_ids(batch, subjects)
+            for s, subject in enumerate(subjects):
+                if subject.id not in curriculum:
+                    continue
+                teachers = [faculty_index[f] for f in qualified.get(subject.id, []) if f in faculty_index]
+                if subject.lecture_hours:
+                    self.requirements.append((b, s, 0, [1] * subject.lecture_hours, teachers))
+                if subject.lab_hours:
+                    self.requirements.append((b, s, 1, _lab_blocks(subject.lab_hours, lab_block_slots), teachers))
+
+    def rooms_for(self, kind: int, batch: int) -> np.ndarray:
+        """Rooms that can host the session, smallest first"""
+        rooms = np.flatnonzero(self.kind_rooms[kind] & (self.room_sizes >= self.sizes[batch]))
+        return rooms[np.argsort(self.room_sizes[rooms], kind='stable')]
+
+
+class Occupancy:
+    """Busy grids and daily loads of a set of placed sessions"""
+
+    def __init__(self, instance: Instance, sessions: np.ndarray):
+        shape = (len(DAYS), len(TIME_SLOTS))
+        self.batch = np.zeros((len(instance.batch_ids),) + shape, dtype=bool)
+        self.room = np.zeros((len(instance.room_ids),) + shape, dtype=bool)
+        self.faculty = np.zeros((len(instance.faculty_ids),) + shape, dtype=bool)
+        self.load = np.zeros((len(instance.faculty_ids), len(DAYS)), dtype=np.int64)
+        self.add(sessions)
+
+    def add(self, sessions: np.ndarray, value: bool = True):
+        rows, slots = _cells(sessions)
+        self.batch[rows[:, BATCH], rows[:, DAY], slots] = value
+        self.room[rows[:, ROOM], rows[:, DAY], slots] = value
+        self.faculty[rows[:, FACULTY], rows[:, DAY], slots] = value
+        np.add.at(self.load, (rows[:, FACULTY], rows[:, DAY]), 1 if value else -1)
+
+
+def objective(instance: Instance, sessions: np.ndarray) -> int:
+    """The generation objective (see TimetableGenerator._add_soft_objective) plus unplaced penalties"""
+    occupancy = Occupancy(instance, sessions)
+    busy = occupancy.batch
+    # A run starts at every busy slot that does not follow another busy slot
+    runs = busy & ~np.concatenate([np.zeros(busy.shape[:2] + (1,), dtype=bool), busy[..., :-1]], axis=2)
+    gaps = int(runs.sum() - busy.any(axis=2).sum())
+    peaks = int(occupancy.load.max(axis=1).sum()) if len(occupancy.load) else 0
+    unplaced = int((sessions[:, DAY] < 0).sum())
+    return instance.gap_weight * gaps + instance.balance_weight * peaks + LNS_UNPLACED_PENALTY * unplaced
+
+
+def greedy_schedule(instance: Instance) -> np.ndarray:
+    """
+    Place every requirement with one teacher, labs and scarce requirements first,
+    each session on the least loaded day it fits, next to the batch's other
+    classes when possible. Sessions that fit nowhere are left unplaced (day -1).
+    """
+    occupancy = Occupancy(instance, np.zeros((0, len(SESSION_COLUMNS)), dtype=np.int64))
+    rows = []
+    order = sorted(
+        instance.requirements,
+        key=lambda r: (-max(r[3]), len(r[4]), -instance.sizes[r[0]])
+    )
+    for b, s, kind, lengths, teachers in order:
+        rooms = instance.rooms_for(kind, b)
+        lengths = sorted(lengths, reverse=True)
+        # The first teacher who takes every session wins; else the one who took most
+        best_teacher, best_count = (teachers[0] if teachers else -1), -1
+        for f in sorted(teachers, key=lambda f: occupancy.load[f].sum()):
+            placed = _place_requirement(instance, occupancy, b, s, kind, lengths, f, rooms)
+            if len(placed) == len(lengths):
+                break
+            occupancy.add(np.array(placed, dtype=np.int64).reshape(-1, len(SESSION_COLUMNS)), value=False)
+            if len(placed) > best_count:
+                best_teacher, best_count = f, len(placed)
+        else:
+            placed = _place_requirement(instance, occupancy, b, s, kind, lengths, best_teacher, rooms) if teachers else []
+        rows.extend(placed)
+        # Whatever did not fit waits, unplaced, for the search to find it a slot
+        teacher = placed[0][FACULTY] if placed else best_teacher
+        rows.extend([b, s, kind, length, teacher, -1, -1, -1] for length in lengths[len(placed):])
+    return np.array(rows, dtype=np.int64).reshape(-1, len(SESSION_COLUMNS))
+
+
+def _place_requirement(
+    instance: Instance,
+    occupancy: Occupancy,
+    b: int,
+    s: int,
+    kind: int,
+    lengths: List[int],
+    f: int,
+    rooms: np.ndarray
+) -> List[List[int]]:
+    """Place sessions with teacher f until one does not fit; placed rows stay in `occupancy`"""
+    placed = []
+    for length in lengths:
+        spot = _first_fit(instance, occupancy, b, f, rooms, length, {row[DAY] for row in placed})
+        if spot is None:
+            break
+        row = [b, s, kind, length, f, spot[2], spot[0], spot[1]]
+        occupancy.add(np.array([row], dtype=np.int64))
+        placed.append(row)
+    return placed
+
+
+def _first_fit(
+    instance: Instance,
+    occupancy: Occupancy,
+    b: int,
+    f: int,
+    rooms: np.ndarray,
+    length: int,
+    used_days: set
+) -> Optional[Tuple[int, int, int]]:
+    if not rooms.size:
+        return None
+    free = ~occupancy.batch[b] & ~occupancy.faculty[f] & instance.fac_free[f]
+    room_free = _block_ok(instance.room_free[rooms] & ~occupancy.room[rooms], length)
+    fits = (
+        _block_ok(free, length)
+        & (occupancy.load[f] + length <= instance.max_daily[f])[:, None]
+        & room_free.any(axis=0)
+    )
+    if not fits.any():
+        return None
+
+    batch_day = occupancy.batch[b]
+    for day in sorted(range(len(DAYS)), key=lambda d: (d in used_days, occupancy.load[f, d], batch_day[d].sum())):
+        starts = np.flatnonzero(fits[day])
+        if not starts.size:
+            continue
+        # Prefer a start touching the batch's other classes that day: fewer idle gaps
+        touching = [
+            t for t in starts.tolist()
+            if (t > 0 and batch_day[day, t - 1]) or (t + length < len(TIME_SLOTS) and batch_day[day, t + length])
+        ]
+        start = touching[0] if touching else int(starts[0])
+        return day, start, int(rooms[np.argmax(room_free[:, day, start])])
+    return None
+
+
+def solve_neighbourhood(problem: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Re-place the freed sessions of one neighbourhood around the pinned rest.
+    Runs in a pool process; returns (day, start, room) per freed session,
+    -1 for sessions left unplaced, or None when no solution was found.
+    """
+    sessions = problem['sessions']
+    model = cp_model.CpModel()
+    schedule = ScheduleModel(model)
+    options = []  # per session: [(literal, day, start, room)]
+    penalties = []
+
+    for i, row in enumerate(sessions.tolist()):
+        b, s, kind, length, f = row[BATCH], row[SUBJECT], row[KIND], row[LENGTH], row[FACULTY]
+        free = ~problem['batch_busy'][b] & ~problem['fac_busy'][f] & problem['fac_free'][f]
+        fits = _block_ok(free, length)
+        rooms = problem['rooms'][i]
+        room_fits = _block_ok(problem['room_free'][rooms], length)
+        candidates = []
+        for day in problem['days']:
+            for start in np.flatnonzero(fits[day] & room_fits[:, day].any(axis=0)).tolist():
+                for position in np.flatnonzero(room_fits[:, day, start])[:LNS_ROOM_CANDIDATES].tolist():
+                    r = problem['room_ids'][rooms[position]]
+                    literal = schedule.add_assignment(b, day, start, r, s, f, length)
+                    candidates.append((literal, day, start, r))
+        options.append(candidates)
+        unplaced = model.NewBoolVar(f'unplaced_{i}')
+        model.AddExactlyOne([literal for literal, _, _, _ in candidates] + [unplaced])
+        penalties.append(LNS_UNPLACED_PENALTY * unplaced)
+
+        # Start from the current placement
+        current = (row[DAY], row[START], row[ROOM])
+        for literal, day, start, r in candidates:
+            model.AddHint(literal, (day, start, r) == current)
+        model.AddHint(unplaced, not any((day, start, r) == current for _, day, start, r in candidates))
+
+    for index in (schedule.by_batch, schedule.by_room, schedule.by_faculty):
+        for literals in index.values():
+            schedule.add_at_most(literals, 1)
+    for (f, day), terms in schedule.by_faculty_day.items():
+        schedule.add_load_limit(terms, int(problem['max_daily'][f] - problem['fac_load'][f][day]))
+
+    # The current placement, to hint the objective variables as well: a partial hint is slow to repair
+    current_busy = {b: busy.copy() for b, busy in problem['batch_busy'].items()}
+    current_load = {f: load.copy() for f, load in problem['fac_load'].items()}
+    for row in sessions[sessions[:, DAY] >= 0].tolist():
+        current_busy[row[BATCH]][row[DAY], row[START]:row[START] + row[LENGTH]] = True
+        current_load[row[FACULTY]][row[DAY]] += row[LENGTH]
+
+    # Same soft objective as the full model, with pinned classes as constants
+    terms = list(penalties)
+    if problem['gap_weight']:
+        for b in problem['batch_busy']:
+            for day in problem['days']:
+                busy = [
+                    1 if problem['batch_busy'][b][day, t] else sum(schedule.by_batch.get((b, day, t), []))
+                    for t in range(len(TIME_SLOTS))
+                ]
+                runs = []
+                for t in range(len(TIME_SLOTS)):
+                    run = model.NewBoolVar(f'run_{b}_{day}_{t}')
+                    model.Add(run >= busy[t] - (busy[t - 1] if t else 0))
+                    model.AddHint(run, bool(current_busy[b][day, t] and not (t and current_busy[b][day, t - 1])))
+                    runs.append(run)
+                active = model.NewBoolVar(f'active_{b}_{day}')
+                model.Add(active <= sum(busy))
+                model.AddHint(active, bool(current_busy[b][day].any()))
+                terms.append(problem['gap_weight'] * (sum(runs) - active))
+    if problem['balance_weight']:
+        for f in problem['fac_busy']:
+            peak = model.NewIntVar(0, len(TIME_SLOTS), f'peak_{f}')
+            for day in range(len(DAYS)):
+                load = sum(length * literal for literal, length in schedule.by_faculty_day.get((f, day), []))
+                model.Add(peak >= int(problem['fac_load'][f][day]) + load)
+            model.AddHint(peak, int(current_load[f].max()))
+            terms.append(problem['balance_weight'] * peak)
+    model.Minimize(sum(terms))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = problem['seconds']
+    solver.parameters.num_search_workers = 1
+    solver.parameters.random_seed = problem['seed']
+    status = solver.Solve(model)
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        return None
+
+    placements = np.full((len(sessions), 3), -1, dtype=np.int64)
+    for i, candidates in enumerate(options):
+        for literal, day, start, r in candidates:
+            if solver.BooleanValue(literal):
+                placements[i] = (day, start, r)
+                break
+    return placements
+
+
+class LargeNeighbourhoodSearch:
+    """Anytime improvement of a greedy timetable by re-solving bounded neighbourhoods"""
+
+    def __init__(self, instance: Instance, workers: int = 1, seed: int = 0,
+                 iteration_seconds: float = LNS_ITERATION_SECONDS, max_sessions: int = LNS_MAX_SESSIONS):
+        self.instance = instance
+        self.workers = max(1, workers)
+        self.iteration_seconds = iteration_seconds
+        self.max_sessions = max_sessions
+        self.rng = random.Random(seed)
+        self.sessions = greedy_schedule(instance)
+        self.objective = objective(instance, self.sessions)
+        self.initial_objective = self.objective
+        self.stats = defaultdict(int)
+        self.max_neighbourhood = 0
+
+    @property
+    def unplaced(self) -> int:
+        return int((self.sessions[:, DAY] < 0).sum())
+
+    def _pick(self, kind: str, day: Optional[int], taken: set) -> Tuple[np.ndarray, List[int], Optional[np.ndarray]]:
+        """Freed session indices, allowed days and, for room neighbourhoods, the allowed rooms"""
+        sessions = self.sessions
+        unplaced = [i for i in np.flatnonzero(sessions[:, DAY] < 0).tolist() if i not in taken]
+        rooms = None
+        if kind == 'day':
+            # The day's classes of a window of consecutive batches (batches of one program sit together)
+            start = self.rng.randrange(len(self.instance.batch_ids))
+            order = (np.arange(len(self.instance.batch_ids)) + start) % len(self.instance.batch_ids)
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            on_day = np.flatnonzero(sessions[:, DAY] == day)
+            freed = on_day[np.argsort(rank[sessions[on_day, BATCH]], kind='stable')][:self.max_sessions].tolist()
+            batches = set(sessions[freed, BATCH].tolist())
+            freed = [i for i in unplaced if sessions[i, BATCH] in batches] + freed
+            days = [day]
+        elif kind == 'faculty':
+            # One of the faculty with the busiest day, then the next busiest until the cap
+            load = Occupancy(self.instance, sessions).load.max(axis=1)
+            ranked = sorted(range(len(load)), key=lambda f: (-load[f], self.rng.random()))
+            if ranked:
+                ranked.insert(0, ranked.pop(self.rng.randrange(min(5, len(ranked)))))
+            freed = []
+            for f in ranked:
+                if len(freed) >= self.max_sessions:
+                    break
+                freed.extend(np.flatnonzero(sessions[:, FACULTY] == f).tolist())
+            days = list(range(len(DAYS)))
+        else:
+            # Interchangeable rooms stand in for a building: the model has no building column
+            groups = [g for g in self.instance.room_groups if np.isin(sessions[:, ROOM], g).any()]
+            rooms = self.rng.choice(groups) if groups else np.array([], dtype=np.int64)
+            used = np.flatnonzero(np.isin(sessions[:, ROOM], rooms))
+            freed = self.rng.sample(used.tolist(), len(used))
+            days = list(range(len(DAYS)))
+        # Sessions nobody can teach stay unplaced whatever the neighbourhood
+        freed = [i for i in dict.fromkeys(freed) if i not in taken and sessions[i, FACULTY] >= 0][:self.max_sessions]
+        return np.array(freed, dtype=np.int64), days, rooms
+
+    def _problem(self, freed: np.ndarray, days: List[int], rooms: Optional[np.ndarray], seconds: float) -> Dict[str, Any]:
+        """Everything a pool process needs to re-solve one neighbourhood, and nothing more"""
+        instance = self.instance
+        pinned = np.ones(len(self.sessions), dtype=bool)
+        pinned[freed] = False
+        occupancy = Occupancy(instance, self.sessions[pinned])
+        sessions = self.sessions[freed]
+        batches = np.unique(sessions[:, BATCH]).tolist()
+        teachers = np.unique(sessions[:, FACULTY]).tolist()
+
+        candidate_rooms = []
+        for row in sessions.tolist():
+            options = instance.rooms_for(row[KIND], row[BATCH])
+            if rooms is not None:
+                options = options[np.isin(options, rooms)]
+            # The current room first keeps unchanged sessions where they are
+            candidate_rooms.append(np.concatenate([options[options == row[ROOM]], options[options != row[ROOM]]]))
+        room_ids = np.unique(np.concatenate(candidate_rooms)) if candidate_rooms else np.array([], dtype=np.int64)
+
+        return {
+            'sessions': sessions,
+            'days': days,
+            'rooms': [np.searchsorted(room_ids, options) for options in candidate_rooms],
+            'room_ids': room_ids.tolist(),
+            'batch_busy': {b: occupancy.batch[b] for b in batches},
+            'fac_busy': {f: occupancy.faculty[f] for f in teachers if f >= 0},
+            'fac_free': {f: instance.fac_free[f] for f in teachers if f >= 0},
+            'fac_load': {f: occupancy.load[f] for f in teachers if f >= 0},
+            'max_daily': {f: int(instance.max_daily[f]) for f in teachers if f >= 0},
+            'room_free': instance.room_free[room_ids] & ~occupancy.room[room_ids],
+            'gap_weight': instance.gap_weight,
+            'balance_weight': instance.balance_weight,
+            'seconds': seconds,
+            'seed': self.rng.randrange(1 << 30)
+        }
+
+    def _apply(self, freed: np.ndarray, placements: Optional[np.ndarray], kind: str) -> bool:
+        """Adopt a neighbourhood solution unless it makes the global objective worse"""
+        self.stats[f'{kind}_neighbourhoods'] += 1
+        if placements is None:
+            return False
+        before = self.sessions[freed][:, [DAY, START, ROOM]].copy()
+        self.sessions[freed, DAY] = placements[:, 0]
+        self.sessions[freed, START] = placements[:, 1]
+        self.sessions[freed, ROOM] = placements[:, 2]
+        value = objective(self.instance, self.sessions)
+        if value > self.objective:
+            self.sessions[freed, DAY] = before[:, 0]
+            self.sessions[freed, START] = before[:, 1]
+            self.sessions[freed, ROOM] = before[:, 2]
+            return False
+        improved = value < self.objective
+        self.objective = value
+        if improved:
+            self.stats[f'{kind}_improvements'] += 1
+        return improved
+
+    def run(self, deadline: float, should_stop: Callable[[], bool],
+            on_improvement: Optional[Callable[[], None]] = None):
+        """Improve until the deadline or a stop request; the incumbent is always feasible"""
+        executor = None
+        if self.workers > 1:
+            context = multiprocessing.get_context('spawn')
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        try:
+            round_idx = 0
+            while time.perf_counter() < deadline and not should_stop() and len(self.sessions):
+                kind = NEIGHBOURHOODS[round_idx % len(NEIGHBOURHOODS)]
+                round_idx += 1
+                seconds = min(self.iteration_seconds, max(0.1, deadline - time.perf_counter()))
+
+                # Day neighbourhoods on distinct days never share a cell: solve them side by side
+                days = self.rng.sample(range(len(DAYS)), min(self.workers, len(DAYS))) if kind == 'day' else [None]
+                taken = set()
+                batch = []
+                for day in days:
+                    freed, allowed_days, rooms = self._pick(kind, day, taken)
+                    if freed.size:
+                        taken.update(freed.tolist())
+                        batch.append((freed, self._problem(freed, allowed_days, rooms, seconds)))
+                if not batch:
+                    continue
+                self.max_neighbourhood = max(self.max_neighbourhood, max(len(freed) for freed, _ in batch))
+
+                if executor is not None and len(batch) > 1:
+                    results = list(executor.map(solve_neighbourhood, [problem for _, problem in batch]))
+                else:
+                    results = [solve_neighbourhood(problem) for _, problem in batch]
+                self.stats['iterations'] += 1
+                improved = False
+                for (freed, _), placements in zip(batch, results):
+                    improved = self._apply(freed, placements, kind) or improved
+                if improved and on_improvement is not None:
+                    on_improvement()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def timetable_rows(self) -> List[Dict[str, Any]]:
+        """Slot-level timetable rows of the placed sessions, as produced by the engine"""
+        rows, slots = _cells(self.sessions)
+        instance = self.instance
+        return [
+            {
+                'batch_id': instance.batch_ids[row[BATCH]],
+                'day': DAYS[row[DAY]],
+                'time_slot': TIME_SLOTS[slot],
+                'classroom_id': instance.room_ids[row[ROOM]],
+                'subject_id': instance.subject_ids[row[SUBJECT]],
+                'faculty_id': instance.faculty_ids[row[FACULTY]]
+            }
+            for row, slot in zip(rows.tolist(), slots.tolist())
+        ]
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import jwt
@@ -8,14 +10,26 @@ from datetime import datetime, timedelta
 import os
 
 from database import get_db, engine
-from models import Base
+from models import Base, Batch, Classroom, Faculty, Subject, Timetable
 from schemas import *
 from crud import *
 from timetable_engine import TimetableGenerator
+from jobs import job_manager, GenerationJobRequest, SolverParameters
+from generation_cache import generation_cache, generation_key, restore_generation
+from timetable_views import get_view, refresh_batches
+from http_cache import response_cache
+from listing import ListParams, list_response
+from principals import principal_cache
+from monitoring import track_request_latency, metrics_response
 from ai_suggestions import GeminiAIAssistant
+from analytics import EXPORT_TYPES, REPORTS, build_report, export_csv, parse_range
+from timetable_analysis import analyze_request
+from whatif import WhatIfBase, WhatIfRequest, whatif_simulator
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+# API workers see each other's writes through the response versions kept in Redis
+response_cache.shared = generation_cache
 
 app = FastAPI(title="Smart Classroom Scheduler API", version="1.0.0")
 
@@ -28,7 +42,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms for /metrics
+app.middleware("http")(track_request_latency)
+
 security = HTTPBearer()
+# One assistant for the process: configured once, bounded pool, shared response cache
+ai_assistant = GeminiAIAssistant()
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 
@@ -54,11 +73,22 @@ async def create_classroom(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return create_classroom_db(db, classroom)
+    created = create_classroom_db(db, classroom)
+    generation_cache.invalidate("classrooms")
+    response_cache.bump("classrooms")
+    return created
 
 @app.get("/api/classrooms", response_model=List[ClassroomResponse])
-async def get_classrooms(db: Session = Depends(get_db)):
-    return get_classrooms_db(db)
+async def get_classrooms(
+    request: Request,
+    type: Optional[str] = None,
+    params: ListParams = Depends(),
+    db: Session = Depends(get_db)
+):
+    return list_response(
+        request, db, "classrooms", Classroom, params, lambda: get_classrooms_db(db), List[ClassroomResponse],
+        type=type
+    )
 
 # Faculty management
 @app.post("/api/faculty", response_model=FacultyResponse)
@@ -69,11 +99,16 @@ async def create_faculty(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return create_faculty_db(db, faculty)
+    created = create_faculty_db(db, faculty)
+    generation_cache.invalidate("faculty")
+    response_cache.bump("faculty")
+    return created
 
 @app.get("/api/faculty", response_model=List[FacultyResponse])
-async def get_faculty(db: Session = Depends(get_db)):
-    return get_faculty_db(db)
+async def get_faculty(request: Request, params: ListParams = Depends(), db: Session = Depends(get_db)):
+    return list_response(
+        request, db, "faculty", Faculty, params, lambda: get_faculty_db(db), List[FacultyResponse]
+    )
 
 # Subject management
 @app.post("/api/subjects", response_model=SubjectResponse)
@@ -84,11 +119,16 @@ async def create_subject(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return create_subject_db(db, subject)
+    created = create_subject_db(db, subject)
+    generation_cache.invalidate("subjects")
+    response_cache.bump("subjects")
+    return created
 
 @app.get("/api/subjects", response_model=List[SubjectResponse])
-async def get_subjects(db: Session = Depends(get_db)):
-    return get_subjects_db(db)
+async def get_subjects(request: Request, params: ListParams = Depends(), db: Session = Depends(get_db)):
+    return list_response(
+        request, db, "subjects", Subject, params, lambda: get_subjects_db(db), List[SubjectResponse]
+    )
 
 # Batch management
 @app.post("/api/batches", response_model=BatchResponse)
@@ -99,11 +139,23 @@ async def create_batch(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return create_batch_db(db, batch)
+    created = create_batch_db(db, batch)
+    generation_cache.invalidate(f"batch:{created.id}")
+    response_cache.bump("batches")
+    return created
 
 @app.get("/api/batches", response_model=List[BatchResponse])
-async def get_batches(db: Session = Depends(get_db)):
-    return get_batches_db(db)
+async def get_batches(
+    request: Request,
+    program: Optional[str] = None,
+    semester: Optional[int] = None,
+    params: ListParams = Depends(),
+    db: Session = Depends(get_db)
+):
+    return list_response(
+        request, db, "batches", Batch, params, lambda: get_batches_db(db), List[BatchResponse],
+        program=program, semester=semester
+    )
 
 # Timetable generation
 @app.post("/api/timetable/generate", response_model=TimetableGenerationResponse)
@@ -115,21 +167,165 @@ async def generate_timetable(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    generator = TimetableGenerator(db)
-    result = await generator.generate_optimized_timetable(
+    job_request = GenerationJobRequest(
         batch_ids=request.batch_ids,
         constraints=request.constraints,
-        use_ai_suggestions=request.use_ai_suggestions
+        use_ai_suggestions=request.use_ai_suggestions,
+        solver=SolverParameters()
     )
+    # Identical inputs were solved before: answer from the cache. The key hashes
+    # every input row, so it is computed off the event loop
+    cache_key, cache_tags = await run_in_threadpool(generation_key, db, job_request)
+    cached = generation_cache.get(cache_key)
+    if cached is not None:
+        restored = restore_generation(db, job_request.batch_ids, cached)
+        response_cache.bump("timetables")
+        return restored
+    
+    # Solve in the generation pool so the event loop keeps serving reads
+    job = job_manager.submit(job_request, cache_key, cache_tags)
+    result = await job_manager.wait(job)
     
     return result
 
+# Background generation jobs
+@app.post("/api/timetable/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_timetable_job(
+    request: GenerationJobRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    cache_key, cache_tags = await run_in_threadpool(generation_key, db, request)
+    cached = generation_cache.get(cache_key)
+    if cached is not None:
+        job = job_manager.completed(request, restore_generation(db, request.batch_ids, cached))
+        response_cache.bump("timetables")
+    else:
+        job = job_manager.submit(request, cache_key, cache_tags)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/api/timetable/jobs/{job_id}")
+async def get_timetable_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/timetable/jobs/{job_id}/events")
+async def stream_timetable_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job_manager.stream_events(job), media_type="text/event-stream")
+
+@app.post("/api/timetable/jobs/{job_id}/accept")
+async def accept_timetable_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = job_manager.accept(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job.id, "status": job.status}
+
+@app.delete("/api/timetable/jobs/{job_id}")
+async def cancel_timetable_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/api/timetable/diagnose")
+async def diagnose_timetable(
+    request: TimetableGenerationRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    # Counting checks plus a short CP-SAT core extraction; solved off the event loop
+    generator = TimetableGenerator(db)
+    return await run_in_threadpool(generator.diagnose, request.batch_ids, request.constraints)
+
+@app.post("/api/timetable/whatif")
+async def simulate_timetable_changes(
+    request: WhatIfRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    # One snapshot read for every scenario; the solves run in the what-if pool and persist nothing
+    base = await run_in_threadpool(
+        WhatIfBase.load, db, request.batch_ids, request.constraints.get("week_start")
+    )
+    try:
+        return await whatif_simulator.run(base, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Dashboard reads: one stored grid per batch, faculty member or room (see timetable_views)
+@app.get("/api/timetable/batch/{batch_id}")
+async def get_batch_timetable(batch_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        grid = get_view(db, "batch", batch_id)
+        if grid is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return grid
+    return response_cache.respond(request, "timetables", load, key=f"batch:{batch_id}")
+
+@app.get("/api/timetable/faculty/{faculty_id}")
+async def get_faculty_timetable(faculty_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        grid = get_view(db, "faculty", faculty_id)
+        if grid is None:
+            raise HTTPException(status_code=404, detail="Faculty not found")
+        return grid
+    return response_cache.respond(request, "timetables", load, key=f"faculty:{faculty_id}")
+
+@app.get("/api/timetable/room/{classroom_id}")
+async def get_room_timetable(classroom_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        grid = get_view(db, "room", classroom_id)
+        if grid is None:
+            raise HTTPException(status_code=404, detail="Classroom not found")
+        return grid
+    return response_cache.respond(request, "timetables", load, key=f"room:{classroom_id}")
+
 @app.get("/api/timetable/{batch_id}", response_model=TimetableResponse)
-async def get_timetable(batch_id: int, db: Session = Depends(get_db)):
-    timetable = get_timetable_db(db, batch_id)
-    if not timetable:
-        raise HTTPException(status_code=404, detail="Timetable not found")
-    return timetable
+async def get_timetable(batch_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        timetable = get_timetable_db(db, batch_id)
+        if not timetable:
+            raise HTTPException(status_code=404, detail="Timetable not found")
+        return timetable
+    return response_cache.respond(request, "timetables", load, TimetableResponse, key=f"timetable:{batch_id}")
 
 @app.post("/api/timetable/approve")
 async def approve_timetable(
@@ -140,7 +336,39 @@ async def approve_timetable(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    return approve_timetable_db(db, request.timetable_id, current_user.id)
+    timetable = db.query(Timetable.batch_id).filter(Timetable.id == request.timetable_id).first()
+    if timetable is None:
+        raise HTTPException(status_code=404, detail="Timetable not found")
+    # Warm-started generations of this batch were seeded from its approved timetable
+    batch_id = timetable.batch_id
+    approved = approve_timetable_db(db, request.timetable_id, current_user.id)
+    generation_cache.invalidate(f"approved:{batch_id}")
+    # The approved generation replaces the draft in every grid it appears in
+    refresh_batches(db, [batch_id])
+    db.commit()
+    response_cache.bump("timetables")
+    return approved
+
+# Leave handling
+@app.post("/api/leaves/{leave_id}/reschedule")
+async def reschedule_for_leave(
+    leave_id: int,
+    apply: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    # Small neighbourhood model with a short budget; solved off the event loop
+    generator = TimetableGenerator(db, solver_params={'max_time_in_seconds': 5.0})
+    try:
+        result = await run_in_threadpool(generator.reschedule_for_leave, leave_id, apply)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if apply and result.get('moved'):
+        response_cache.bump("timetables")
+    return result
 
 # Reports and analytics
 @app.get("/api/reports", response_model=ReportsResponse)
@@ -150,21 +378,54 @@ async def get_reports(
     end_date: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
+    # Analytics reports are answered from the aggregates, as they are, whatever the range
+    if report_type in REPORTS:
+        try:
+            return JSONResponse(build_report(db, report_type, start_date, end_date))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     return generate_reports(db, report_type, start_date, end_date)
 
+@app.get("/api/reports/export")
+async def export_report(
+    report_type: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if report_type not in EXPORT_TYPES:
+        raise HTTPException(status_code=400, detail=f"report_type must be one of {', '.join(EXPORT_TYPES)}")
+    try:
+        # Validate before the status line goes out
+        parse_range(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export_csv(db, report_type, start_date, end_date),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{report_type}.csv"'}
+    )
+
 # AI Assistant endpoints
 @app.post("/api/ai/suggestions", response_model=AISuggestionsResponse)
 async def get_ai_suggestions(
     request: AISuggestionsRequest,
     db: Session = Depends(get_db)
 ):
-    ai_assistant = GeminiAIAssistant()
+    # Clashes, capacity and overloads are found locally in milliseconds, before any model call
+    findings = await run_in_threadpool(analyze_request, db, request.timetable_data)
     suggestions = await ai_assistant.get_timetable_suggestions(
         timetable_data=request.timetable_data,
-        constraints=request.constraints
+        constraints=request.constraints,
+        findings=findings
     )
     return {"suggestions": suggestions}
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 # Utility functions
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -174,6 +435,11 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    # Tokens verified before are answered without decoding or a query
+    principal = principal_cache.get(credentials.credentials)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -185,7 +451,13 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     user = get_user_by_email(db, email)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    return principal_cache.put(credentials.credentials, user, payload.get("exp"))
+
+@app.on_event("shutdown")
+def shutdown_generation_pool():
+    job_manager.shutdown()
+    ai_assistant.shutdown()
+    whatif_simulator.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
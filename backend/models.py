@@ -1,10 +1,24 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Time
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Text, Time, Index, UniqueConstraint,
+    Table, event, inspect, select
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
+import json
+
+from availability import parse_availability, week_bounds
 
 Base = declarative_base()
 
+# Faculty.assigned_subjects as rows; kept in sync with the JSON column on every write
+faculty_subjects = Table(
+    "faculty_subjects",
+    Base.metadata,
+    Column("faculty_id", Integer, ForeignKey("faculty.id", ondelete="CASCADE"), primary_key=True),
+    Column("subject_id", Integer, ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -23,6 +37,7 @@ class Classroom(Base):
     capacity = Column(Integer)
     type = Column(String)  # lecture, lab, seminar
     available_slots = Column(Text)  # JSON string of available time slots
+    availability_mask = Column(BigInteger)  # available_slots as a weekly slot bitset (see availability.py)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Faculty(Base):
@@ -33,8 +48,11 @@ class Faculty(Base):
     email = Column(String, unique=True)
     max_daily_classes = Column(Integer, default=6)
     availability = Column(Text)  # JSON string of available time slots
+    availability_mask = Column(BigInteger)  # availability as a weekly slot bitset (see availability.py)
     assigned_subjects = Column(Text)  # JSON string of subject IDs
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    subjects = relationship("Subject", secondary=faculty_subjects, viewonly=True)
 
 class Subject(Base):
     __tablename__ = "subjects"
@@ -60,18 +78,30 @@ class Batch(Base):
 
 class Leave(Base):
     __tablename__ = "leaves"
+    __table_args__ = (
+        # Approved leaves of a date range (reports, rescheduling)
+        Index("ix_leaves_status_date", "status", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    faculty_id = Column(Integer, ForeignKey("faculty.id"))
-    date = Column(DateTime)
+    # active_history: the leave aggregates need the old values even after a commit expired them
+    faculty_id = column_property(Column(Integer, ForeignKey("faculty.id")), active_history=True)
+    date = column_property(Column(DateTime), active_history=True)
     reason = Column(String)
-    status = Column(String, default="pending")  # pending, approved, rejected
+    status = column_property(Column(String, default="pending"), active_history=True)  # pending, approved, rejected
     created_at = Column(DateTime, default=datetime.utcnow)
     
     faculty = relationship("Faculty")
 
 class Timetable(Base):
     __tablename__ = "timetables"
+    __table_args__ = (
+        # Dashboard reads: one batch's, faculty member's or room's week, and everything in one slot
+        Index("ix_timetables_batch_day_slot", "batch_id", "day", "time_slot"),
+        Index("ix_timetables_faculty_day_slot", "faculty_id", "day", "time_slot"),
+        Index("ix_timetables_classroom_day_slot", "classroom_id", "day", "time_slot"),
+        Index("ix_timetables_day_slot", "day", "time_slot"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(Integer, ForeignKey("batches.id"))
@@ -82,6 +112,7 @@ class Timetable(Base):
     faculty_id = Column(Integer, ForeignKey("faculty.id"))
     is_fixed = Column(Boolean, default=False)
     is_approved = Column(Boolean, default=False)
+    generation_id = Column(String, index=True)  # groups the rows written by one generation
     created_at = Column(DateTime, default=datetime.utcnow)
     
     batch = relationship("Batch")
@@ -89,6 +120,43 @@ class Timetable(Base):
     subject = relationship("Subject")
     faculty = relationship("Faculty")
 
+class TimetableView(Base):
+    __tablename__ = "timetable_views"
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id", name="uq_timetable_views_entity"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String)  # batch, faculty, room
+    entity_id = Column(Integer)
+    grid = Column(Text)  # JSON weekly grid, served as stored
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class UsageAggregate(Base):
+    __tablename__ = "usage_aggregates"
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id", "day", "time_slot", name="uq_usage_aggregates_cell"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String)  # batch, faculty, room
+    entity_id = Column(Integer)
+    day = Column(String)
+    time_slot = Column(String)
+    sessions = Column(Integer, default=0)  # per week, in the timetables currently shown
+
+class LeaveAggregate(Base):
+    __tablename__ = "leave_aggregates"
+    __table_args__ = (
+        UniqueConstraint("date", "status", "faculty_id", name="uq_leave_aggregates_date_status_faculty"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date)
+    status = Column(String)
+    faculty_id = Column(Integer)
+    leaves = Column(Integer, default=0)
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -100,3 +168,79 @@ class Notification(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User")
+
+# The JSON columns stay the API's source of truth; their normalized copies are derived on write
+@event.listens_for(Classroom, "before_insert")
+@event.listens_for(Classroom, "before_update")
+def _sync_classroom_mask(mapper, connection, target):
+    if target.availability_mask is None or inspect(target).attrs.available_slots.history.has_changes():
+        target.availability_mask = parse_availability(target.available_slots)
+
+@event.listens_for(Faculty, "before_insert")
+@event.listens_for(Faculty, "before_update")
+def _sync_faculty_mask(mapper, connection, target):
+    if target.availability_mask is None or inspect(target).attrs.availability.history.has_changes():
+        target.availability_mask = parse_availability(target.availability)
+
+def upsert(bind, table):
+    """
+    INSERT into `table` that supports on_conflict_do_update, for the dialect
+    behind `bind` (a Session or a Connection): PostgreSQL or SQLite.
+    """
+    dialect = (bind.get_bind() if hasattr(bind, "get_bind") else bind).dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert for the {dialect} dialect")
+    return insert(table)
+
+def approved_leaves(db, week_start):
+    """Approved Leave rows falling in the week that contains `week_start`"""
+    start, end = week_bounds(week_start)
+    return db.query(Leave).filter(
+        Leave.status == 'approved', Leave.date >= start, Leave.date < end
+    ).all()
+
+def parse_subject_ids(raw):
+    """Subject ids listed in an assigned_subjects JSON column; malformed values and entries are skipped"""
+    try:
+        value = json.loads(raw) if raw else []
+    except ValueError:
+        return set()
+    subject_ids = set()
+    for item in value if isinstance(value, list) else []:
+        try:
+            subject_ids.add(int(item))
+        except (TypeError, ValueError):
+            continue
+    return subject_ids
+
+@event.listens_for(Faculty, "after_insert")
+@event.listens_for(Faculty, "after_update")
+def _sync_faculty_subjects(mapper, connection, target):
+    if not inspect(target).attrs.assigned_subjects.history.has_changes():
+        return
+    subject_ids = parse_subject_ids(target.assigned_subjects)
+    # Ids of subjects that do not exist yet are linked when the subject is created
+    known = connection.execute(select(Subject.id).where(Subject.id.in_(subject_ids))).scalars().all()
+    connection.execute(faculty_subjects.delete().where(faculty_subjects.c.faculty_id == target.id))
+    if known:
+        connection.execute(faculty_subjects.insert(), [
+            {"faculty_id": target.id, "subject_id": subject_id} for subject_id in known
+        ])
+
+@event.listens_for(Subject, "after_insert")
+def _link_new_subject(mapper, connection, target):
+    # LIKE narrows the scan to faculty whose JSON mentions the digits; the parse decides
+    rows = connection.execute(
+        select(Faculty.id, Faculty.assigned_subjects).where(Faculty.assigned_subjects.like(f"%{target.id}%"))
+    ).all()
+    faculty_ids = [faculty_id for faculty_id, raw in rows if target.id in parse_subject_ids(raw)]
+    # Rows left behind by a deleted subject whose id is reused
+    connection.execute(faculty_subjects.delete().where(faculty_subjects.c.subject_id == target.id))
+    if faculty_ids:
+        connection.execute(faculty_subjects.insert(), [
+            {"faculty_id": faculty_id, "subject_id": target.id} for faculty_id in faculty_ids
+        ])
@@ -0,0 +1,98 @@
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from typing import Dict, Any
+import json
+import logging
+import time
+
+logger = logging.getLogger("timetable.generation")
+
+# Generation phases run from milliseconds (extract) to the full solver budget
+PHASE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "API request latency by route template",
+    ["method", "route", "status"]
+)
+GENERATIONS = Counter(
+    "timetable_generations_total",
+    "Finished timetable generations by outcome",
+    ["status"]
+)
+GENERATION_PHASE_SECONDS = Histogram(
+    "timetable_generation_phase_seconds",
+    "Wall time spent in each generation phase",
+    ["phase"],
+    buckets=PHASE_BUCKETS
+)
+MODEL_SIZE = Gauge(
+    "timetable_model_size",
+    "Size of the most recently built generation model",
+    ["kind"]
+)
+SOLVER_CONFLICTS = Counter("timetable_solver_conflicts_total", "CP-SAT conflicts across generations")
+SOLVER_BRANCHES = Counter("timetable_solver_branches_total", "CP-SAT branches across generations")
+SOLVER_WALL_SECONDS = Histogram(
+    "timetable_solver_wall_seconds",
+    "CP-SAT wall time per generation",
+    buckets=PHASE_BUCKETS
+)
+SOLVER_GAP = Gauge("timetable_solver_relative_gap", "Relative objective/bound gap of the last generation")
+GENERATION_CACHE_LOOKUPS = Counter(
+    "timetable_generation_cache_lookups_total",
+    "Generation cache lookups by result",
+    ["result"]
+)
+
+
+def record_generation(result: Dict[str, Any]):
+    """Export one finished generation result (as returned by TimetableGenerator)"""
+    metrics = result.get("metrics") or {}
+    profile = metrics.get("profile") or result.get("profile") or {}
+    model_stats = metrics.get("model_stats") or result.get("model_stats") or {}
+    solver_stats = result.get("solver_stats") or {}
+
+    GENERATIONS.labels(status=result.get("status", "unknown")).inc()
+    for phase, seconds in profile.items():
+        GENERATION_PHASE_SECONDS.labels(phase=phase).observe(seconds)
+    for kind in ("variables", "constraints", "literals"):
+        if kind in model_stats:
+            MODEL_SIZE.labels(kind=kind).set(model_stats[kind])
+    if solver_stats:
+        SOLVER_CONFLICTS.inc(solver_stats.get("conflicts", 0))
+        SOLVER_BRANCHES.inc(solver_stats.get("branches", 0))
+        SOLVER_WALL_SECONDS.observe(solver_stats.get("wall_time", 0.0))
+        if solver_stats.get("relative_gap") is not None:
+            SOLVER_GAP.set(solver_stats["relative_gap"])
+
+    # One structured record per generation with every span, for log-based analysis
+    logger.info(json.dumps({
+        "event": "timetable_generation",
+        "status": result.get("status"),
+        "generation_id": result.get("generation_id"),
+        "profile": profile,
+        "model_stats": model_stats,
+        "solver_stats": solver_stats
+    }))
+
+
+async def track_request_latency(request: Request, call_next):
+    """HTTP middleware: observe latency labelled by route template, not raw path"""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status_code)
+        ).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,106 @@
+"""
+Verified principals of bearer tokens, cached so repeat requests skip the
+JWT decode and the user lookup.
+
+Entries are keyed by the raw token and live at most AUTH_CACHE_TTL_SECONDS,
+never past the token's own expiry, in a bounded LRU. Updating or deleting a
+User through the ORM drops the entries of that user at once, so role checks
+run on the cached principal without serving a stale role. Changes made
+outside this process (the API runs as a single process) are picked up when
+the TTL runs out.
+"""
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from typing import Optional, Tuple
+import os
+import threading
+import time
+
+from models import User
+
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+
+
+class Principal:
+    """The User columns handlers read, detached from any session"""
+
+    __slots__ = ("id", "email", "role", "name")
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.email = user.email
+        self.role = user.role
+        self.name = user.name
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, user: User, token_exp: Optional[float] = None) -> Principal:
+        """Cache the principal of a verified token; `token_exp` is its exp claim (epoch seconds)"""
+        principal = Principal(user)
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl > 0:
+            with self._lock:
+                self._entries[token] = (principal, time.monotonic() + ttl)
+                self._entries.move_to_end(token)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, *emails: str):
+        """Drop every cached token of the users"""
+        with self._lock:
+            for token in [token for token, (principal, _) in self._entries.items() if principal.email in emails]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _drop_cached_user(mapper, connection, target):
+    # A changed email must also drop the tokens issued for the old one
+    emails = {target.email, *(inspect(target).attrs.email.history.deleted or ())}
+    principal_cache.invalidate(*emails)
+    # Requests racing the transaction can re-cache the old row; drop again once it commits
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_emails", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_committed_users(session):
+    emails = session.info.pop("changed_user_emails", None)
+    if emails:
+        principal_cache.invalidate(*emails)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session):
+    session.info.pop("changed_user_emails", None)
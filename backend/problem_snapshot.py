@@ -0,0 +1,57 @@
+"""
+Everything one generation reads, in a handful of set-based queries.
+
+Faculty subjects come from the faculty_subjects association (one IN query) and
+availability from the bitset columns, so the JSON text columns are neither
+parsed nor fetched on this path. Rows written before the bitset columns
+existed fall back to parsing their JSON (see WeeklyAvailability.load).
+"""
+from sqlalchemy.orm import Session, defer, selectinload
+from typing import List, Optional
+
+from availability import WeeklyAvailability
+from models import Batch, Classroom, Faculty, Subject, approved_leaves
+
+
+def load_faculty(db: Session) -> List[Faculty]:
+    """All faculty with their subjects, without the JSON columns"""
+    return db.query(Faculty).options(
+        defer(Faculty.availability), defer(Faculty.assigned_subjects), selectinload(Faculty.subjects)
+    ).all()
+
+
+def load_classrooms(db: Session) -> List[Classroom]:
+    return db.query(Classroom).options(defer(Classroom.available_slots)).all()
+
+
+class ProblemSnapshot:
+    """The rows and availability bitsets of one generation"""
+
+    def __init__(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        availability: WeeklyAvailability
+    ):
+        self.batches = batches
+        self.classrooms = classrooms
+        self.faculty = faculty
+        self.subjects = subjects
+        self.availability = availability
+
+    @classmethod
+    def load(cls, db: Session, batch_ids: List[int], week_start: Optional[str] = None) -> 'ProblemSnapshot':
+        """Approved leaves only apply when the generation targets a concrete week"""
+        subjects = db.query(Subject).all()
+        classrooms = load_classrooms(db)
+        faculty = load_faculty(db)
+        leaves = approved_leaves(db, week_start) if week_start else []
+        return cls(
+            db.query(Batch).filter(Batch.id.in_(batch_ids)).all(),
+            classrooms,
+            faculty,
+            subjects,
+            WeeklyAvailability.load(classrooms, faculty, leaves)
+        )
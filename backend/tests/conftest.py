@@ -0,0 +1,42 @@
+"""
+Shared fixtures: a fresh in-memory SQLite database per test, set up the way
+benchmarks/run.py sets up its institutions.
+
+    cd backend
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import pytest
+
+from models import Base
+from benchmarks.synthetic import populate
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def tiny(db):
+    """The synthetic 'tiny' institution: 4 batches, 6 subjects, 6 faculty, 6 rooms"""
+    populate(db, 'tiny', 0)
+    return db
@@ -0,0 +1,137 @@
+"""
+Builders for small hand-made institutions and an independent checker of the
+hard timetable constraints, shared by the engine tests.
+"""
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+import json
+
+from availability import DAYS, SESSION_BREAKS, TIME_SLOTS, WeeklyAvailability, is_free
+from models import Batch, Classroom, Faculty, Subject
+from timetable_engine import LAB_BLOCK_SLOTS, LAB_ROOM_TYPES, _batch_subject_ids, _lab_blocks
+
+
+def make_institution(db, rooms, subjects, faculty, batches):
+    """
+    Rows from short specs, committed, in spec order:
+    rooms (type, capacity), subjects (lecture_hours, lab_hours),
+    faculty (subject indexes, max_daily_classes[, availability JSON]) and
+    batches (student_count, subject indexes).
+    """
+    classroom_rows = [
+        Classroom(name=f'R{i}', type=room_type, capacity=capacity, available_slots='{}')
+        for i, (room_type, capacity) in enumerate(rooms)
+    ]
+    subject_rows = [
+        Subject(name=f'S{i}', code=f'S{i}', lecture_hours=lecture_hours, lab_hours=lab_hours)
+        for i, (lecture_hours, lab_hours) in enumerate(subjects)
+    ]
+    db.add_all(classroom_rows + subject_rows)
+    db.flush()
+    faculty_rows = [
+        Faculty(
+            name=f'F{i}', email=f'f{i}@example.edu', max_daily_classes=spec[1],
+            availability=spec[2] if len(spec) > 2 else '{}',
+            assigned_subjects=json.dumps([subject_rows[k].id for k in spec[0]])
+        )
+        for i, spec in enumerate(faculty)
+    ]
+    batch_rows = [
+        Batch(
+            name=f'B{i}', program='P', semester=1, student_count=student_count,
+            elective_groups=json.dumps({'subjects': [subject_rows[k].id for k in taken]})
+        )
+        for i, (student_count, taken) in enumerate(batches)
+    ]
+    db.add_all(faculty_rows + batch_rows)
+    db.commit()
+    return classroom_rows, subject_rows, faculty_rows, batch_rows
+
+
+def _runs(slots: List[int]) -> List[int]:
+    """Lengths of the runs of consecutive slots, a break ending a run"""
+    lengths = []
+    previous = None
+    for slot in sorted(slots):
+        if previous is not None and slot == previous + 1 and previous not in SESSION_BREAKS:
+            lengths[-1] += 1
+        else:
+            lengths.append(1)
+        previous = slot
+    return lengths
+
+
+def timetable_violations(
+    rows: List[Dict[str, Any]],
+    batches: List[Batch],
+    classrooms: List[Classroom],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    availability: Optional[WeeklyAvailability] = None,
+    lab_block_slots: int = LAB_BLOCK_SLOTS
+) -> List[str]:
+    """
+    Every hard constraint a timetable breaks, checked slot by slot without the
+    engine's model: no double booking, qualified faculty, fitting rooms, exact
+    weekly hours with labs in whole blocks, one teacher per subject and kind,
+    daily limits and availability.
+    """
+    availability = availability or WeeklyAvailability()
+    rooms = {c.id: c for c in classrooms}
+    teachers = {f.id: f for f in faculty}
+    batch_by_id = {b.id: b for b in batches}
+    subject_by_id = {s.id: s for s in subjects}
+    violations = []
+
+    for column in ('batch_id', 'classroom_id', 'faculty_id'):
+        cells = Counter((row[column], row['day'], row['time_slot']) for row in rows)
+        violations += [f'{column} {cell} double booked' for cell, count in cells.items() if count > 1]
+
+    hours = Counter()
+    lab_slots = defaultdict(lambda: defaultdict(list))  # (batch_id, subject_id) -> day_idx -> slots
+    taught_by = defaultdict(set)
+    daily = Counter()
+    for row in rows:
+        room, teacher = rooms[row['classroom_id']], teachers[row['faculty_id']]
+        batch, subject = batch_by_id[row['batch_id']], subject_by_id[row['subject_id']]
+        day_idx, time_idx = DAYS.index(row['day']), TIME_SLOTS.index(row['time_slot'])
+        kind = 'lab' if room.type in LAB_ROOM_TYPES else 'lecture'
+        if subject.id not in {s.id for s in teacher.subjects}:
+            violations.append(f'faculty {teacher.id} is not assigned to subject {subject.id}')
+        if (room.capacity or 0) < (batch.student_count or 0):
+            violations.append(f'room {room.id} seats fewer than batch {batch.id}')
+        if not is_free(availability.room(room.id), day_idx, time_idx):
+            violations.append(f'room {room.id} unavailable on {row["day"]} {row["time_slot"]}')
+        if not is_free(availability.teacher(teacher.id), day_idx, time_idx):
+            violations.append(f'faculty {teacher.id} unavailable on {row["day"]} {row["time_slot"]}')
+        hours[(batch.id, subject.id, kind)] += 1
+        taught_by[(batch.id, subject.id, kind)].add(teacher.id)
+        daily[(teacher.id, day_idx)] += 1
+        if kind == 'lab':
+            lab_slots[(batch.id, subject.id)][day_idx].append(time_idx)
+
+    for batch in batches:
+        curriculum = _batch_subject_ids(batch, subjects)
+        for subject in subjects:
+            taken = subject.id in curriculum
+            for kind, required in (('lecture', subject.lecture_hours or 0), ('lab', subject.lab_hours or 0)):
+                scheduled = hours.get((batch.id, subject.id, kind), 0)
+                required = required if taken else 0
+                if scheduled != required:
+                    violations.append(
+                        f'batch {batch.id} has {scheduled} {kind} hours of subject {subject.id}, not {required}'
+                    )
+            # Runs of lab slots split into blocks the way the demand does; a split block shows up short
+            blocks = Counter()
+            for slots in lab_slots[(batch.id, subject.id)].values():
+                for run in _runs(slots):
+                    blocks.update(_lab_blocks(run, lab_block_slots))
+            if taken and blocks != Counter(_lab_blocks(subject.lab_hours or 0, lab_block_slots)):
+                violations.append(f'batch {batch.id} has lab blocks {sorted(blocks.elements())} of subject {subject.id}')
+
+    violations += [f'{key} taught by {sorted(ids)}' for key, ids in taught_by.items() if len(ids) > 1]
+    violations += [
+        f'faculty {faculty_id} teaches {count} slots on {DAYS[day_idx]}'
+        for (faculty_id, day_idx), count in daily.items() if count > teachers[faculty_id].max_daily_classes
+    ]
+    return violations
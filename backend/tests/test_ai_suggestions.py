@@ -0,0 +1,102 @@
+"""
+AI suggestions: the circuit breaker stops calling a failing model and lets one
+trial through after its reset time, slow or failing calls fall back to
+rule-based suggestions, and good answers are cached by timetable summary.
+"""
+import asyncio
+import json
+import threading
+import pytest
+
+import ai_suggestions
+from ai_suggestions import CircuitBreaker, GeminiAIAssistant
+
+TIMETABLE = {'timetable': [
+    {'batch_id': 1, 'day': 'Monday', 'time_slot': '09:00-10:00', 'faculty_id': 1, 'classroom_id': 1},
+    {'batch_id': 2, 'day': 'Monday', 'time_slot': '09:00-10:00', 'faculty_id': 1, 'classroom_id': 2},
+]}
+ANSWER = json.dumps([{'type': 'optimization', 'priority': 'low', 'description': 'Use room 3', 'implementation': '-'}])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_suggestions.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_breaker_opens_and_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failures=3, reset_seconds=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+
+    clock[0] += 60
+    assert breaker.allow()
+    # Only one trial while its outcome is pending
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+
+class FakeModel:
+    def __init__(self, answer=None, error=None, block=None):
+        self.answer, self.error, self.block = answer, error, block
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.block is not None:
+            self.block.wait(5)
+        if self.error is not None:
+            raise self.error
+        return type('Response', (), {'text': self.answer})()
+
+
+@pytest.fixture
+def assistant(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test')
+    assistant = GeminiAIAssistant(timeout_seconds=0.2)
+    assistant.breaker = CircuitBreaker(failures=2, reset_seconds=60)
+    yield assistant
+    assistant.shutdown()
+
+
+def test_failures_fall_back_and_open_the_breaker(assistant, clock):
+    assistant.model = FakeModel(error=RuntimeError('quota'))
+
+    for _ in range(3):
+        suggestions = asyncio.run(assistant.get_timetable_suggestions(TIMETABLE, {}))
+        assert suggestions[0]['type'] == 'conflict_resolution'
+
+    assert assistant.model.calls == 2
+    assert assistant.breaker.is_open
+
+
+def test_slow_model_times_out_to_the_fallback(assistant):
+    release = threading.Event()
+    assistant.model = FakeModel(answer=ANSWER, block=release)
+    try:
+        suggestions = asyncio.run(assistant.get_timetable_suggestions(TIMETABLE, {}))
+    finally:
+        release.set()
+    assert suggestions[0]['type'] == 'conflict_resolution'
+
+
+def test_answers_are_cached_by_summary(assistant):
+    assistant.model = FakeModel(answer=f'```json\n{ANSWER}\n```')
+
+    first = asyncio.run(assistant.get_timetable_suggestions(TIMETABLE, {}))
+    second = asyncio.run(assistant.get_timetable_suggestions(dict(TIMETABLE), {}))
+    other = asyncio.run(assistant.get_timetable_suggestions(TIMETABLE, {'max_daily_classes': 3}))
+
+    assert first == second == other == json.loads(ANSWER)
+    assert assistant.model.calls == 2
@@ -0,0 +1,99 @@
+"""
+The report aggregates stay equal to what the raw rows say: leave counts
+through every insert, update and delete, usage through every timetable
+write that refreshes the grids, and the sessions each faculty member loses
+to approved leave days.
+"""
+from collections import Counter
+from datetime import date, datetime
+
+from analytics import faculty_load, leave_counts
+from models import Leave, Timetable
+from timetable_store import replace_generation
+from timetable_views import current_rows
+
+from helpers import make_institution
+
+WEEK = (date(2026, 10, 19), date(2026, 10, 25))
+
+
+def _raw_leave_counts(db):
+    return dict(Counter(leave.status for leave in db.query(Leave) if WEEK[0] <= leave.date.date() <= WEEK[1]))
+
+
+def test_leave_counts_follow_every_write(db):
+    leaves = [
+        Leave(faculty_id=1, date=datetime(2026, 10, 19, 9), status='approved'),
+        Leave(faculty_id=2, date=datetime(2026, 10, 19, 14), status='approved'),
+        Leave(faculty_id=3, date=datetime(2026, 10, 20), status='pending'),
+    ]
+    db.add_all(leaves)
+    db.commit()
+
+    # Updated while the commit left them expired: the aggregates need the values they replace
+    leaves[0].status = 'rejected'
+    leaves[2].date = datetime(2026, 11, 2)
+    db.commit()
+    assert leave_counts(db, *WEEK)['by_status'] == _raw_leave_counts(db) == {'approved': 1, 'rejected': 1}
+    assert leave_counts(db, date(2026, 11, 2), date(2026, 11, 2))['by_status'] == {'pending': 1}
+
+    db.delete(leaves[1])
+    db.commit()
+    assert leave_counts(db, *WEEK)['by_status'] == _raw_leave_counts(db) == {'rejected': 1}
+
+
+def test_faculty_load_follows_the_current_generation(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db, rooms=[('lecture', 60)], subjects=[(2, 0)], faculty=[([0], 4), ([0], 4)], batches=[(40, [0])]
+    )
+    (room,), (subject,), (first, second), (batch,) = classrooms, subjects, faculty, batches
+
+    def generate(teacher, days):
+        replace_generation(db, [batch.id], [{
+            'batch_id': batch.id, 'day': day, 'time_slot': '09:00-10:00', 'classroom_id': room.id,
+            'subject_id': subject.id, 'faculty_id': teacher.id
+        } for day in days])
+        db.commit()
+
+    def loads():
+        report = {member['id']: member['sessions_per_week'] for member in faculty_load(db, *WEEK)['faculty']}
+        raw = Counter(row.faculty_id for row in current_rows(db, [batch.id]))
+        assert report == {first.id: raw[first.id], second.id: raw[second.id]}
+        return report
+
+    generate(first, ['Monday', 'Tuesday'])
+    assert loads() == {first.id: 2, second.id: 0}
+
+    # The draft that replaces it moves the load to the other teacher
+    generate(second, ['Wednesday'])
+    assert loads() == {first.id: 0, second.id: 1}
+    assert db.query(Timetable).count() == 1
+
+
+def test_approved_leave_days_take_their_sessions_off_faculty_load(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db, rooms=[('lecture', 60)], subjects=[(3, 0)], faculty=[([0], 4), ([0], 4)], batches=[(40, [0])]
+    )
+    (room,), (subject,), (first, second), (batch,) = classrooms, subjects, faculty, batches
+    replace_generation(db, [batch.id], [{
+        'batch_id': batch.id, 'day': 'Monday', 'time_slot': time_slot, 'classroom_id': room.id,
+        'subject_id': subject.id, 'faculty_id': first.id
+    } for time_slot in ('09:00-10:00', '10:00-11:00')])
+    # Two leaves of one day lose that day's sessions once
+    leaves = [
+        Leave(faculty_id=first.id, date=datetime(2026, 10, 19, 9), status='approved'),
+        Leave(faculty_id=first.id, date=datetime(2026, 10, 19, 14), status='approved'),
+        Leave(faculty_id=first.id, date=datetime(2026, 10, 20), status='approved'),
+    ]
+    db.add_all(leaves)
+    db.commit()
+
+    def lost():
+        return {member['id']: member['sessions_lost_to_leave'] for member in faculty_load(db, *WEEK)['faculty']}
+
+    assert lost() == {first.id: 2, second.id: 0}
+
+    for leave in leaves[:2]:
+        leave.faculty_id = second.id
+    db.commit()
+    assert lost() == {first.id: 0, second.id: 0}
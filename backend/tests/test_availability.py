@@ -0,0 +1,104 @@
+"""
+Availability: every JSON form parses to the same bitset, stored masks follow
+their JSON column, bitsets unpack to (resource, day, slot) arrays, approved
+leaves only close their own week, and generation only places classes in slots
+where both room and teacher are free.
+"""
+from datetime import datetime
+import asyncio
+import json
+
+from availability import (
+    DAYS, FULL_WEEK, TIME_SLOTS, WeeklyAvailability, day_bits, is_free, parse_availability, slot_bit, slot_matrix
+)
+from models import Leave, approved_leaves
+from timetable_engine import TimetableGenerator
+
+from helpers import make_institution
+
+SOLVER_PARAMS = {'max_time_in_seconds': 10.0, 'num_search_workers': 1}
+
+
+def test_json_forms_parse_to_the_same_bitset():
+    expected = day_bits(0) | slot_bit(4, 4)
+    forms = [
+        ['Monday', 'Friday 14:00-15:00'],
+        ['Monday', {'day': 'Friday', 'time_slot': '14:00-15:00'}],
+        {'Monday': True, 'Friday': ['14:00-15:00']},
+        {'Monday': 'all', 'Friday': ['14:00-15:00', '19:00-20:00'], 'Sunday': True},
+    ]
+
+    assert [parse_availability(json.dumps(form)) for form in forms] == [expected] * len(forms)
+    assert [parse_availability(raw) for raw in (None, '', '{}', '[]')] == [FULL_WEEK] * 4
+
+
+def test_stored_masks_follow_their_json(db):
+    classrooms, _, faculty, _ = make_institution(
+        db, rooms=[('lecture', 60)], subjects=[(1, 0)], faculty=[([0], 4, json.dumps(['Monday']))], batches=[]
+    )
+    room, teacher = classrooms[0], faculty[0]
+    assert (room.availability_mask, teacher.availability_mask) == (FULL_WEEK, day_bits(0))
+
+    room.available_slots = json.dumps(['Tuesday 09:00-10:00'])
+    teacher.availability = '{}'
+    db.commit()
+
+    assert (room.availability_mask, teacher.availability_mask) == (slot_bit(1, 0), FULL_WEEK)
+
+
+def test_slot_matrix_unpacks_bitsets_by_day_and_slot():
+    free = slot_matrix([slot_bit(4, 7) | slot_bit(0, 1), FULL_WEEK, 0])
+
+    assert free.shape == (3, len(DAYS), len(TIME_SLOTS))
+    assert sorted(zip(*free[0].nonzero())) == [(0, 1), (4, 7)]
+    assert free[1].all() and not free[2].any()
+    assert slot_matrix([]).shape == (0, len(DAYS), len(TIME_SLOTS))
+
+
+def test_leaves_close_their_day_in_their_week_only(db):
+    _, _, faculty, _ = make_institution(db, rooms=[], subjects=[(1, 0)], faculty=[([0], 4), ([0], 4)], batches=[])
+    first, second = faculty
+    db.add_all([
+        Leave(faculty_id=first.id, date=datetime(2026, 10, 20, 9), status='approved'),  # a Tuesday
+        Leave(faculty_id=first.id, date=datetime(2026, 10, 28), status='approved'),  # the week after
+        Leave(faculty_id=second.id, date=datetime(2026, 10, 21), status='pending'),
+    ])
+    db.commit()
+
+    leaves = approved_leaves(db, '2026-10-22')
+    availability = WeeklyAvailability.load([], faculty, leaves)
+
+    assert [leave.date.day for leave in leaves] == [20]
+    assert availability.teacher(first.id) == FULL_WEEK & ~day_bits(1)
+    assert availability.teacher(second.id) == FULL_WEEK
+
+
+def test_generation_uses_only_free_slots(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lecture', 60)],
+        subjects=[(4, 0), (3, 0)],
+        faculty=[([0], 4, json.dumps(['Monday', 'Tuesday'])), ([1], 4)],
+        batches=[(40, [0, 1])]
+    )
+    classrooms[0].available_slots = json.dumps({'Tuesday': ['09:00-10:00', '10:00-11:00'], 'Thursday': True})
+    db.add(Leave(faculty_id=faculty[0].id, date=datetime(2026, 10, 19), status='approved'))  # a Monday
+    db.commit()
+    generator = TimetableGenerator(db, solver_params=SOLVER_PARAMS)
+
+    result = asyncio.run(generator.generate_optimized_timetable(
+        [batches[0].id], {'week_start': '2026-10-19'}, use_ai_suggestions=False
+    ))
+
+    assert result['status'] == 'success'
+    availability = WeeklyAvailability.load(classrooms, faculty, approved_leaves(db, '2026-10-19'))
+    for row in result['timetable']:
+        d, t = DAYS.index(row['day']), TIME_SLOTS.index(row['time_slot'])
+        assert is_free(availability.room(row['classroom_id']), d, t)
+        assert is_free(availability.teacher(row['faculty_id']), d, t)
+    assert {row['day'] for row in result['timetable'] if row['faculty_id'] == faculty[0].id} == {'Tuesday'}
+    # Only the free (teacher, room, slot) combinations became variables
+    # Busy slots were pruned from the model rather than forbidden by constraints
+    model_stats = result['metrics']['model_stats']
+    assert (model_stats['room_free_slots'], model_stats['faculty_free_slots']) == (10 + 40, 8 + 40)
+    assert model_stats['pruned_variables'] > 0
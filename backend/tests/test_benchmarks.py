@@ -0,0 +1,71 @@
+"""
+Benchmark harness: a seed always yields the same institution, and the
+baseline comparison flags real regressions while ignoring noise.
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import json
+
+from benchmarks import run as bench
+from benchmarks.synthetic import populate
+from models import Base, Batch, Classroom, Faculty, Subject
+
+
+def _snapshot(db):
+    return (
+        [(c.name, c.type, c.capacity) for c in db.query(Classroom).order_by(Classroom.id)],
+        [(s.code, s.lecture_hours, s.lab_hours) for s in db.query(Subject).order_by(Subject.id)],
+        [(f.email, f.max_daily_classes, f.assigned_subjects) for f in db.query(Faculty).order_by(Faculty.id)],
+        [(b.name, b.student_count, b.elective_groups) for b in db.query(Batch).order_by(Batch.id)],
+    )
+
+
+def test_seed_fixes_the_institution():
+    snapshots = []
+    for seed in (0, 0, 1):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        sizes = populate(db, 'tiny', seed)
+        snapshots.append(_snapshot(db))
+        db.close()
+        engine.dispose()
+
+    assert sizes == {'classrooms': 6, 'subjects': 6, 'faculty': 6, 'batches': 4, 'students': sizes['students']}
+    assert snapshots[0] == snapshots[1] != snapshots[2]
+
+
+def _result(status='success', objective=100.0, rss=200.0, **phases):
+    return {
+        'status': status, 'objective': objective, 'peak_rss_mb': rss,
+        'phases': {phase: phases.get(phase, 0.01 if phase == 'build' else 1.0) for phase in bench.COMPARED_PHASES}
+    }
+
+
+def test_compare_flags_regressions_past_threshold_and_noise():
+    baseline = _result()
+
+    assert bench.compare(_result(), baseline, 0.2) == []
+    # Relatively large but below the noise floor in absolute terms
+    assert bench.compare(_result(build=0.05), baseline, 0.2) == []
+    assert bench.compare(_result(solve=1.15), baseline, 0.2) == []
+    assert bench.compare(_result(solve=1.5, rss=300.0), baseline, 0.2) == [
+        'solve: 1.000s -> 1.500s', 'peak_rss_mb: 200.0 -> 300.0'
+    ]
+    assert bench.compare(_result(objective=130.0), baseline, 0.2) == ['objective: 100.0 -> 130.0']
+    assert bench.compare(_result(status='failed'), baseline, 0.2) == ['status: success -> failed']
+
+
+def test_main_exits_nonzero_on_regression(tmp_path, capsys):
+    output = tmp_path / 'bench.json'
+    args = ['--scale', 'tiny', '--repeat', '1', '--time-limit', '2', '--workers', '1']
+
+    assert bench.main(args + ['--output', str(output)]) == 0
+    result = json.loads(output.read_text())
+    assert result['status'] == 'success' and result['scheduled_classes'] > 0
+
+    # An instant baseline makes the total regress whatever the threshold
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(dict(result, phases=dict(result['phases'], total=0.0))))
+    assert bench.main(args + ['--baseline', str(baseline), '--threshold', '10']) == 1
+    assert 'REGRESSION total' in capsys.readouterr().err
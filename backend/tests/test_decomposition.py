@@ -0,0 +1,101 @@
+"""
+Decomposed generation: clusters are merged session by session, a moved lab
+block stays whole and keeps its teacher, and a merge that loses sessions
+fails without saving anything.
+"""
+import asyncio
+import json
+
+from availability import WeeklyAvailability
+from models import Timetable
+from timetable_engine import TimetableGenerator
+
+from helpers import make_institution, timetable_violations
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+
+
+def _row(batch, day, time_slot, room, subject, teacher):
+    return {
+        'batch_id': batch.id, 'day': day, 'time_slot': time_slot, 'classroom_id': room.id,
+        'subject_id': subject.id, 'faculty_id': teacher.id
+    }
+
+
+def test_clashing_lab_block_moves_whole(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lab', 60)],
+        subjects=[(0, 2)],
+        faculty=[([0], 4), ([0], 4)],
+        batches=[(40, [0]), (40, [0])]
+    )
+    # Besides Monday morning the lab is only free for one 2-slot window and two single slots
+    classrooms[0].available_slots = json.dumps([
+        'Monday 09:00-10:00', 'Monday 10:00-11:00', 'Tuesday 10:00-11:00', 'Tuesday 11:00-12:00',
+        'Wednesday 09:00-10:00', 'Thursday 09:00-10:00'
+    ])
+    db.commit()
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    lab, (subject,), (first, second), (a, b) = classrooms[0], subjects, faculty, batches
+    # Each cluster put its block in the same room on Monday morning
+    rows = [
+        _row(a, 'Monday', '09:00-10:00', lab, subject, first),
+        _row(a, 'Monday', '10:00-11:00', lab, subject, first),
+        _row(b, 'Monday', '09:00-10:00', lab, subject, second),
+        _row(b, 'Monday', '10:00-11:00', lab, subject, second),
+    ]
+
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+    merged, moved, unplaced = generator._coordinate(rows, batches, classrooms, faculty, subjects, availability)
+
+    assert (moved, unplaced) == (1, [])
+    assert timetable_violations(merged, batches, classrooms, faculty, subjects, availability) == []
+    assert sorted((r['day'], r['time_slot'], r['faculty_id']) for r in merged if r['batch_id'] == b.id) == [
+        ('Tuesday', '10:00-11:00', second.id), ('Tuesday', '11:00-12:00', second.id)
+    ]
+
+
+def test_moved_session_keeps_its_teacher(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lecture', 60)],
+        subjects=[(1, 0), (2, 0)],
+        faculty=[([0, 1], 4), ([1], 4)],
+        batches=[(40, [0]), (40, [1])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    (room_a, room_b), (s, t), (shared, other), (a, b) = classrooms, subjects, faculty, batches
+    # The shared teacher got the same Monday slot in both clusters; a substitute is free then
+    rows = [
+        _row(a, 'Monday', '09:00-10:00', room_a, s, shared),
+        _row(b, 'Monday', '09:00-10:00', room_b, t, shared),
+        _row(b, 'Tuesday', '09:00-10:00', room_b, t, shared),
+    ]
+
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+    merged, moved, unplaced = generator._coordinate(rows, batches, classrooms, faculty, subjects, availability)
+
+    assert (moved, unplaced) == (1, [])
+    assert {r['faculty_id'] for r in merged} == {shared.id}
+    assert timetable_violations(merged, batches, classrooms, faculty, subjects, availability) == []
+
+
+def test_lost_sessions_fail_the_generation(db):
+    monday_morning = json.dumps(['Monday 09:00-10:00', 'Monday 10:00-11:00'])
+    # Disjoint teachers make two clusters, and both can only use the lab on Monday morning
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lab', 60)],
+        subjects=[(0, 2), (0, 2)],
+        faculty=[([0], 4, monday_morning), ([1], 4, monday_morning)],
+        batches=[(40, [0]), (40, [1])]
+    )
+
+    generator = TimetableGenerator(db, solver_params=SOLVER_PARAMS)
+    result = asyncio.run(generator.generate_optimized_timetable([b.id for b in batches], {}, decompose=True))
+
+    assert result['status'] == 'failed'
+    assert result['model_stats']['coordination_dropped'] == 1
+    assert [conflict['type'] for conflict in result['conflicts']] == ['coordination']
+    assert db.query(Timetable).count() == 0
@@ -0,0 +1,148 @@
+"""
+Diagnosis of infeasible data: each counting argument fires on an instance built
+to break it and only there, every instance it flags is really infeasible, and
+the CP-SAT core names the requirement and daily limits behind a conflict the
+counting arguments cannot see.
+"""
+from ortools.sat.python import cp_model
+import json
+import pytest
+
+from availability import WeeklyAvailability
+from diagnostics import diagnose, infeasible_core, necessary_conditions
+from timetable_engine import TimetableGenerator
+
+from helpers import make_institution
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+
+# name -> (rooms, subjects, faculty, batches, expected conflict types); see helpers.make_institution
+INSTANCES = {
+    'unstaffed_subject': (
+        [('lecture', 60)],
+        [(2, 0), (2, 0)],
+        [([0], 4)],
+        [(40, [0, 1])],
+        {'unstaffed_subject'}
+    ),
+    # Three batches need 12 hours from two teachers of one class a day: at most 10 a week
+    'faculty_capacity': (
+        [('lecture', 60)],
+        [(4, 0)],
+        [([0], 1), ([0], 1)],
+        [(40, [0]), (40, [0]), (40, [0])],
+        {'faculty_capacity'}
+    ),
+    # Each subject fits the week of its teacher, both together do not
+    'faculty_overload': (
+        [('lecture', 60)],
+        [(4, 0), (4, 0)],
+        [([0, 1], 1)],
+        [(40, [0, 1])],
+        {'faculty_overload'}
+    ),
+    'batch_overload': (
+        [('lecture', 60), ('lecture', 60)],
+        [(25, 0), (20, 0)],
+        [([0], 8), ([1], 8)],
+        [(40, [0, 1])],
+        {'batch_overload'}
+    ),
+    'no_suitable_room': (
+        [('lecture', 30)],
+        [(2, 0)],
+        [([0], 4)],
+        [(50, [0])],
+        {'no_suitable_room', 'room_capacity', 'availability_overlap'}
+    ),
+    'room_capacity': (
+        [('lecture', 60)],
+        [(2, 0), (2, 0)],
+        [([0], 4), ([1], 4)],
+        [(40, [0]), (40, [1])],
+        {'room_capacity'}
+    ),
+    'availability_overlap': (
+        [('lecture', 60)],
+        [(2, 0)],
+        [([0], 4, json.dumps(['Monday']))],
+        [(40, [0])],
+        {'availability_overlap'}
+    ),
+}
+
+# Room availability overrides for instances that need them
+ROOM_SLOTS = {
+    'room_capacity': ['Monday 09:00-10:00', 'Monday 10:00-11:00', 'Tuesday 09:00-10:00'],
+    'availability_overlap': ['Tuesday'],
+}
+
+
+def _institution(db, name):
+    rooms, subjects, faculty, batches, expected = INSTANCES[name]
+    classrooms, subjects, faculty, batches = make_institution(db, rooms, subjects, faculty, batches)
+    if name in ROOM_SLOTS:
+        classrooms[0].available_slots = json.dumps(ROOM_SLOTS[name])
+        db.commit()
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    return (batches, classrooms, faculty, subjects, availability), expected
+
+
+def _feasible(batches, classrooms, faculty, subjects, availability):
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+    generator.solver.parameters.stop_after_first_solution = True
+    status, _ = generator._solve_sparse(batches, classrooms, faculty, subjects, {}, availability)
+    assert status != cp_model.UNKNOWN, 'sparse model did not finish'
+    return status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+
+@pytest.mark.parametrize('name', sorted(INSTANCES))
+def test_necessary_conditions_flag_only_infeasible_data(db, name):
+    data, expected = _institution(db, name)
+
+    conflicts = necessary_conditions(*data)
+
+    assert {conflict['type'] for conflict in conflicts} == expected
+    assert all(conflict['severity'] == 'high' for conflict in conflicts)
+    # A necessary condition never rejects a timetable that exists
+    assert not _feasible(*data)
+
+
+def test_feasible_data_has_no_conflicts(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('seminar', 40)],
+        subjects=[(3, 0), (2, 0), (4, 0)],
+        faculty=[([0], 4), ([1, 2], 4), ([2], 3)],
+        batches=[(50, [0, 1, 2]), (35, [0, 2])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+
+    assert diagnose(batches, classrooms, faculty, subjects, {}, availability, core=False) == []
+    # The core search finds the model feasible and blames the time limit instead
+    assert [c['type'] for c in infeasible_core(batches, classrooms, faculty, subjects, {}, availability)] == [
+        'search_limit'
+    ]
+
+
+def test_core_names_the_conflicting_requirement_and_limits(db):
+    # F1 can only give S1 two Monday classes, so F0 must teach both subjects: 6 classes in 5 days
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60)],
+        subjects=[(3, 0), (3, 0)],
+        faculty=[([0, 1], 1), ([1], 2, json.dumps(['Monday']))],
+        batches=[(40, [0, 1])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    assert necessary_conditions(batches, classrooms, faculty, subjects, availability) == []
+
+    conflicts = diagnose(batches, classrooms, faculty, subjects, {}, availability)
+
+    assert [c['type'] for c in conflicts] == ['conflicting_constraints']
+    named = {
+        (c['constraint'], c.get('faculty_id') or c.get('subject_id'))
+        for c in conflicts[0]['constraints']
+    }
+    # Dropping any one of them makes the rest satisfiable, so the core is minimal
+    assert named == {('weekly_hours', s.id) for s in subjects} | {('faculty_daily_limit', f.id) for f in faculty}
@@ -0,0 +1,38 @@
+"""
+Solutions are read from the response vector in one pass: the selected
+sessions are exactly the literals solver.Value reports as set, and blocks and
+interchangeable rooms expand into valid slot-level rows.
+"""
+from availability import WeeklyAvailability
+from timetable_engine import TimetableGenerator
+
+from helpers import make_institution, timetable_violations
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+
+
+def test_vectorized_extraction_matches_solver_values(db):
+    # Two identical lecture rooms form one room group; the lab hours come in blocks
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lecture', 60), ('lab', 60)],
+        subjects=[(3, 2), (4, 0)],
+        faculty=[([0], 5), ([1], 5), ([0, 1], 5)],
+        batches=[(40, [0, 1]), (45, [0, 1]), (30, [1])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+    generator.solver.parameters.stop_after_first_solution = True
+
+    _, rows = generator._solve_sparse(batches, classrooms, faculty, subjects, {}, availability)
+    schedule = generator.recorder.schedule
+
+    selected = schedule.selected(generator.solver.ResponseProto().solution)
+    chosen = [i for i, literal in enumerate(schedule.literals) if generator.solver.Value(literal)]
+    by_value = sorted(
+        tuple(int(schedule.columns[name][i]) for name in schedule.KEY_COLUMNS) for i in chosen
+    )
+    assert sorted(zip(*(selected[name].tolist() for name in schedule.KEY_COLUMNS))) == by_value
+    assert any(len(room_ids) > 1 for room_ids in schedule.room_classes.values())
+    assert len(rows) == sum(int(schedule.columns['length'][i]) for i in chosen)
+    assert timetable_violations(rows, batches, classrooms, faculty, subjects, availability) == []
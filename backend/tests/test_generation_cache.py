@@ -0,0 +1,219 @@
+"""
+Generation cache: the key changes with any input the solver reads, tags drop
+exactly the entries that read a table, a failing Redis is retried after a
+backoff, and a cached result is written back whenever any of its rows is gone.
+Shared version counters survive a Redis outage: missed bumps are replayed.
+A committed leave drops the generations cached for its week.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+import redis
+
+import generation_cache as cache_module
+from generation_cache import GenerationCache, generation_key, restore_generation
+from models import Batch, Faculty, Leave, Timetable
+from timetable_store import replace_generation
+
+
+def _request(batch_ids, **options):
+    return SimpleNamespace(
+        batch_ids=batch_ids, constraints=options.get('constraints', {}), use_ai_suggestions=False,
+        decompose=False, warm_start=False, lns=False,
+        solver=SimpleNamespace(model_dump=lambda: {'max_time_in_seconds': 10.0})
+    )
+
+
+def test_key_follows_the_inputs(tiny):
+    batch_ids = [batch_id for (batch_id,) in tiny.query(Batch.id).limit(2)]
+    key, tags = generation_key(tiny, _request(batch_ids))
+    assert generation_key(tiny, _request(list(reversed(batch_ids))))[0] == key
+    assert {'faculty', f'batch:{batch_ids[0]}'} <= set(tags)
+
+    tiny.query(Faculty).first().max_daily_classes += 1
+    tiny.commit()
+    assert generation_key(tiny, _request(batch_ids))[0] != key
+
+
+def test_tags_drop_only_their_entries():
+    cache = GenerationCache(url=None)
+    cache.put('a', {'status': 'success'}, ['faculty', 'batch:1'])
+    cache.put('b', {'status': 'success'}, ['batch:2'])
+
+    cache.invalidate('batch:1')
+
+    assert cache.get('a') is None
+    assert cache.get('b') == {'status': 'success'}
+
+
+class FlakyRedis:
+    """The slice of redis.Redis the cache uses, failing while `down` is set"""
+
+    def __init__(self):
+        self.down = False
+        self.calls = 0
+        self.values, self.sets = {}, {}
+
+    def _call(self):
+        self.calls += 1
+        if self.down:
+            raise redis.ConnectionError('down')
+
+    def get(self, key):
+        self._call()
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False):
+        self._call()
+        if not (nx and key in self.values):
+            self.values[key] = str(value).encode()
+
+    def incr(self, key):
+        self._call()
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+    def smembers(self, key):
+        self._call()
+        return {member.encode() for member in self.sets.get(key, ())}
+
+    def pipeline(self):
+        return FlakyPipeline(self)
+
+
+class FlakyPipeline:
+    def __init__(self, client):
+        self.client, self.ops = client, []
+
+    def setex(self, key, ttl, value):
+        self.ops.append(lambda: self.client.values.__setitem__(key, value.encode()))
+
+    def sadd(self, key, member):
+        self.ops.append(lambda: self.client.sets.setdefault(key, set()).add(member))
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.ops.append(lambda: (self.client.values.pop(key, None), self.client.sets.pop(key, None)))
+
+    def execute(self):
+        self.client._call()
+        for op in self.ops:
+            op()
+
+
+def test_redis_is_retried_after_a_backoff(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    client = FlakyRedis()
+    cache = GenerationCache(url=None)
+    cache._redis = client
+    cache.put('a', {'status': 'success'}, ['faculty'])
+
+    client.down = True
+    assert cache.get('a') is None
+    calls = client.calls
+    # Within the backoff window Redis is not touched, and invalidations are remembered
+    cache.invalidate('faculty')
+    assert cache.get('a') is None
+    assert client.calls == calls
+
+    client.down = False
+    now[0] += cache_module.REDIS_RETRY_SECONDS
+    # The missed invalidation is replayed before Redis serves anything
+    assert cache.get('a') is None
+    assert 'timetable:generation:a' not in client.values
+    cache.put('b', {'status': 'success'}, ['subjects'])
+    assert cache.get('b') == {'status': 'success'}
+    assert 'timetable:generation:b' in client.values
+
+
+def test_backoff_doubles_while_redis_stays_down(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    client = FlakyRedis()
+    client.down = True
+    cache = GenerationCache(url=None)
+    cache._redis = client
+
+    cache.get('a')
+    first = cache._retry_at - now[0]
+    now[0] = cache._retry_at
+    cache.get('a')
+
+    assert cache._retry_at - now[0] == 2 * first
+
+
+def test_version_bumps_missed_while_redis_is_down_are_replayed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    client = FlakyRedis()
+    cache = GenerationCache(url=None)
+    cache._redis = client
+    start = cache.version('timetables')
+    cache.bump_version('timetables')
+    assert cache.version('timetables') == start + 1
+
+    client.down = True
+    cache.bump_version('timetables')
+    assert cache.version('timetables') is None
+
+    client.down = False
+    now[0] += cache_module.REDIS_RETRY_SECONDS
+    assert cache.version('timetables') == start + 2
+    assert GenerationCache(url=None).version('timetables') is None
+
+
+def test_committed_leaves_drop_the_generations_of_their_week(tiny, monkeypatch):
+    cache = GenerationCache(url=None)
+    monkeypatch.setattr(cache_module, 'generation_cache', cache)
+    cache.put('week', {'status': 'success'}, ['leaves:2026-10-19'])
+    cache.put('other', {'status': 'success'}, ['leaves:2026-10-26'])
+    teacher = tiny.query(Faculty).first()
+
+    tiny.add(Leave(faculty_id=teacher.id, date=datetime(2026, 10, 21), reason='conference', status='pending'))
+    tiny.flush()
+    tiny.rollback()
+    assert cache.get('week') is not None
+
+    leave = Leave(faculty_id=teacher.id, date=datetime(2026, 10, 21), reason='conference', status='pending')
+    tiny.add(leave)
+    tiny.commit()
+    assert cache.get('week') is None
+    cache.put('week', {'status': 'success'}, ['leaves:2026-10-19'])
+
+    leave.status = 'approved'
+    tiny.commit()
+    assert cache.get('week') is None
+    assert cache.get('other') is not None
+
+
+def _entries(db, batches, day):
+    teacher = db.query(Faculty).first()
+    return [
+        {
+            'batch_id': batch.id, 'day': day, 'time_slot': '09:00-10:00', 'classroom_id': None,
+            'subject_id': None, 'faculty_id': teacher.id
+        }
+        for batch in batches
+    ]
+
+
+def test_restore_rewrites_a_partly_replaced_generation(tiny):
+    a, b = tiny.query(Batch).order_by(Batch.id).limit(2).all()
+    entries = _entries(tiny, [a, b], 'Monday')
+    generation_id = replace_generation(tiny, [a.id, b.id], entries)
+    result = {'status': 'success', 'generation_id': generation_id, 'timetable': entries}
+
+    # Still fully stored: served as is
+    assert restore_generation(tiny, [a.id, b.id], result)['generation_id'] == generation_id
+
+    # Batch a alone was regenerated since
+    replace_generation(tiny, [a.id], _entries(tiny, [a], 'Friday'))
+    restored = restore_generation(tiny, [a.id, b.id], result)
+
+    assert restored['generation_id'] != generation_id
+    rows = tiny.query(Timetable.batch_id, Timetable.day).filter(
+        Timetable.generation_id == restored['generation_id']
+    ).all()
+    assert sorted(rows) == [(a.id, 'Monday'), (b.id, 'Monday')]
+    assert tiny.query(Timetable).filter(Timetable.batch_id == a.id).count() == 1
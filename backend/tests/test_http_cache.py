@@ -0,0 +1,139 @@
+"""
+Read endpoints answer with version ETags: a matching If-None-Match is a 304
+without loading anything, a write bumps the version, and bodies are built
+once per version and served gzip-encoded, under their own ETag, when large
+enough. Processes sharing version counters see each other's writes.
+"""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from typing import List
+import pytest
+
+from http_cache import GZIP_MIN_BYTES, ResponseCache
+
+
+class Room(BaseModel):
+    id: int
+    name: str
+
+
+def _serve(cache, rooms, loads):
+    app = FastAPI()
+
+    @app.get('/rooms')
+    def list_rooms(request: Request):
+        def load():
+            loads.append(1)
+            return rooms
+        return cache.respond(request, 'classrooms', load, List[Room])
+
+    @app.get('/rooms/{room_id}')
+    def get_room(room_id: int, request: Request):
+        return cache.respond(request, 'classrooms', lambda: rooms[room_id - 1], Room, key=f'room:{room_id}')
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def served():
+    cache = ResponseCache()
+    rooms = [{'id': 1, 'name': 'R1'}]
+    loads = []
+    return _serve(cache, rooms, loads), cache, rooms, loads
+
+
+def test_matching_etag_is_a_304_without_loading(served):
+    client, cache, rooms, loads = served
+    first = client.get('/rooms')
+    assert first.status_code == 200 and first.json() == rooms
+
+    again = client.get('/rooms', headers={'If-None-Match': first.headers['etag']})
+    weak = client.get('/rooms', headers={'If-None-Match': f"\"other\", W/{first.headers['etag']}"})
+
+    assert again.status_code == weak.status_code == 304
+    assert again.content == b''
+    assert loads == [1]
+
+
+def test_bodies_are_built_once_per_version(served):
+    client, cache, rooms, loads = served
+    etag = client.get('/rooms').headers['etag']
+    assert client.get('/rooms').headers['etag'] == etag
+    assert loads == [1]
+
+    rooms.append({'id': 2, 'name': 'R2'})
+    cache.bump('classrooms')
+    changed = client.get('/rooms', headers={'If-None-Match': etag})
+
+    assert changed.status_code == 200 and len(changed.json()) == 2
+    assert changed.headers['etag'] != etag
+    assert loads == [1, 1]
+
+
+def test_urls_sharing_a_resource_have_their_own_etags(served):
+    client, cache, rooms, loads = served
+    rooms.append({'id': 2, 'name': 'R2'})
+    one, two = client.get('/rooms/1'), client.get('/rooms/2')
+
+    assert (one.json()['name'], two.json()['name']) == ('R1', 'R2')
+    assert one.headers['etag'] != two.headers['etag']
+    assert client.get('/rooms/2', headers={'If-None-Match': one.headers['etag']}).status_code == 200
+
+
+def test_large_bodies_are_gzipped(served):
+    client, cache, rooms, loads = served
+    rooms.extend({'id': i, 'name': f'Room {i}'} for i in range(2, GZIP_MIN_BYTES // 10))
+
+    response = client.get('/rooms', headers={'Accept-Encoding': 'gzip'})
+    raw = client.get('/rooms', headers={'Accept-Encoding': 'identity'})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.json() == raw.json() == rooms
+    assert 'content-encoding' not in raw.headers
+
+
+def test_encodings_have_their_own_etags(served):
+    client, cache, rooms, loads = served
+    rooms.extend({'id': i, 'name': f'Room {i}'} for i in range(2, GZIP_MIN_BYTES // 10))
+    compressed = client.get('/rooms', headers={'Accept-Encoding': 'gzip'})
+    raw = client.get('/rooms', headers={'Accept-Encoding': 'identity'})
+    assert compressed.headers['etag'] != raw.headers['etag']
+    assert compressed.headers['vary'] == 'Accept-Encoding'
+
+    # A gzip validator never revalidates an identity body
+    stale = client.get('/rooms', headers={'Accept-Encoding': 'identity',
+                                          'If-None-Match': compressed.headers['etag']})
+    fresh = client.get('/rooms', headers={'Accept-Encoding': 'gzip',
+                                          'If-None-Match': compressed.headers['etag']})
+
+    assert stale.status_code == 200 and stale.json() == rooms
+    assert fresh.status_code == 304 and fresh.headers['etag'] == compressed.headers['etag']
+
+
+class SharedVersions:
+    """The version counters of a GenerationCache backed by Redis"""
+
+    def __init__(self):
+        self.counters = {}
+
+    def version(self, name):
+        return self.counters.setdefault(name, 7)
+
+    def bump_version(self, name):
+        self.counters[name] = self.version(name) + 1
+
+
+def test_workers_see_each_others_writes():
+    shared = SharedVersions()
+    rooms, loads = [{'id': 1, 'name': 'R1'}], []
+    first, second = ResponseCache(shared=shared), ResponseCache(shared=shared)
+    one, two = _serve(first, rooms, loads), _serve(second, rooms, loads)
+    etag = one.get('/rooms').headers['etag']
+    assert two.get('/rooms', headers={'If-None-Match': etag}).status_code == 304
+
+    rooms.append({'id': 2, 'name': 'R2'})
+    second.bump('classrooms')
+    changed = one.get('/rooms', headers={'If-None-Match': etag})
+
+    assert changed.status_code == 200 and len(changed.json()) == 2
@@ -0,0 +1,137 @@
+"""
+Finished generation jobs: only complete successful results are cached; an
+incumbent kept after a cancel or an accept is not. The job manager runs real
+solves in its process pool against a SQLite file: a cancel or an accept stops
+the search, and job and timetable reads stay fast while a solve runs.
+"""
+from concurrent.futures import Future
+from functools import partial
+import asyncio
+import queue
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.synthetic import populate
+from models import Base, Batch, Timetable
+import jobs
+
+# Tiny keeps improving for the whole limit with no gap allowed; a test always stops it first
+SOLVER = {'max_time_in_seconds': 60.0, 'num_search_workers': 1, 'relative_gap_limit': 0.0}
+WAIT_SECONDS = 30.0
+
+
+def _open_session(url):
+    """Session factory for the pool workers; module-level so it pickles"""
+    return sessionmaker(bind=create_engine(url))()
+
+
+@pytest.fixture(scope='module')
+def database_url(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('jobs') / 'jobs.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        populate(db, 'tiny', 0)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture(scope='module')
+def manager(database_url):
+    manager = jobs.GenerationJobManager(max_workers=1, session_factory=partial(_open_session, database_url))
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def request_all(database_url):
+    with _open_session(database_url) as db:
+        batch_ids = [batch_id for (batch_id,) in db.query(Batch.id)]
+    return jobs.GenerationJobRequest(batch_ids=batch_ids, solver=SOLVER)
+
+
+def _first_solution(job):
+    deadline = time.monotonic() + WAIT_SECONDS
+    while job.best_solution is None:
+        assert not job.future.done(), job.to_dict()
+        assert time.monotonic() < deadline, 'no incumbent found'
+        time.sleep(0.1)
+    return job.best_solution
+
+
+def _finished(result, monkeypatch):
+    stored = []
+    monkeypatch.setattr(jobs.generation_cache, 'put', lambda key, value, tags: stored.append(key))
+    monkeypatch.setattr(jobs, 'record_generation', lambda result: None)
+    future = Future()
+    future.set_running_or_notify_cancel()
+    future.set_result(result)
+    jobs.GenerationJob(
+        'job', jobs.GenerationJobRequest(batch_ids=[1]), future, threading.Event(), threading.Event(),
+        queue.Queue(), cache_key='key'
+    )
+    return stored
+
+
+@pytest.mark.parametrize('result, cached', [
+    ({'status': 'success', 'stopped_early': False}, True),
+    ({'status': 'success', 'stopped_early': True}, False),
+    ({'status': 'failed', 'stopped_early': False}, False),
+])
+def test_only_complete_successes_are_cached(monkeypatch, result, cached):
+    assert _finished(result, monkeypatch) == (['key'] if cached else [])
+
+
+def test_accept_keeps_the_incumbent(manager, request_all):
+    job = manager.submit(request_all)
+    _first_solution(job)
+    accepted_at = time.monotonic()
+    manager.accept(job.id)
+    result = job.future.result(timeout=WAIT_SECONDS)
+
+    assert time.monotonic() - accepted_at < 10
+    assert result['status'] == 'success' and result['stopped_early']
+    assert result['timetable']
+    assert job.status == 'completed'
+
+
+def test_cancel_stops_running_and_queued_jobs(manager, request_all):
+    running = manager.submit(request_all)
+    queued = manager.submit(request_all)
+    _first_solution(running)
+    manager.cancel(queued.id)
+    manager.cancel(running.id)
+
+    assert running.future.result(timeout=WAIT_SECONDS)['status'] == 'cancelled'
+    # The pool may already hold the queued job; then it stops before its solve starts
+    if not queued.future.cancelled():
+        assert queued.future.result(timeout=WAIT_SECONDS)['status'] == 'cancelled'
+    assert running.status == queued.status == 'cancelled'
+
+
+def test_reads_stay_fast_during_a_solve(manager, request_all, database_url):
+    job = manager.submit(request_all)
+    _first_solution(job)
+    latencies = []
+
+    async def read_while_solving():
+        finished = asyncio.ensure_future(manager.wait(job))
+        with _open_session(database_url) as db:
+            for _ in range(20):
+                start = time.perf_counter()
+                manager.get(job.id).to_dict()
+                db.query(Timetable).filter(Timetable.batch_id == request_all.batch_ids[0]).all()
+                await asyncio.sleep(0)
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+        assert not finished.done()
+        manager.accept(job.id)
+        return await finished
+
+    result = asyncio.run(read_while_solving())
+
+    assert result['status'] == 'success'
+    assert max(latencies) < 0.5
@@ -0,0 +1,89 @@
+"""
+Leave repair moves only the rows of the timetable each batch currently shows;
+superseded generations kept in the table are neither moved nor obstacles.
+"""
+from datetime import datetime, timedelta
+
+from availability import TIME_SLOTS
+from models import Leave, Timetable
+from timetable_engine import TimetableGenerator
+from timetable_store import replace_generation
+
+from helpers import make_institution
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+MONDAY = datetime(2026, 10, 19)
+
+
+def _approve(db, generation_id, created_at):
+    db.query(Timetable).filter(Timetable.generation_id == generation_id).update(
+        {'is_approved': True, 'created_at': created_at}, synchronize_session=False
+    )
+    db.commit()
+
+
+def test_only_current_rows_are_repaired(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60)],
+        subjects=[(1, 0)],
+        faculty=[([0], 4), ([0], 4)],
+        batches=[(40, [0])]
+    )
+    (room,), (subject,), (absent, substitute), (batch,) = classrooms, subjects, faculty, batches
+    entry = {'batch_id': batch.id, 'day': 'Monday', 'classroom_id': room.id, 'subject_id': subject.id}
+    old = replace_generation(db, [batch.id], [dict(entry, time_slot='09:00-10:00', faculty_id=absent.id)])
+    _approve(db, old, MONDAY - timedelta(days=14))
+    # The old approved generation holds the substitute at 10:00; only the current one counts
+    current = replace_generation(db, [batch.id], [
+        dict(entry, time_slot='10:00-11:00', faculty_id=absent.id),
+    ])
+    _approve(db, current, MONDAY - timedelta(days=7))
+    db.add(Timetable(**entry, time_slot='10:00-11:00', faculty_id=substitute.id, is_approved=True,
+                     generation_id=old, created_at=MONDAY - timedelta(days=14)))
+    leave = Leave(faculty_id=absent.id, date=MONDAY, reason='conference', status='approved')
+    db.add(leave)
+    db.commit()
+
+    generator = TimetableGenerator(db, solver_params=SOLVER_PARAMS)
+    result = generator.reschedule_for_leave(leave.id)
+
+    assert result['status'] == 'success'
+    assert [change['from']['time_slot'] for change in result['moved']] == ['10:00-11:00']
+    assert result['moved'][0]['to']['faculty_id'] == substitute.id
+    old_rows = db.query(Timetable.time_slot, Timetable.faculty_id).filter(Timetable.generation_id == old).all()
+    assert sorted(old_rows) == [('09:00-10:00', absent.id), ('10:00-11:00', substitute.id)]
+
+
+def test_lab_block_moves_whole_into_a_lab_room(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lab', 60)],
+        subjects=[(0, 2)],
+        faculty=[([0], 4), ([0], 4), ([0], 4)],
+        batches=[(40, [0])]
+    )
+    (lecture_room, lab_room), (subject,), (absent, *_), (batch,) = classrooms, subjects, faculty, batches
+    entry = {'batch_id': batch.id, 'day': 'Monday', 'classroom_id': lab_room.id,
+             'subject_id': subject.id, 'faculty_id': absent.id}
+    generation = replace_generation(db, [batch.id], [
+        dict(entry, time_slot='09:00-10:00'),
+        dict(entry, time_slot='10:00-11:00'),
+    ])
+    _approve(db, generation, MONDAY - timedelta(days=7))
+    leave = Leave(faculty_id=absent.id, date=MONDAY, reason='conference', status='approved')
+    db.add(leave)
+    db.commit()
+
+    generator = TimetableGenerator(db, solver_params=SOLVER_PARAMS)
+    result = generator.reschedule_for_leave(leave.id)
+
+    assert result['status'] == 'success'
+    targets = [change['to'] for change in result['moved']]
+    assert len(targets) == 2
+    assert {target['classroom_id'] for target in targets} == {lab_room.id}
+    assert len({target['faculty_id'] for target in targets}) == 1
+    assert len({target['day'] for target in targets}) == 1
+    assert sorted(target['time_slot'] for target in targets) in (
+        [slot, following] for slot, following in zip(TIME_SLOTS, TIME_SLOTS[1:])
+    )
@@ -0,0 +1,106 @@
+"""
+List endpoints: cursor pages chain through the whole table without skipping
+or repeating rows when earlier rows change, projection returns only the
+requested columns, filters combine, and the NDJSON export has one line per row.
+"""
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from typing import Optional
+import json
+import pytest
+
+import listing
+from http_cache import ResponseCache
+from listing import ListParams, list_response
+from models import Batch, Classroom
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(listing, 'response_cache', ResponseCache())
+    db.add_all(
+        [Classroom(name=f'R{i}', capacity=30 + i, type='lab' if i % 3 == 0 else 'lecture', available_slots='{}')
+         for i in range(25)]
+        + [Batch(name=f'B{i}', program='CS' if i % 2 else 'EE', semester=1 + i % 4, student_count=40,
+                 elective_groups='{}')
+           for i in range(12)]
+    )
+    db.commit()
+    app = FastAPI()
+
+    @app.get('/classrooms')
+    def get_classrooms(request: Request, type: Optional[str] = None, params: ListParams = Depends()):
+        return list_response(
+            request, db, 'classrooms', Classroom, params,
+            lambda: [{'id': c.id, 'name': c.name} for c in db.query(Classroom).order_by(Classroom.id)], list,
+            type=type
+        )
+
+    @app.get('/batches')
+    def get_batches(request: Request, program: Optional[str] = None, semester: Optional[int] = None,
+                    params: ListParams = Depends()):
+        return list_response(
+            request, db, 'batches', Batch, params, lambda: [], list, program=program, semester=semester
+        )
+
+    return TestClient(app)
+
+
+def _pages(client, url, limit):
+    pages, cursor = [], None
+    while True:
+        body = client.get(url, params={'limit': limit, **({'cursor': cursor} if cursor else {})}).json()
+        pages.append([item['id'] for item in body['items']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_chain_through_the_table(client, db):
+    pages = _pages(client, '/classrooms', 10)
+
+    assert [len(ids) for ids in pages] == [10, 10, 5]
+    assert sum(pages, []) == sorted(c.id for c in db.query(Classroom))
+
+
+def test_pages_do_not_shift_when_earlier_rows_change(client, db):
+    first = client.get('/classrooms', params={'limit': 10}).json()
+    # An offset page would now start one row later and skip a room
+    db.delete(db.get(Classroom, first['items'][0]['id']))
+    db.commit()
+
+    second = client.get('/classrooms', params={'limit': 10, 'cursor': first['next_cursor']}).json()
+
+    assert [item['id'] for item in second['items']] == list(range(11, 21))
+
+
+def test_projection_returns_only_the_requested_columns(client):
+    body = client.get('/classrooms', params={'limit': 5, 'fields': 'name,capacity'}).json()
+
+    assert {tuple(sorted(item)) for item in body['items']} == {('capacity', 'id', 'name')}
+    assert client.get('/classrooms', params={'fields': 'name,secret'}).status_code == 400
+    assert client.get('/classrooms', params={'cursor': 'not-a-cursor'}).status_code == 400
+
+
+def test_filters_combine(client, db):
+    labs = client.get('/classrooms', params={'type': 'lab', 'limit': 100}).json()['items']
+    batches = client.get('/batches', params={'program': 'CS', 'semester': 2, 'fields': 'program,semester'}).json()
+
+    assert [room['id'] for room in labs] == [c.id for c in db.query(Classroom).filter_by(type='lab')]
+    assert batches['items'] and all(
+        (item['program'], item['semester']) == ('CS', 2) for item in batches['items']
+    )
+    assert len(batches['items']) == db.query(Batch).filter_by(program='CS', semester=2).count()
+
+
+def test_ndjson_export_streams_every_row(client, db, monkeypatch):
+    monkeypatch.setattr(listing, 'EXPORT_CHUNK_ROWS', 4)
+    response = client.get('/classrooms', params={'format': 'ndjson', 'fields': 'name'})
+
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{'id': c.id, 'name': c.name} for c in db.query(Classroom).order_by(Classroom.id)]
+
+
+def test_plain_request_returns_the_whole_table(client, db):
+    assert len(client.get('/classrooms').json()) == db.query(Classroom).count()
@@ -0,0 +1,69 @@
+"""
+Large neighbourhood search: the incumbent stays a valid timetable whose
+objective never gets worse, every neighbourhood respects the session cap,
+and a stop request ends the search with the current incumbent.
+"""
+import asyncio
+import time
+
+from availability import WeeklyAvailability
+from lns import Instance, LargeNeighbourhoodSearch, objective
+from models import Batch, Classroom, Faculty, Subject
+from timetable_engine import TimetableGenerator
+
+from helpers import timetable_violations
+
+MAX_SESSIONS = 8
+
+
+def _inputs(db):
+    batches, classrooms = db.query(Batch).all(), db.query(Classroom).all()
+    faculty, subjects = db.query(Faculty).all(), db.query(Subject).all()
+    return batches, classrooms, faculty, subjects, WeeklyAvailability.load(classrooms, faculty)
+
+
+def test_search_improves_a_valid_incumbent(tiny):
+    batches, classrooms, faculty, subjects, availability = _inputs(tiny)
+    instance = Instance(batches, classrooms, faculty, subjects, {}, availability)
+    search = LargeNeighbourhoodSearch(instance, seed=0, iteration_seconds=0.5, max_sessions=MAX_SESSIONS)
+    history = [search.objective]
+
+    search.run(time.perf_counter() + 3.0, lambda: False, lambda: history.append(search.objective))
+
+    assert search.stats['iterations'] > 0
+    assert 0 < search.max_neighbourhood <= MAX_SESSIONS
+    assert history == sorted(history, reverse=True)
+    assert search.objective == objective(instance, search.sessions) <= search.initial_objective
+    assert search.unplaced == 0
+    rows = search.timetable_rows()
+    assert timetable_violations(rows, batches, classrooms, faculty, subjects, availability) == []
+
+
+def test_stop_request_keeps_the_greedy_incumbent(tiny):
+    batches, classrooms, faculty, subjects, availability = _inputs(tiny)
+    search = LargeNeighbourhoodSearch(Instance(batches, classrooms, faculty, subjects, {}, availability))
+    greedy = search.sessions.copy()
+
+    search.run(time.perf_counter() + 60.0, lambda: True)
+
+    assert search.stats['iterations'] == 0
+    assert (search.sessions == greedy).all()
+
+
+def test_generation_with_lns(tiny):
+    batch_ids = [b.id for b in tiny.query(Batch).all()]
+    generator = TimetableGenerator(tiny, solver_params={'max_time_in_seconds': 3.0, 'num_search_workers': 1})
+
+    result = asyncio.run(generator.generate_optimized_timetable(
+        batch_ids, {'lns_iteration_seconds': 0.5, 'lns_max_sessions': MAX_SESSIONS}, lns=True
+    ))
+
+    assert result['status'] == 'success'
+    objectives = [solution['objective'] for solution in result['solutions']]
+    assert objectives == sorted(objectives, reverse=True)
+    assert result['metrics']['model_stats']['lns_initial_objective'] == objectives[0]
+    assert result['metrics']['model_stats']['lns_max_neighbourhood_sessions'] <= MAX_SESSIONS
+    batches, classrooms, faculty, subjects, availability = _inputs(tiny)
+    assert timetable_violations(
+        result['timetable'], batches, classrooms, faculty, subjects, availability
+    ) == []
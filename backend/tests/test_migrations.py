@@ -0,0 +1,86 @@
+"""
+The migrations upgrade a database created before the schema changes they
+describe: availability masks and faculty_subjects (0001), timetable
+generations (0001a), dashboard indexes and grids (0001b), the report
+aggregates (0002) and their per-faculty leave counts (0003).
+"""
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+import os
+import pytest
+
+from models import (
+    Base, Batch, Classroom, Faculty, Leave, LeaveAggregate, Subject, Timetable, TimetableView, UsageAggregate
+)
+from benchmarks.synthetic import populate
+
+alembic_command = pytest.importorskip('alembic.command')
+alembic_config = pytest.importorskip('alembic.config')
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _legacy_database(url):
+    """Today's tables with the migrated columns, indexes and tables removed, holding an old timetable"""
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    populate(db, 'tiny', 0)
+    batches = db.query(Batch).order_by(Batch.id).all()
+    teacher = db.query(Faculty).order_by(Faculty.id).first()
+    room = db.query(Classroom).order_by(Classroom.id).first()
+    subject = db.query(Subject).order_by(Subject.id).first()
+    for batch, day, is_approved in ((batches[0], 'Monday', True), (batches[0], 'Tuesday', False), (batches[1], 'Wednesday', False)):
+        db.add(Timetable(
+            batch_id=batch.id, day=day, time_slot='09:00-10:00', classroom_id=room.id,
+            subject_id=subject.id, faculty_id=teacher.id, is_approved=is_approved
+        ))
+    db.add_all([
+        Leave(faculty_id=teacher.id, date=datetime(2026, 10, 19), reason='conference', status='approved'),
+        Leave(faculty_id=teacher.id, date=datetime(2026, 10, 19, 14), reason='illness', status='approved'),
+    ])
+    db.commit()
+    db.close()
+
+    with engine.begin() as connection:
+        for index in inspect(connection).get_indexes('timetables'):
+            if index['name'] != 'ix_timetables_id':
+                connection.execute(text(f"DROP INDEX {index['name']}"))
+        connection.execute(text('ALTER TABLE timetables DROP COLUMN generation_id'))
+        for table in ('classrooms', 'faculty'):
+            connection.execute(text(f'ALTER TABLE {table} DROP COLUMN availability_mask'))
+        for table in ('faculty_subjects', 'timetable_views', 'usage_aggregates', 'leave_aggregates'):
+            connection.execute(text(f'DROP TABLE {table}'))
+        connection.execute(text('DROP INDEX ix_leaves_status_date'))
+    return engine
+
+
+def test_upgrade_from_legacy_schema(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = _legacy_database(url)
+    monkeypatch.setenv('DATABASE_URL', url)
+    monkeypatch.chdir(BACKEND)
+
+    alembic_command.upgrade(alembic_config.Config(os.path.join(BACKEND, 'alembic.ini')), 'head')
+
+    inspector = inspect(engine)
+    assert {
+        'ix_timetables_generation_id', 'ix_timetables_batch_day_slot', 'ix_timetables_faculty_day_slot',
+        'ix_timetables_classroom_day_slot', 'ix_timetables_day_slot'
+    } <= {index['name'] for index in inspector.get_indexes('timetables')}
+    db = sessionmaker(bind=engine)()
+    generations = db.query(Timetable.batch_id, Timetable.is_approved, Timetable.generation_id).all()
+    assert all(generation_id for _, _, generation_id in generations)
+    # One generation per batch and approval state
+    assert len({generation_id for _, _, generation_id in generations}) == 3
+    assert db.query(Faculty).first().subjects
+    assert db.query(TimetableView).filter(TimetableView.entity == 'batch').count() == db.query(Batch).count()
+    # Only the approved Monday row of the first batch is current
+    assert db.query(UsageAggregate).filter(UsageAggregate.entity == 'room').count() == 2
+    teacher = db.query(Faculty).order_by(Faculty.id).first()
+    assert db.query(LeaveAggregate.faculty_id, LeaveAggregate.status, LeaveAggregate.leaves).all() == [
+        (teacher.id, 'approved', 2)
+    ]
+    db.close()
+    engine.dispose()
@@ -0,0 +1,59 @@
+"""
+Faculty.assigned_subjects is mirrored into faculty_subjects on every write,
+including for subjects created after the faculty that lists them, and a
+malformed JSON value never breaks the write.
+"""
+import json
+
+from models import Faculty, Subject, parse_subject_ids
+
+
+def _subject(db, name):
+    subject = Subject(name=name, code=name.upper(), lecture_hours=2, lab_hours=0)
+    db.add(subject)
+    db.commit()
+    return subject
+
+
+def test_faculty_links_subjects_created_later(db):
+    existing = _subject(db, 'algebra')
+    teacher = Faculty(name='T', max_daily_classes=4, assigned_subjects=json.dumps([existing.id, existing.id + 1]))
+    db.add(teacher)
+    db.commit()
+    assert [s.id for s in teacher.subjects] == [existing.id]
+
+    later = _subject(db, 'geometry')
+    db.expire(teacher)
+
+    assert later.id == existing.id + 1
+    assert sorted(s.id for s in teacher.subjects) == [existing.id, later.id]
+
+
+def test_new_subject_matches_ids_exactly(db):
+    teacher = Faculty(name='T', max_daily_classes=4, assigned_subjects=json.dumps([11]))
+    db.add(teacher)
+    db.commit()
+
+    subject = _subject(db, 'algebra')
+    db.expire(teacher)
+
+    assert subject.id == 1
+    assert teacher.subjects == []
+
+
+def test_malformed_assigned_subjects_are_ignored(db):
+    subject = _subject(db, 'algebra')
+    teacher = Faculty(name='T', max_daily_classes=4, assigned_subjects='[1,')
+    db.add(teacher)
+    db.commit()
+    assert teacher.subjects == []
+
+    teacher.assigned_subjects = json.dumps([str(subject.id), 'x', None, {'id': 2}])
+    db.commit()
+    assert [s.id for s in teacher.subjects] == [subject.id]
+
+
+def test_parse_subject_ids():
+    assert parse_subject_ids(None) == set()
+    assert parse_subject_ids('{"a": 1}') == set()
+    assert parse_subject_ids('[1, "2", 2.0, "x", null]') == {1, 2}
@@ -0,0 +1,68 @@
+"""
+Generation metrics: a finished generation is exported phase by phase with its
+model size and solver statistics plus one structured log record, and request
+latency is labelled by route template rather than raw path.
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+import asyncio
+import json
+import logging
+
+import monitoring
+from models import Batch
+from monitoring import record_generation, track_request_latency
+from timetable_engine import TimetableGenerator
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_generation_is_exported_phase_by_phase(tiny, caplog, monkeypatch):
+    # alembic's fileConfig disables existing loggers when the migration tests run first
+    monkeypatch.setattr(monitoring.logger, 'disabled', False)
+    generator = TimetableGenerator(tiny, solver_params={'max_time_in_seconds': 2.0, 'num_search_workers': 1})
+    result = asyncio.run(generator.generate_optimized_timetable([b.id for b in tiny.query(Batch)], {}))
+    assert result['status'] == 'success'
+    profile = result['metrics']['profile']
+    assert {'load', 'diagnose', 'build', 'solve', 'extract', 'persist'} <= set(profile)
+    before = {
+        'generations': _sample('timetable_generations_total', status='success'),
+        'solve': _sample('timetable_generation_phase_seconds_count', phase='solve'),
+        'conflicts': _sample('timetable_solver_conflicts_total')
+    }
+
+    with caplog.at_level(logging.INFO, logger='timetable.generation'):
+        record_generation(result)
+
+    assert _sample('timetable_generations_total', status='success') == before['generations'] + 1
+    assert _sample('timetable_generation_phase_seconds_count', phase='solve') == before['solve'] + 1
+    assert _sample('timetable_model_size', kind='variables') == result['metrics']['model_stats']['variables']
+    assert _sample('timetable_solver_conflicts_total') == (
+        before['conflicts'] + result['solver_stats']['conflicts']
+    )
+    record = json.loads(caplog.records[-1].getMessage())
+    assert (record['event'], record['generation_id']) == ('timetable_generation', result['generation_id'])
+    assert record['profile'] == profile
+
+
+def test_request_latency_is_labelled_by_route_template():
+    app = FastAPI()
+    app.middleware('http')(track_request_latency)
+
+    @app.get('/api/batches/{batch_id}')
+    def get_batch(batch_id: int):
+        return {'id': batch_id}
+
+    client = TestClient(app)
+    labels = {'method': 'GET', 'route': '/api/batches/{batch_id}', 'status': '200'}
+    before = _sample('http_request_duration_seconds_count', **labels)
+    for batch_id in (1, 2, 3):
+        client.get(f'/api/batches/{batch_id}')
+    client.get('/nowhere')
+
+    assert _sample('http_request_duration_seconds_count', **labels) == before + 3
+    assert _sample('http_request_duration_seconds_count', method='GET', route='/api/batches/1', status='200') == 0
+    assert _sample('http_request_duration_seconds_count', method='GET', route='unmatched', status='404') >= 1
@@ -0,0 +1,95 @@
+"""
+Principal cache: a verified token is answered from the cache until its TTL or
+its own expiry, the LRU stays bounded, and ORM changes to a user drop that
+user's tokens at flush and again at commit.
+"""
+import time
+import pytest
+
+import principals
+from models import User
+from principals import PrincipalCache, principal_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(principals.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def user(db):
+    principal_cache.clear()
+    user = User(email='a@example.edu', password_hash='-', role='admin', name='A')
+    db.add(user)
+    db.commit()
+    yield user
+    principal_cache.clear()
+
+
+def test_entries_expire_with_the_ttl_or_the_token(clock):
+    cache = PrincipalCache(ttl_seconds=300)
+    user = User(id=1, email='a@example.edu', role='admin', name='A')
+
+    principal = cache.put('long', user)
+    cache.put('short', user, token_exp=time.time() + 10)
+    cache.put('expired', user, token_exp=time.time() - 1)
+
+    assert cache.get('long') is principal and principal.role == 'admin'
+    assert cache.get('expired') is None
+    clock[0] += 11
+    assert cache.get('short') is None and cache.get('long') is principal
+    clock[0] += 300
+    assert cache.get('long') is None
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = PrincipalCache(max_entries=2)
+    user = User(id=1, email='a@example.edu', role='admin', name='A')
+    for token in ('first', 'second'):
+        cache.put(token, user)
+    cache.get('first')
+
+    cache.put('third', user)
+
+    assert cache.get('second') is None
+    assert cache.get('first') is not None and cache.get('third') is not None
+
+
+def test_role_change_drops_cached_tokens(db, user):
+    principal_cache.put('token', user)
+    other = principal_cache.put('other', User(id=99, email='b@example.edu', role='admin', name='B'))
+
+    user.role = 'student'
+    db.flush()
+    assert principal_cache.get('token') is None
+    # A request racing the open transaction re-caches the old row
+    principal_cache.put('token', User(id=user.id, email=user.email, role='admin', name=user.name))
+    db.commit()
+
+    assert principal_cache.get('token') is None
+    assert principal_cache.get('other') is other
+
+
+def test_email_change_and_delete_drop_cached_tokens(db, user):
+    principal_cache.put('old', user)
+    user.email = 'renamed@example.edu'
+    db.commit()
+    assert principal_cache.get('old') is None
+
+    principal_cache.put('new', user)
+    db.delete(user)
+    db.commit()
+    assert principal_cache.get('new') is None
+
+
+def test_rolled_back_change_is_not_replayed(db, user):
+    user.role = 'student'
+    db.flush()
+    db.rollback()
+    assert 'changed_user_emails' not in db.info
+
+    principal_cache.put('token', user)
+    db.commit()
+    assert principal_cache.get('token').role == 'admin'
@@ -0,0 +1,204 @@
+"""
+The sparse model admits exactly the timetables of the dense 6-D formulation it
+replaced: on small lecture-only instances both agree on feasibility, every
+sparse solution passes the independent checker, and the dense solution is
+accepted by the sparse model when pinned as fixed entries. The soft
+objective leaves no idle gaps and spreads faculty load where the data allows.
+"""
+from itertools import product
+from ortools.sat.python import cp_model
+import json
+import pytest
+
+from availability import DAYS, TIME_SLOTS, WeeklyAvailability, is_free
+from timetable_engine import LECTURE_ROOM_TYPES, TimetableGenerator, _batch_subject_ids
+
+from helpers import make_institution, timetable_violations
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+
+# name -> (rooms, subjects, faculty, batches, feasible); see helpers.make_institution
+INSTANCES = {
+    'basic': (
+        [('lecture', 60), ('seminar', 40)],
+        [(3, 0), (2, 0), (4, 0)],
+        [([0], 4), ([1, 2], 4), ([2], 3)],
+        [(50, [0, 1, 2]), (35, [0, 2])],
+        True
+    ),
+    'room_too_small': (
+        [('lecture', 30)],
+        [(2, 0)],
+        [([0], 4)],
+        [(50, [0])],
+        False
+    ),
+    'teacher_away': (
+        [('lecture', 60)],
+        [(3, 0)],
+        [([0], 2, json.dumps(['Monday']))],
+        [(40, [0])],
+        False
+    ),
+    'one_room_full_week': (
+        [('lecture', 60)],
+        [(5, 0), (5, 0), (5, 0), (5, 0)],
+        [([0, 1], 8), ([2, 3], 8)],
+        [(40, [0, 1]), (40, [2, 3])],
+        True
+    ),
+    # Two teachers could share the 7 hours, but one teacher must take all of them
+    'one_teacher_per_subject': (
+        [('lecture', 60)],
+        [(7, 0)],
+        [([0], 1), ([0], 1)],
+        [(40, [0])],
+        False
+    ),
+}
+
+
+def _dense_solution(batches, classrooms, faculty, subjects, availability):
+    """
+    The original formulation: one variable per (batch, subject, faculty, room,
+    day, slot) of the full cross product, infeasible combinations forced to 0
+    by constraints instead of never being created.
+    """
+    model = cp_model.CpModel()
+    x = {
+        key: model.NewBoolVar(str(key))
+        for key in product(
+            [b.id for b in batches], [s.id for s in subjects], [f.id for f in faculty],
+            [c.id for c in classrooms], range(len(DAYS)), range(len(TIME_SLOTS))
+        )
+    }
+    batch_by_id = {b.id: b for b in batches}
+    subject_by_id = {s.id: s for s in subjects}
+    teacher_by_id = {f.id: f for f in faculty}
+    room_by_id = {c.id: c for c in classrooms}
+    curricula = {b.id: _batch_subject_ids(b, subjects) for b in batches}
+
+    for (b, s, f, r, d, t), var in x.items():
+        room, teacher = room_by_id[r], teacher_by_id[f]
+        allowed = (
+            s in curricula[b]
+            and s in {subject.id for subject in teacher.subjects}
+            and room.type in LECTURE_ROOM_TYPES
+            and (room.capacity or 0) >= (batch_by_id[b].student_count or 0)
+            and is_free(availability.room(r), d, t)
+            and is_free(availability.teacher(f), d, t)
+        )
+        if not allowed:
+            model.Add(var == 0)
+
+    for b, s in product(batch_by_id, subject_by_id):
+        required = subject_by_id[s].lecture_hours if s in curricula[b] else 0
+        model.Add(sum(var for key, var in x.items() if key[:2] == (b, s)) == required)
+        teaches = [model.NewBoolVar(f'y_{b}_{s}_{f}') for f in teacher_by_id]
+        for f, y in zip(teacher_by_id, teaches):
+            for key, var in x.items():
+                if key[:3] == (b, s, f):
+                    model.AddImplication(var, y)
+        model.Add(sum(teaches) <= 1)
+    for d, t in product(range(len(DAYS)), range(len(TIME_SLOTS))):
+        for position in (0, 2, 3):
+            by_resource = {}
+            for key, var in x.items():
+                if key[4:] == (d, t):
+                    by_resource.setdefault(key[position], []).append(var)
+            for variables in by_resource.values():
+                model.Add(sum(variables) <= 1)
+    for f, d in product(teacher_by_id, range(len(DAYS))):
+        model.Add(
+            sum(var for key, var in x.items() if key[2] == f and key[4] == d) <= teacher_by_id[f].max_daily_classes
+        )
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = SOLVER_PARAMS['max_time_in_seconds']
+    solver.parameters.num_search_workers = 1
+    status = solver.Solve(model)
+    assert status != cp_model.UNKNOWN, 'dense reference model did not finish'
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None, len(x)
+    rows = [
+        {
+            'batch_id': b, 'day': DAYS[d], 'time_slot': TIME_SLOTS[t], 'classroom_id': r,
+            'subject_id': s, 'faculty_id': f, 'is_fixed': True
+        }
+        for (b, s, f, r, d, t), var in x.items() if solver.Value(var)
+    ]
+    return rows, len(x)
+
+
+def _solve_sparse(batches, classrooms, faculty, subjects, availability, previous=None):
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+    # Any feasible timetable will do: the soft objective is not under test
+    generator.solver.parameters.stop_after_first_solution = True
+    status, rows = generator._solve_sparse(batches, classrooms, faculty, subjects, {}, availability, previous)
+    assert status != cp_model.UNKNOWN, 'sparse model did not finish'
+    return status in (cp_model.OPTIMAL, cp_model.FEASIBLE), rows, generator.model_stats
+
+
+@pytest.mark.parametrize('name', sorted(INSTANCES))
+def test_sparse_and_dense_models_agree(db, name):
+    rooms, subjects, faculty, batches, feasible = INSTANCES[name]
+    classrooms, subjects, faculty, batches = make_institution(db, rooms, subjects, faculty, batches)
+    availability = WeeklyAvailability.load(classrooms, faculty)
+
+    dense_rows, dense_variables = _dense_solution(batches, classrooms, faculty, subjects, availability)
+    sparse_feasible, sparse_rows, model_stats = _solve_sparse(batches, classrooms, faculty, subjects, availability)
+
+    assert sparse_feasible == (dense_rows is not None) == feasible
+    assert model_stats['variables'] <= dense_variables
+    if feasible:
+        assert timetable_violations(sparse_rows, batches, classrooms, faculty, subjects, availability) == []
+        # The dense solution lies in the sparse model's feasible set
+        pinned, pinned_rows, _ = _solve_sparse(batches, classrooms, faculty, subjects, availability, dense_rows)
+        assert pinned
+        key = lambda row: (row['batch_id'], row['day'], row['time_slot'], row['subject_id'], row['faculty_id'])
+        assert sorted(map(key, pinned_rows)) == sorted(map(key, dense_rows))
+
+
+def test_labs_are_scheduled_as_whole_blocks(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lab', 60)],
+        subjects=[(2, 3), (3, 0)],
+        faculty=[([0], 5), ([0, 1], 5)],
+        batches=[(45, [0, 1]), (50, [0, 1])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+
+    feasible, rows, _ = _solve_sparse(batches, classrooms, faculty, subjects, availability)
+
+    assert feasible
+    assert timetable_violations(rows, batches, classrooms, faculty, subjects, availability) == []
+
+
+def test_objective_closes_gaps_and_spreads_faculty_load(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 60), ('lab', 60)],
+        subjects=[(4, 0), (0, 3)],
+        faculty=[([0], 4), ([1], 4)],
+        batches=[(40, [0, 1])]
+    )
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    generator = TimetableGenerator(None, solver_params=SOLVER_PARAMS)
+
+    status, rows = generator._solve_sparse(batches, classrooms, faculty, subjects, {}, availability)
+
+    assert status == cp_model.OPTIMAL
+    # Exactly the weekly hours, not every free slot
+    assert len(rows) == 7
+    assert timetable_violations(rows, batches, classrooms, faculty, subjects, availability) == []
+    slots_by_day = {}
+    for row in rows:
+        slots_by_day.setdefault(row['day'], []).append(TIME_SLOTS.index(row['time_slot']))
+    assert all(max(slots) - min(slots) + 1 == len(slots) for slots in slots_by_day.values())
+    peaks = {
+        f.id: max(sum(1 for row in rows if row['faculty_id'] == f.id and row['day'] == day) for day in DAYS)
+        for f in faculty
+    }
+    # One lecture a day; the lab teacher's busiest day is its 2-slot block
+    assert peaks == {faculty[0].id: 1, faculty[1].id: 2}
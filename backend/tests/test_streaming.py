@@ -0,0 +1,55 @@
+"""
+Generation streams each improving solution to its progress queue, with the
+timetable attached to the first one, and accepting the incumbent stops the
+search and keeps it as a complete, valid result.
+"""
+import asyncio
+import queue
+import threading
+
+from availability import WeeklyAvailability
+from models import Batch, Classroom, Faculty, Subject, Timetable
+from timetable_engine import TimetableGenerator
+
+from helpers import timetable_violations
+
+
+class AcceptOnFirstSolution(queue.Queue):
+    """Progress queue that accepts the incumbent as soon as one arrives"""
+
+    def __init__(self, accept_event):
+        super().__init__()
+        self.accept_event = accept_event
+
+    def put(self, item, *args, **kwargs):
+        super().put(item, *args, **kwargs)
+        if item['event'] == 'solution':
+            self.accept_event.set()
+
+
+def test_accepted_incumbent_is_streamed_and_kept(tiny):
+    accept_event = threading.Event()
+    progress = AcceptOnFirstSolution(accept_event)
+    generator = TimetableGenerator(
+        tiny, solver_params={'max_time_in_seconds': 60.0, 'num_search_workers': 1},
+        accept_event=accept_event, progress=progress
+    )
+    batch_ids = [batch_id for (batch_id,) in tiny.query(Batch.id)]
+
+    result = asyncio.run(generator.generate_optimized_timetable(batch_ids, {}, use_ai_suggestions=False))
+
+    events = []
+    while not progress.empty():
+        events.append(progress.get())
+    solutions = [event for event in events if event['event'] == 'solution']
+    assert events[0]['event'] == 'solving' and solutions
+    assert solutions[0]['timetable']
+    assert result['status'] == 'success' and result['stopped_early']
+    assert result['solutions'][0]['objective'] == solutions[0]['objective']
+    assert result['metrics']['profile']['solve'] < 30
+    assert tiny.query(Timetable).count() == len(result['timetable'])
+
+    batches = tiny.query(Batch).all()
+    classrooms, faculty, subjects = tiny.query(Classroom).all(), tiny.query(Faculty).all(), tiny.query(Subject).all()
+    availability = WeeklyAvailability.load(classrooms, faculty)
+    assert timetable_violations(result['timetable'], batches, classrooms, faculty, subjects, availability) == []
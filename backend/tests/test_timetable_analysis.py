@@ -0,0 +1,134 @@
+"""
+Timetable analysis: findings on a random timetable agree with a row-by-row
+recount, and applying any candidate creates no clash, keeps availability and
+daily limits, and removes what it was offered for.
+"""
+from collections import Counter
+import json
+import random
+import pytest
+
+from availability import DAYS, TIME_SLOTS, WeeklyAvailability, is_free
+from timetable_analysis import TimetableAnalysis
+
+from helpers import make_institution
+
+
+@pytest.fixture
+def institution(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db,
+        rooms=[('lecture', 30), ('lecture', 60), ('lecture', 80), ('lab', 60)],
+        subjects=[(3, 0), (3, 0)],
+        faculty=[([0], 3), ([0, 1], 4), ([1], 2, json.dumps(['Monday', 'Tuesday', 'Wednesday'])), ([0], 5)],
+        batches=[(25, [0]), (50, [0, 1]), (70, [1])]
+    )
+    classrooms[3].available_slots = json.dumps(['Friday'])
+    db.commit()
+    return classrooms, faculty, batches, WeeklyAvailability.load(classrooms, faculty)
+
+
+def _random_rows(classrooms, faculty, batches, count, seed):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': n + 1, 'batch_id': rng.choice(batches).id, 'day': rng.choice(DAYS[:3]),
+            'time_slot': rng.choice(TIME_SLOTS), 'classroom_id': rng.choice(classrooms[:3]).id,
+            'faculty_id': rng.choice(faculty).id, 'subject_id': 1, 'is_fixed': n % 7 == 0
+        }
+        for n in range(count)
+    ]
+
+
+def _clashes(rows):
+    return {
+        (column, row[column], row['day'], row['time_slot'])
+        for column in ('batch_id', 'faculty_id', 'classroom_id')
+        for row in rows
+        if sum((r[column], r['day'], r['time_slot']) == (row[column], row['day'], row['time_slot']) for r in rows) > 1
+    }
+
+
+def _apply(rows, candidate):
+    return [
+        {**row, **candidate['to']} if row['id'] == candidate['timetable_id'] else row
+        for row in rows
+    ]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_findings_match_a_recount(institution, seed):
+    classrooms, faculty, batches, availability = institution
+    rows = _random_rows(classrooms, faculty, batches, 60, seed)
+
+    findings = TimetableAnalysis(rows, batches, classrooms, faculty, availability).findings()
+    by_type = Counter(finding['type'] for finding in findings)
+
+    entity_column = {'batch': 'batch_id', 'faculty': 'faculty_id', 'classroom': 'classroom_id'}
+    assert {
+        (entity_column[f['entity']], f['entity_id'], f['day'], f['time_slot'])
+        for f in findings if f['type'] == 'double_booking'
+    } == _clashes(rows)
+    size = {b.id: b.student_count for b in batches}
+    seats = {c.id: c.capacity for c in classrooms}
+    assert by_type['capacity'] == sum(size[row['batch_id']] > seats[row['classroom_id']] for row in rows)
+    daily = Counter((row['faculty_id'], row['day']) for row in rows)
+    limit = {f.id: f.max_daily_classes for f in faculty}
+    assert {(f['entity_id'], f['day']) for f in findings if f['type'] == 'overload'} == {
+        key for key, count in daily.items() if count > limit[key[0]]
+    }
+    impacts = [finding['impact'] for finding in findings]
+    assert impacts == sorted(impacts, reverse=True)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_candidates_create_no_new_problem(institution, seed):
+    classrooms, faculty, batches, availability = institution
+    rows = _random_rows(classrooms, faculty, batches, 40, seed)
+    teachers = {f.id: f for f in faculty}
+    fixed = {row['id'] for row in rows if row['is_fixed']}
+    before = _clashes(rows)
+
+    findings = TimetableAnalysis(rows, batches, classrooms, faculty, availability).findings()
+    candidates = [candidate for finding in findings for candidate in finding['candidates']]
+    assert candidates
+
+    for candidate in candidates:
+        assert candidate['timetable_id'] not in fixed
+        moved = _apply(rows, candidate)
+        assert _clashes(moved) <= before
+        row = next(row for row in moved if row['id'] == candidate['timetable_id'])
+        d, s = DAYS.index(row['day']), TIME_SLOTS.index(row['time_slot'])
+        assert is_free(availability.room(row['classroom_id']), d, s)
+        assert is_free(availability.teacher(row['faculty_id']), d, s)
+        # A day already over the limit may only lose sessions
+        load = Counter((r['faculty_id'], r['day']) for r in moved)[(row['faculty_id'], row['day'])]
+        if row['day'] != candidate['from']['day']:
+            assert load <= teachers[row['faculty_id']].max_daily_classes
+
+
+def test_candidates_resolve_their_finding(institution):
+    classrooms, faculty, batches, availability = institution
+    small, medium, large, lab = classrooms
+    first, second = faculty[0], faculty[1]
+    row = lambda n, batch, slot, room, teacher: {
+        'id': n, 'batch_id': batch.id, 'day': 'Monday', 'time_slot': TIME_SLOTS[slot],
+        'classroom_id': room.id, 'faculty_id': teacher.id, 'subject_id': 1, 'is_fixed': False
+    }
+    rows = [
+        row(1, batches[0], 0, small, first),
+        row(2, batches[1], 0, medium, first),  # first teaches two batches at once
+        row(3, batches[2], 1, medium, second),  # 70 students in 60 seats
+    ]
+
+    findings = TimetableAnalysis(rows, batches, classrooms, faculty, availability).findings()
+
+    assert [f['type'] for f in findings if f['severity'] == 'high'] == ['double_booking', 'capacity']
+    clash, capacity = findings[0], findings[1]
+    assert clash['candidates'][0]['timetable_id'] == 2
+    assert capacity['candidates'][0]['to']['classroom_id'] == large.id
+    fixed = _apply(_apply(rows, clash['candidates'][0]), capacity['candidates'][0])
+    assert [
+        f['type'] for f in TimetableAnalysis(fixed, batches, classrooms, faculty, availability).findings()
+        if f['severity'] == 'high'
+    ] == []
@@ -0,0 +1,74 @@
+"""
+Persisting a generation replaces the unapproved rows of its batches in one
+transaction and tags the new rows; approved rows and other batches are kept,
+a failed write leaves the previous schedule, and the grids follow.
+"""
+import json
+import pytest
+
+import timetable_store
+from models import Timetable, TimetableView
+from timetable_store import latest_approved, replace_generation
+
+from helpers import make_institution
+
+
+@pytest.fixture
+def institution(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db, rooms=[('lecture', 60)], subjects=[(2, 0)], faculty=[([0], 4), ([0], 4)], batches=[(40, [0]), (40, [0])]
+    )
+    return classrooms[0], subjects[0], faculty, batches
+
+
+def _entries(institution, batch, teacher, days):
+    room, subject, _, _ = institution
+    return [{
+        'batch_id': batch.id, 'day': day, 'time_slot': '09:00-10:00', 'classroom_id': room.id,
+        'subject_id': subject.id, 'faculty_id': teacher.id
+    } for day in days]
+
+
+def test_replace_keeps_approved_rows_and_other_batches(db, institution):
+    _, _, (first, second), (a, b) = institution
+    approved = replace_generation(db, [a.id], _entries(institution, a, first, ['Monday']))
+    db.query(Timetable).update({'is_approved': True})
+    db.commit()
+    other = replace_generation(db, [b.id], _entries(institution, b, first, ['Friday']))
+
+    draft = replace_generation(db, [a.id], _entries(institution, a, second, ['Tuesday', 'Wednesday']))
+    again = replace_generation(db, [a.id], _entries(institution, a, second, ['Thursday']))
+
+    rows = db.query(Timetable.generation_id, Timetable.batch_id, Timetable.day).all()
+    assert draft not in {generation_id for generation_id, _, _ in rows}
+    assert sorted(rows) == sorted([(approved, a.id, 'Monday'), (other, b.id, 'Friday'), (again, a.id, 'Thursday')])
+    assert latest_approved(db, [a.id, b.id]) == [dict(_entries(institution, a, first, ['Monday'])[0], is_fixed=False)]
+
+
+def test_failed_write_keeps_the_previous_schedule(db, institution, monkeypatch):
+    _, _, (first, second), (a, _) = institution
+    previous = replace_generation(db, [a.id], _entries(institution, a, first, ['Monday']))
+
+    def fail(*args):
+        raise RuntimeError('grid refresh failed')
+    monkeypatch.setattr(timetable_store, 'refresh_batches', fail)
+    with pytest.raises(RuntimeError):
+        replace_generation(db, [a.id], _entries(institution, a, second, ['Tuesday']))
+
+    assert db.query(Timetable.generation_id, Timetable.day).all() == [(previous, 'Monday')]
+
+
+def test_grids_show_the_new_generation(db, institution):
+    _, _, (first, second), (a, _) = institution
+    replace_generation(db, [a.id], _entries(institution, a, first, ['Monday']))
+    replace_generation(db, [a.id], _entries(institution, a, second, ['Tuesday']))
+
+    grids = {
+        (entity, entity_id): json.loads(grid)
+        for entity, entity_id, grid in db.query(TimetableView.entity, TimetableView.entity_id, TimetableView.grid)
+    }
+    batch_grid = grids[('batch', a.id)]['days']
+    assert batch_grid['Monday']['09:00-10:00'] == []
+    assert [entry['faculty_id'] for entry in batch_grid['Tuesday']['09:00-10:00']] == [second.id]
+    # The teacher whose rows went away no longer shows them
+    assert all(not cell for day in grids[('faculty', first.id)]['days'].values() for cell in day.values())
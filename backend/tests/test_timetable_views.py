@@ -0,0 +1,86 @@
+"""
+Stored grids and usage aggregates are upserted: a row another transaction
+inserted for the same entity or cell meanwhile is updated instead of breaking
+the unique constraint.
+"""
+from datetime import datetime
+from sqlalchemy import create_mock_engine
+import json
+
+import analytics
+import timetable_views
+from models import TimetableView, UsageAggregate
+from timetable_store import replace_generation
+from timetable_views import get_view, refresh_batches
+
+from helpers import make_institution
+
+
+def _institution(db):
+    classrooms, subjects, faculty, batches = make_institution(
+        db, rooms=[('lecture', 60)], subjects=[(2, 0)], faculty=[([0], 4)], batches=[(40, [0])]
+    )
+    (room,), (subject,), (teacher,), (batch,) = classrooms, subjects, faculty, batches
+    replace_generation(db, [batch.id], [{
+        'batch_id': batch.id, 'day': 'Monday', 'time_slot': '09:00-10:00', 'classroom_id': room.id,
+        'subject_id': subject.id, 'faculty_id': teacher.id
+    }])
+    db.commit()
+    return room, teacher, batch
+
+
+def _racing(monkeypatch, module, rival):
+    """Run `rival` right before `module` writes, as another transaction would"""
+    upsert = module.upsert
+
+    def racing_upsert(bind, table):
+        rival(bind)
+        return upsert(bind, table)
+    monkeypatch.setattr(module, 'upsert', racing_upsert)
+
+
+def test_refresh_updates_a_grid_inserted_meanwhile(db, monkeypatch):
+    room, teacher, batch = _institution(db)
+    db.query(TimetableView).delete()
+    _racing(monkeypatch, timetable_views, lambda bind: bind.add(
+        TimetableView(entity='batch', entity_id=batch.id, grid='{}', updated_at=datetime.utcnow())
+    ) or bind.flush())
+
+    refresh_batches(db, [batch.id])
+    db.commit()
+
+    grids = db.query(TimetableView.grid).filter(TimetableView.entity == 'batch').all()
+    assert len(grids) == 1
+    assert json.loads(grids[0][0])['days']['Monday']['09:00-10:00'][0]['faculty_id'] == teacher.id
+
+
+def test_refresh_updates_usage_inserted_meanwhile(db, monkeypatch):
+    room, teacher, batch = _institution(db)
+    _racing(monkeypatch, analytics, lambda bind: bind.add(
+        UsageAggregate(entity='room', entity_id=room.id, day='Monday', time_slot='09:00-10:00', sessions=5)
+    ) or bind.flush())
+
+    refresh_batches(db, [batch.id])
+    db.commit()
+
+    assert db.query(UsageAggregate.sessions).filter(UsageAggregate.entity == 'room').all() == [(1,)]
+
+
+def test_first_read_builds_the_grid_once(db):
+    room, teacher, batch = _institution(db)
+    db.query(TimetableView).delete()
+    db.commit()
+
+    assert get_view(db, 'room', room.id) == get_view(db, 'room', room.id)
+    assert db.query(TimetableView).filter(TimetableView.entity == 'room').count() == 1
+
+
+def test_upserts_compile_to_on_conflict_for_postgresql():
+    engine = create_mock_engine('postgresql://', executor=None)
+    statement = timetable_views.upsert(engine, TimetableView.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['entity', 'entity_id'], set_={'grid': statement.excluded.grid}
+    )
+    sql = str(statement.compile(dialect=engine.dialect))
+    assert 'ON CONFLICT (entity, entity_id) DO UPDATE SET grid = excluded.grid' in sql
+
@@ -0,0 +1,66 @@
+"""
+Warm-starting from the last approved timetable: with unchanged inputs the
+completed hint is that timetable, so the search starts no worse than it, and
+fixed entries keep their slot, room and teacher.
+"""
+import asyncio
+
+from availability import DAYS, TIME_SLOTS
+from models import Batch, Timetable
+from timetable_engine import TimetableGenerator
+
+SOLVER_PARAMS = {'max_time_in_seconds': 20.0, 'num_search_workers': 1}
+
+
+def _generate(db, batch_ids, warm_start):
+    generator = TimetableGenerator(db, solver_params=SOLVER_PARAMS)
+    generator.solver.parameters.stop_after_first_solution = True
+    result = asyncio.run(generator.generate_optimized_timetable(
+        batch_ids, {}, use_ai_suggestions=False, warm_start=warm_start
+    ))
+    return result, generator
+
+
+def _key(row):
+    return row['batch_id'], row['day'], row['time_slot'], row['subject_id'], row['faculty_id']
+
+
+def _hinted_rows(generator):
+    """Slot-level rows of the sessions the model was hinted with"""
+    schedule = generator.recorder.schedule
+    hint = generator.model.Proto().solution_hint
+    hinted = {var for var, value in zip(hint.vars, hint.values) if value == 1}
+    rows = []
+    for i, var in enumerate(schedule.var_index.tolist()):
+        if var in hinted:
+            batch_id, day_idx, time_idx, _, subject_id, faculty_id, length = (
+                int(schedule.columns[name][i]) for name in schedule.KEY_COLUMNS
+            )
+            rows.extend(
+                (batch_id, DAYS[day_idx], TIME_SLOTS[t], subject_id, faculty_id)
+                for t in range(time_idx, time_idx + length)
+            )
+    return rows
+
+
+def test_warm_start_hints_the_approved_timetable(tiny):
+    batch_ids = [batch_id for (batch_id,) in tiny.query(Batch.id)]
+    first, _ = _generate(tiny, batch_ids, warm_start=False)
+    assert first['status'] == 'success'
+    tiny.query(Timetable).update({'is_approved': True})
+    pinned = tiny.query(Timetable).order_by(Timetable.id).limit(3).all()
+    for row in pinned:
+        row.is_fixed = True
+    pinned = [(row.batch_id, row.day, row.time_slot, row.subject_id, row.faculty_id) for row in pinned]
+    tiny.commit()
+
+    second, generator = _generate(tiny, batch_ids, warm_start=True)
+
+    stats = second['metrics']['model_stats']
+    assert second['status'] == 'success'
+    assert stats['warm_start_entries'] == len(first['timetable'])
+    assert stats['warm_start_fixed'] == 3 and stats['hint_completed']
+    assert sorted(_hinted_rows(generator)) == sorted(map(_key, first['timetable']))
+    # Auxiliary terms of the completed hint are tight, so it is never worse than where the cold run ended
+    assert second['solutions'][0]['objective'] <= first['solutions'][-1]['objective']
+    assert sorted(_key(row) for row in second['timetable'] if row.get('is_fixed')) == sorted(pinned)
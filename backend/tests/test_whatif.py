@@ -0,0 +1,86 @@
+"""
+What-if scenarios: delta values are validated before anything is submitted,
+an update of every row caps limits instead of raising rows below them, each
+scenario works on its own copy of the base rows, and a run writes nothing to
+the database.
+"""
+import asyncio
+import pytest
+
+from models import Batch, Classroom, Faculty, Timetable, TimetableView
+from whatif import WhatIfBase, WhatIfDelta, WhatIfRequest, WhatIfScenario, WhatIfSimulator
+
+
+@pytest.fixture
+def base(tiny):
+    return WhatIfBase.load(tiny, [batch_id for (batch_id,) in tiny.query(Batch.id)])
+
+
+@pytest.mark.parametrize('entity, values', [
+    ('classroom', {'capacity': 'large'}),
+    ('classroom', {'capacity': -5}),
+    ('classroom', {'available_slots': 5}),
+    ('classroom', {'available_slots': '["Monday"'}),
+    ('faculty', {'max_daily_classes': None}),
+    ('faculty', {'subject_ids': ['x']}),
+    ('subject', {'lecture_hours': [3]}),
+    ('batch', {'student_count': 'many'}),
+    ('batch', {'credits': 3}),
+])
+def test_bad_values_are_rejected(base, entity, values):
+    with pytest.raises(ValueError, match=next(iter(values))):
+        base.apply([WhatIfDelta(entity=entity, values=values)])
+
+
+def test_values_are_coerced_like_the_api(base):
+    room_id = next(iter(base.rows['classroom']))
+    rows = base.apply([
+        WhatIfDelta(entity='classroom', id=room_id, values={'capacity': '80', 'available_slots': '["Monday"]'}),
+        WhatIfDelta(entity='faculty', action='add', values={'subject_ids': ['1']}),
+    ])
+    assert rows['classroom'][room_id]['capacity'] == 80
+    assert rows['classroom'][room_id]['available_slots'] == base.apply([])['classroom'][room_id]['available_slots'] & 0b11111111
+    added = rows['faculty'][max(rows['faculty'])]
+    assert added['subject_ids'] == [1] and added['max_daily_classes'] == 6
+
+
+def test_limits_of_every_row_are_capped(base):
+    low, high, *_ = base.rows['faculty']
+    base.rows['faculty'][low]['max_daily_classes'] = 2
+    base.rows['faculty'][high]['max_daily_classes'] = 8
+
+    capped = base.apply([WhatIfDelta(entity='faculty', values={'max_daily_classes': 5})])
+    raised = base.apply([WhatIfDelta(entity='faculty', id=low, values={'max_daily_classes': 5})])
+
+    assert capped['faculty'][low]['max_daily_classes'] == 2
+    assert capped['faculty'][high]['max_daily_classes'] == 5
+    assert raised['faculty'][low]['max_daily_classes'] == 5
+
+
+def test_scenarios_do_not_share_rows(base):
+    room_id = next(iter(base.rows['classroom']))
+    capacity = base.rows['classroom'][room_id]['capacity']
+
+    changed = base.apply([WhatIfDelta(entity='classroom', values={'capacity': 1})])
+
+    assert changed['classroom'][room_id]['capacity'] == 1
+    assert base.apply([])['classroom'][room_id]['capacity'] == base.rows['classroom'][room_id]['capacity'] == capacity
+
+
+def test_run_writes_nothing(tiny, base):
+    before = {model: tiny.query(model).count() for model in (Classroom, Faculty, Timetable, TimetableView)}
+    request = WhatIfRequest(
+        batch_ids=list(base.rows['batch']),
+        max_time_in_seconds=2,
+        scenarios=[WhatIfScenario(name='no rooms', deltas=[WhatIfDelta(entity='classroom', action='remove')])]
+    )
+    simulator = WhatIfSimulator(max_workers=2)
+    try:
+        result = asyncio.run(simulator.run(base, request))
+    finally:
+        simulator.shutdown()
+
+    baseline, no_rooms = result['scenarios']
+    assert baseline['name'] == 'baseline' and baseline['solver_status'] is not None
+    assert not no_rooms['feasible'] and no_rooms['conflicts']
+    assert {model: tiny.query(model).count() for model in before} == before
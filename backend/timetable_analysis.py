@@ -0,0 +1,400 @@
+"""
+Deterministic timetable checks on dense occupancy arrays.
+
+A timetable becomes three count tensors, batch / faculty / room x day x slot,
+one bincount each. Double bookings, rooms too small for their batch, faculty
+over their daily limit, idle gaps in a batch's day and rooms that sit mostly
+empty then fall out of a few vectorized passes. Each finding comes with move
+or room-change candidates that create no new clash, respect availability and
+daily limits, and are ranked by what they gain. A campus-sized timetable
+takes milliseconds, so the AI endpoints run this before any model call.
+"""
+from sqlalchemy.orm import Session, defer
+from typing import List, Dict, Any, Iterable, Optional
+import numpy as np
+
+from availability import DAYS, TIME_SLOTS, WeeklyAvailability, slot_matrix
+from models import Batch, Classroom, Faculty, Timetable
+from timetable_engine import LAB_ROOM_TYPES
+from timetable_views import current_rows
+
+# Impact of one unit of each finding: an extra booking in a cell, the share of a
+# batch without a seat, a session over the daily limit, an idle slot, an idle room
+IMPACT_WEIGHTS = {
+    'double_booking': 100,
+    'capacity': 50,
+    'overload': 30,
+    'student_gap': 5,
+    'underused_room': 1
+}
+SEVERITY = {
+    'double_booking': 'high',
+    'capacity': 'high',
+    'overload': 'high',
+    'student_gap': 'medium',
+    'underused_room': 'low'
+}
+# Rooms busy for less than this share of their available slots are reported
+UNDERUSED_ROOM_SHARE = 0.1
+MAX_CANDIDATES = 3
+# Findings past this many (by impact) are reported without candidates
+MAX_FINDINGS_WITH_CANDIDATES = 200
+
+ROW_FIELDS = ('id', 'batch_id', 'day', 'time_slot', 'classroom_id', 'faculty_id', 'subject_id', 'is_fixed')
+CELLS = len(DAYS) * len(TIME_SLOTS)
+
+
+def request_rows(timetable_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Timetable rows of a request body: a 'timetable' list, or 'entries'"""
+    rows = timetable_data.get("timetable", timetable_data.get("entries", []))
+    return [row for row in rows if isinstance(row, dict)] if isinstance(rows, list) else []
+
+
+def _as_dict(row) -> Dict[str, Any]:
+    if isinstance(row, dict):
+        return {field: row.get(field) for field in ROW_FIELDS}
+    return {field: getattr(row, field) for field in ROW_FIELDS}
+
+
+def _gaps(occupied: np.ndarray) -> np.ndarray:
+    """Idle slots between the first and last class, over the last axis of a boolean array"""
+    slots = occupied.shape[-1]
+    count = occupied.sum(axis=-1)
+    first = occupied.argmax(axis=-1)
+    last = slots - 1 - occupied[..., ::-1].argmax(axis=-1)
+    return np.where(count > 0, last - first + 1 - count, 0)
+
+
+def _members(codes: np.ndarray, wanted: np.ndarray) -> List[List[int]]:
+    """Row indices whose code equals each wanted code, with one sort for all of them"""
+    order = np.argsort(codes, kind='stable')
+    ordered = codes[order]
+    starts = np.searchsorted(ordered, wanted, side='left')
+    ends = np.searchsorted(ordered, wanted, side='right')
+    return [order[start:end].tolist() for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+class TimetableAnalysis:
+    def __init__(
+        self,
+        rows: Iterable,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        availability: Optional[WeeklyAvailability] = None
+    ):
+        availability = availability or WeeklyAvailability()
+        day_index = {day: d for d, day in enumerate(DAYS)}
+        slot_index = {time_slot: s for s, time_slot in enumerate(TIME_SLOTS)}
+        self.rows = [
+            row for row in map(_as_dict, rows) if row['day'] in day_index and row['time_slot'] in slot_index
+        ]
+        self.batches = sorted(batches, key=lambda b: b.id)
+        self.classrooms = sorted(classrooms, key=lambda c: c.id)
+        self.faculty = sorted(faculty, key=lambda f: f.id)
+        self.batch_index = {b.id: i for i, b in enumerate(self.batches)}
+        self.room_index = {c.id: i for i, c in enumerate(self.classrooms)}
+        self.faculty_index = {f.id: i for i, f in enumerate(self.faculty)}
+
+        # One array per row field; -1 where the row has no (known) batch, faculty member or room
+        self.day = np.array([day_index[row['day']] for row in self.rows], dtype=np.int64)
+        self.slot = np.array([slot_index[row['time_slot']] for row in self.rows], dtype=np.int64)
+        self.batch = np.array([self.batch_index.get(row['batch_id'], -1) for row in self.rows], dtype=np.int64)
+        self.room = np.array([self.room_index.get(row['classroom_id'], -1) for row in self.rows], dtype=np.int64)
+        self.teacher = np.array([self.faculty_index.get(row['faculty_id'], -1) for row in self.rows], dtype=np.int64)
+        self.fixed = np.array([bool(row['is_fixed']) for row in self.rows], dtype=bool)
+
+        self.sizes = np.array([b.student_count or 0 for b in self.batches], dtype=np.int64)
+        self.capacity = np.array([c.capacity or 0 for c in self.classrooms], dtype=np.int64)
+        self.lab_room = np.array([c.type in LAB_ROOM_TYPES for c in self.classrooms], dtype=bool)
+        self.max_daily = np.array([f.max_daily_classes or 0 for f in self.faculty], dtype=np.int64)
+        self.room_free = slot_matrix([availability.room(c.id) for c in self.classrooms])
+        self.teacher_free = slot_matrix([availability.teacher(f.id) for f in self.faculty])
+
+        self.batch_occupancy = self._occupancy(self.batch, len(self.batches))
+        self.room_occupancy = self._occupancy(self.room, len(self.classrooms))
+        self.teacher_occupancy = self._occupancy(self.teacher, len(self.faculty))
+
+    @classmethod
+    def load(cls, db: Session, rows: Iterable) -> 'TimetableAnalysis':
+        """Analysis of `rows` with the batches and faculty they name and every classroom"""
+        rows = [_as_dict(row) for row in rows]
+        batch_ids = {row['batch_id'] for row in rows}
+        faculty_ids = {row['faculty_id'] for row in rows}
+        batches = db.query(Batch).options(defer(Batch.elective_groups)).filter(Batch.id.in_(batch_ids)).all()
+        classrooms = db.query(Classroom).options(defer(Classroom.available_slots)).all()
+        faculty = db.query(Faculty).options(
+            defer(Faculty.availability), defer(Faculty.assigned_subjects)
+        ).filter(Faculty.id.in_(faculty_ids)).all()
+        return cls(rows, batches, classrooms, faculty, WeeklyAvailability.load(classrooms, faculty))
+
+    def _occupancy(self, index: np.ndarray, size: int) -> np.ndarray:
+        known = index >= 0
+        cells = index[known] * CELLS + self.day[known] * len(TIME_SLOTS) + self.slot[known]
+        return np.bincount(cells, minlength=size * CELLS).reshape(size, len(DAYS), len(TIME_SLOTS))
+
+    def _where(self, i: int, classroom_id: Optional[int] = None, day: Optional[int] = None,
+               slot: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            'day': DAYS[self.day[i] if day is None else day],
+            'time_slot': TIME_SLOTS[self.slot[i] if slot is None else slot],
+            'classroom_id': self.rows[i]['classroom_id'] if classroom_id is None else classroom_id
+        }
+
+    def _moves(self, i: int, gain: float, other_days_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        Cells row i can move to, in its room, without a clash or breaking
+        availability or a daily limit. Each keeps `gain`, less the idle slots it
+        adds to the batch's day (or plus those it removes).
+        """
+        if self.fixed[i]:
+            return []
+        b, r, f, d0, s0 = self.batch[i], self.room[i], self.teacher[i], self.day[i], self.slot[i]
+        free = np.ones((len(DAYS), len(TIME_SLOTS)), dtype=bool)
+        grid = np.zeros((len(DAYS), len(TIME_SLOTS)), dtype=np.int64)
+        if b >= 0:
+            grid = self.batch_occupancy[b].copy()
+            grid[d0, s0] -= 1
+            free &= grid == 0
+        if r >= 0:
+            free &= (self.room_occupancy[r] == 0) & self.room_free[r]
+        if f >= 0:
+            load = self.teacher_occupancy[f].sum(axis=1)
+            load[d0] -= 1
+            free &= (self.teacher_occupancy[f] == 0) & self.teacher_free[f]
+            if self.max_daily[f]:
+                free &= (load < self.max_daily[f])[:, None]
+        if other_days_only:
+            free[d0] = False
+        if not free.any():
+            return []
+
+        # Idle slots of every day with the row added at each slot, against the day without it
+        occupied = grid > 0
+        with_row = occupied[:, None, :] | np.eye(len(TIME_SLOTS), dtype=bool)[None, :, :]
+        added = _gaps(with_row) - _gaps(occupied)[:, None]
+        removed = _gaps(self.batch_occupancy[b] > 0)[d0] - _gaps(occupied)[d0] if b >= 0 else 0
+        gains = gain + IMPACT_WEIGHTS['student_gap'] * (removed - added)
+        gains = np.where(free, gains, -np.inf)
+        best = np.argsort(-gains, axis=None, kind='stable')[:MAX_CANDIDATES]
+        return [
+            {
+                'action': 'move',
+                'timetable_id': self.rows[i]['id'],
+                'from': self._where(i),
+                'to': self._where(i, day=int(d), slot=int(s)),
+                'gain': float(gains[d, s])
+            }
+            for d, s in zip(*np.unravel_index(best, gains.shape)) if np.isfinite(gains[d, s])
+        ]
+
+    def _room_changes(self, i: int, fits: np.ndarray, gains: np.ndarray) -> List[Dict[str, Any]]:
+        """Free, available rooms of the same kind among `fits` for row i, best `gains` first"""
+        # Fixed entries keep their room as well as their slot
+        if self.fixed[i]:
+            return []
+        d, s, r = self.day[i], self.slot[i], self.room[i]
+        usable = fits & (self.room_occupancy[:, d, s] == 0) & self.room_free[:, d, s]
+        if r >= 0:
+            usable &= self.lab_room == self.lab_room[r]
+        best = [c for c in np.argsort(-gains, kind='stable') if usable[c]][:MAX_CANDIDATES]
+        return [
+            {
+                'action': 'change_room',
+                'timetable_id': self.rows[i]['id'],
+                'from': self._where(i),
+                'to': self._where(i, classroom_id=self.classrooms[c].id),
+                'gain': float(gains[c])
+            }
+            for c in best
+        ]
+
+    def _double_bookings(self) -> List[Dict[str, Any]]:
+        findings = []
+        # Faculty names read as they are; batch and room names need their kind
+        for entity, label, index, occupancy, entities in (
+            ('batch', 'Batch ', self.batch, self.batch_occupancy, self.batches),
+            ('faculty', '', self.teacher, self.teacher_occupancy, self.faculty),
+            ('classroom', 'Classroom ', self.room, self.room_occupancy, self.classrooms)
+        ):
+            clashes = np.argwhere(occupancy > 1)
+            cells = np.where(index >= 0, index * CELLS + self.day * len(TIME_SLOTS) + self.slot, -1)
+            wanted = clashes[:, 0] * CELLS + clashes[:, 1] * len(TIME_SLOTS) + clashes[:, 2]
+            for (e, d, s), members in zip(clashes.tolist(), _members(cells, wanted)):
+                count = len(members)
+                findings.append({
+                    'type': 'double_booking',
+                    'message': f"{label}{entities[e].name} has {count} sessions on {DAYS[d]} {TIME_SLOTS[s]}",
+                    'entity': entity,
+                    'entity_id': entities[e].id,
+                    'day': DAYS[d],
+                    'time_slot': TIME_SLOTS[s],
+                    'timetable_ids': [self.rows[i]['id'] for i in members],
+                    'impact': float(IMPACT_WEIGHTS['double_booking'] * (count - 1)),
+                    # The first session keeps the cell; moving any other one resolves a clash
+                    '_candidates': lambda members=members: [
+                        move for i in members[1:] for move in self._moves(i, IMPACT_WEIGHTS['double_booking'])
+                    ]
+                })
+        return findings
+
+    def _capacity(self) -> List[Dict[str, Any]]:
+        placed = (self.batch >= 0) & (self.room >= 0)
+        rows = np.flatnonzero(placed)
+        sizes = self.sizes[self.batch[rows]]
+        capacity = self.capacity[self.room[rows]]
+        over = rows[(capacity > 0) & (sizes > capacity)]
+        findings = []
+        for i in over.tolist():
+            size, room_capacity = int(self.sizes[self.batch[i]]), int(self.capacity[self.room[i]])
+            share = (size - room_capacity) / size
+            # Best fit first: the smallest room that seats the batch
+            gains = IMPACT_WEIGHTS['capacity'] * share - (self.capacity - size) / max(size, 1)
+            findings.append({
+                'type': 'capacity',
+                'message': (
+                    f"Batch {self.batches[self.batch[i]].name} ({size} students) is in "
+                    f"{self.classrooms[self.room[i]].name} ({room_capacity} seats) on "
+                    f"{DAYS[self.day[i]]} {TIME_SLOTS[self.slot[i]]}"
+                ),
+                'timetable_ids': [self.rows[i]['id']],
+                'impact': float(IMPACT_WEIGHTS['capacity'] * share),
+                '_candidates': lambda i=i, gains=gains, size=size: self._room_changes(i, self.capacity >= size, gains)
+            })
+        return findings
+
+    def _overloads(self) -> List[Dict[str, Any]]:
+        load = self.teacher_occupancy.sum(axis=2)
+        excess = np.where(self.max_daily[:, None] > 0, load - self.max_daily[:, None], 0)
+        over = np.argwhere(excess > 0)
+        codes = np.where(self.teacher >= 0, self.teacher * len(DAYS) + self.day, -1)
+        findings = []
+        for (f, d), members in zip(over.tolist(), _members(codes, over[:, 0] * len(DAYS) + over[:, 1])):
+            findings.append({
+                'type': 'overload',
+                'message': (
+                    f"{self.faculty[f].name} teaches {int(load[f, d])} sessions on {DAYS[d]}, "
+                    f"over the limit of {int(self.max_daily[f])}"
+                ),
+                'entity_id': self.faculty[f].id,
+                'day': DAYS[d],
+                'timetable_ids': [self.rows[i]['id'] for i in members],
+                'impact': float(IMPACT_WEIGHTS['overload'] * excess[f, d]),
+                '_candidates': lambda members=members: sorted(
+                    (move for i in members for move in self._moves(i, IMPACT_WEIGHTS['overload'], True)),
+                    key=lambda move: -move['gain']
+                )
+            })
+        return findings
+
+    def _student_gaps(self) -> List[Dict[str, Any]]:
+        gaps = _gaps(self.batch_occupancy > 0)
+        idle = np.argwhere(gaps > 0)
+        codes = np.where(self.batch >= 0, self.batch * len(DAYS) + self.day, -1)
+        findings = []
+        for (b, d), members in zip(idle.tolist(), _members(codes, idle[:, 0] * len(DAYS) + idle[:, 1])):
+            findings.append({
+                'type': 'student_gap',
+                'message': f"Batch {self.batches[b].name} has {int(gaps[b, d])} idle slots on {DAYS[d]}",
+                'entity_id': self.batches[b].id,
+                'day': DAYS[d],
+                'timetable_ids': [self.rows[i]['id'] for i in members],
+                'impact': float(IMPACT_WEIGHTS['student_gap'] * gaps[b, d]),
+                # Only moves that close more idle slots than they open
+                '_candidates': lambda members=members: sorted(
+                    (move for i in members for move in self._moves(i, 0) if move['gain'] > 0),
+                    key=lambda move: -move['gain']
+                )
+            })
+        return findings
+
+    def _underused_rooms(self) -> List[Dict[str, Any]]:
+        available = self.room_free.sum(axis=(1, 2))
+        used = self.room_occupancy.sum(axis=(1, 2))
+        share = np.divide(used, available, out=np.zeros(len(used)), where=available > 0)
+        placed = np.flatnonzero((self.batch >= 0) & (self.room >= 0))
+        findings = []
+        for r in np.flatnonzero((available > 0) & (share < UNDERUSED_ROOM_SHARE)).tolist():
+            findings.append({
+                'type': 'underused_room',
+                'message': (
+                    f"Classroom {self.classrooms[r].name} is used for {int(used[r])} of its "
+                    f"{int(available[r])} available slots"
+                ),
+                'entity_id': self.classrooms[r].id,
+                'timetable_ids': [],
+                'impact': float(IMPACT_WEIGHTS['underused_room']),
+                '_candidates': lambda r=r: self._fill_room(r, placed)
+            })
+        return findings
+
+    def _fill_room(self, r: int, placed: np.ndarray) -> List[Dict[str, Any]]:
+        """Sessions that would waste fewer seats in room r, largest saving first"""
+        sizes = self.sizes[self.batch[placed]]
+        current = self.capacity[self.room[placed]]
+        fits = (
+            ~self.fixed[placed] & (self.room[placed] != r) & (self.capacity[r] >= sizes) & (self.capacity[r] < current)
+            & (self.lab_room[self.room[placed]] == self.lab_room[r])
+            & (self.room_occupancy[r, self.day[placed], self.slot[placed]] == 0)
+            & self.room_free[r, self.day[placed], self.slot[placed]]
+        )
+        savings = np.where(fits, current - self.capacity[r], -1)
+        best = [k for k in np.argsort(-savings, kind='stable')[:MAX_CANDIDATES] if savings[k] > 0]
+        return [
+            {
+                'action': 'change_room',
+                'timetable_id': self.rows[placed[k]]['id'],
+                'from': self._where(placed[k]),
+                'to': self._where(placed[k], classroom_id=self.classrooms[r].id),
+                'gain': float(IMPACT_WEIGHTS['underused_room'] * savings[k] / max(current[k], 1))
+            }
+            for k in best
+        ]
+
+    def findings(self) -> List[Dict[str, Any]]:
+        """Every finding, highest impact first, with candidates for the first MAX_FINDINGS_WITH_CANDIDATES"""
+        findings = (
+            self._double_bookings() + self._capacity() + self._overloads()
+            + self._student_gaps() + self._underused_rooms()
+        )
+        findings.sort(key=lambda finding: -finding['impact'])
+        for n, finding in enumerate(findings):
+            candidates = finding.pop('_candidates')
+            finding['severity'] = SEVERITY[finding['type']]
+            finding['candidates'] = candidates()[:MAX_CANDIDATES] if n < MAX_FINDINGS_WITH_CANDIDATES else []
+        return findings
+
+
+def analyze_request(db: Session, timetable_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Findings for the rows of a request body, or for the current timetables of its batch_ids"""
+    rows = request_rows(timetable_data)
+    if not rows and timetable_data.get('batch_ids'):
+        rows = current_rows(db, timetable_data['batch_ids'])
+    if not rows:
+        return []
+    return TimetableAnalysis.load(db, rows).findings()
+
+
+def findings_to_suggestions(findings: List[Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
+    """The top findings in the shape of AI suggestions"""
+    suggestions = []
+    for finding in findings[:limit]:
+        candidate = finding['candidates'][0] if finding['candidates'] else None
+        if candidate is None:
+            implementation = "No conflict-free move found; needs a manual change or a regeneration"
+        elif candidate['action'] == 'move':
+            implementation = (
+                f"Move timetable entry {candidate['timetable_id']} to "
+                f"{candidate['to']['day']} {candidate['to']['time_slot']}"
+            )
+        else:
+            implementation = (
+                f"Move timetable entry {candidate['timetable_id']} to classroom {candidate['to']['classroom_id']}"
+            )
+        suggestions.append({
+            "type": finding['type'],
+            "priority": finding['severity'],
+            "description": finding['message'],
+            "implementation": implementation
+        })
+    return suggestions
@@ -1,202 +1,1666 @@
 from ortools.sat.python import cp_model
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import json
+import multiprocessing
+import os
+import resource
+import threading
+import time
+import numpy as np
 from sqlalchemy.orm import Session
 from models import *
+from timetable_store import latest_approved, replace_generation
+from timetable_views import current_rows, refresh_batches
+from problem_snapshot import ProblemSnapshot, load_classrooms, load_faculty
+from availability import (
+    DAYS, SESSION_BREAKS, TIME_SLOTS, WeeklyAvailability, block_starts, free_block_starts, is_free
+)
 import asyncio
 
+# Classroom types that can host each kind of session
+LECTURE_ROOM_TYPES = {'lecture', 'seminar'}
+LAB_ROOM_TYPES = {'lab'}
+
+# Lab hours are taught in contiguous blocks of this many slots (the remainder forms a shorter block)
+LAB_BLOCK_SLOTS = 2
+# Soft objective weights, overridable through the request constraints
+DEFAULT_GAP_WEIGHT = 1
+DEFAULT_BALANCE_WEIGHT = 1
+
+# Leave repair neighbourhood: free rooms tried per slot, and the cost of leaving a class out
+REPAIR_ROOM_CANDIDATES = 3
+REPAIR_UNPLACED_PENALTY = 100
+
+# Connected components larger than this are split along Batch.program
+DECOMPOSITION_MAX_CLUSTER_BATCHES = 10
+# Time budget cap for the pass that settles rooms/faculty shared between clusters
+COORDINATION_MAX_SECONDS = 5.0
+
+# Time budget for extending a complete session hint to the auxiliary variables
+HINT_COMPLETION_MAX_SECONDS = 5.0
+
+# Probing in presolve adds millions of implications on the slot cliques and delays the first solution
+PRESOLVE_PROBING_LEVEL = 0
+
+# CP-SAT defaults, overridable per request
+DEFAULT_SOLVER_PARAMS = {
+    'max_time_in_seconds': 60.0,
+    'num_search_workers': 8,
+    'relative_gap_limit': 0.0
+}
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _qualified_faculty(faculty: List[Faculty]) -> Dict[int, List[int]]:
+    """Subject id -> ids of faculty assigned to it, from the faculty_subjects association"""
+    qualified = defaultdict(list)
+    for fac in faculty:
+        for subject in fac.subjects:
+            qualified[subject.id].append(fac.id)
+    return qualified
+
+
+def _batch_subject_ids(batch: Batch, subjects: List[Subject]) -> set:
+    """
+    Subjects a batch takes: an explicit "subjects" list in elective_groups, or
+    else every core subject plus the electives of the groups the batch opted into
+    """
+    preferences = json.loads(batch.elective_groups) if batch.elective_groups else {}
+    if preferences.get('subjects'):
+        return {int(subject_id) for subject_id in preferences['subjects']}
+    groups = set(preferences.get('groups', []))
+    return {s.id for s in subjects if not s.elective_group or s.elective_group in groups}
+
+
+def _decompose_batches(
+    batches: List[Batch],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    max_cluster_batches: int = DECOMPOSITION_MAX_CLUSTER_BATCHES
+) -> List[List[Batch]]:
+    """
+    Group batches into sub-problems. Batches that can be taught by the same
+    faculty end up in the same connected component; components that are still
+    too large are split along Batch.program, leaving the few shared faculty
+    and all shared rooms to the coordination pass.
+    """
+    qualified_faculty = _qualified_faculty(faculty)
+    parent = {batch.id: batch.id for batch in batches}
+    
+    def find(batch_id):
+        while parent[batch_id] != batch_id:
+            parent[batch_id] = parent[parent[batch_id]]
+            batch_id = parent[batch_id]
+        return batch_id
+    
+    first_batch_for = {}
+    for batch in batches:
+        for subject_id in _batch_subject_ids(batch, subjects):
+            for faculty_id in qualified_faculty.get(subject_id, []):
+                if faculty_id in first_batch_for:
+                    parent[find(batch.id)] = find(first_batch_for[faculty_id])
+                else:
+                    first_batch_for[faculty_id] = batch.id
+    
+    components = defaultdict(list)
+    for batch in batches:
+        components[find(batch.id)].append(batch)
+    
+    clusters = []
+    for component in components.values():
+        if len(component) <= max_cluster_batches:
+            clusters.append(component)
+            continue
+        by_program = defaultdict(list)
+        for batch in component:
+            by_program[batch.program].append(batch)
+        clusters.extend(by_program.values())
+    
+    return clusters
+
+
+def _solve_cluster(
+    batches: List[Batch],
+    classrooms: List[Classroom],
+    faculty: List[Faculty],
+    subjects: List[Subject],
+    constraints: Dict[str, Any],
+    availability: WeeklyAvailability,
+    previous: List[Dict[str, Any]],
+    solver_params: Dict[str, Any],
+    cancel_event: Optional[Any]
+) -> Tuple[int, List[Dict[str, Any]], Dict[str, Any]]:
+    """Solve one sub-problem of a decomposed generation inside a pool process"""
+    generator = TimetableGenerator(None, solver_params=solver_params, cancel_event=cancel_event)
+    status, timetable_data = generator._solve_sparse(
+        batches, classrooms, faculty, subjects, constraints, availability, previous
+    )
+    return status, timetable_data, {
+        **generator.model_stats,
+        'solver_stats': generator.solver_stats,
+        'profile': generator.profile
+    }
+
+
+def _room_types(subject: Subject) -> set:
+    """Classroom types that can host the subject's sessions"""
+    room_types = set()
+    if subject.lab_hours:
+        room_types |= LAB_ROOM_TYPES
+    if subject.lecture_hours or not subject.lab_hours:
+        room_types |= LECTURE_ROOM_TYPES
+    return room_types
+
+
+def _room_classes(
+    classrooms: List[Classroom],
+    availability: Optional[WeeklyAvailability] = None,
+    pinned: Optional[set] = None
+) -> Dict[int, List[int]]:
+    """
+    Group interchangeable classrooms (same type, capacity and availability),
+    keyed by the smallest room id of each group, which stands in for the whole group.
+    Pinned rooms (held by fixed entries) always form a group of their own.
+    """
+    availability = availability or WeeklyAvailability()
+    pinned = pinned or set()
+    groups = defaultdict(list)
+    for classroom in sorted(classrooms, key=lambda c: c.id):
+        key = (classroom.type, classroom.capacity or 0, availability.room(classroom.id))
+        if classroom.id in pinned:
+            key += (classroom.id,)
+        groups[key].append(classroom.id)
+    return {room_ids[0]: room_ids for room_ids in groups.values()}
+
+
+def _lab_blocks(lab_hours: int, block_slots: int = LAB_BLOCK_SLOTS) -> List[int]:
+    """Split weekly lab hours into contiguous block lengths, e.g. 5 hours -> [2, 2, 1]"""
+    block_slots = max(1, block_slots)
+    blocks = [block_slots] * (lab_hours // block_slots)
+    if lab_hours % block_slots:
+        blocks.append(lab_hours % block_slots)
+    return blocks
+
+
+class ScheduleModel:
+    """
+    Sparse CP-SAT model: one literal per feasible
+    (batch, day, start slot, classroom, subject, faculty, length) session.
+    The per-resource indexes hold only the literals that touch that resource
+    (a block appears under every slot it covers), so every constraint sums
+    exactly the variables it constrains.
+    With room_classes, classroom_id may be the representative of a group of
+    interchangeable rooms: sessions in such a group also get an optional
+    fixed-size interval for a cumulative constraint, and concrete rooms are
+    handed out after solving.
+    """
+
+    KEY_COLUMNS = ('batch_id', 'day_idx', 'time_idx', 'classroom_id', 'subject_id', 'faculty_id', 'length')
+
+    def __init__(self, model: cp_model.CpModel, room_classes: Optional[Dict[int, List[int]]] = None):
+        self.model = model
+        self.room_classes = room_classes or {}  # representative classroom_id -> classroom ids
+        self.literals = []
+        self.keys = []  # KEY_COLUMNS tuple per literal
+        self.var_index = None  # CP-SAT variable index of each literal, set by freeze()
+        self.columns = {}      # KEY_COLUMNS name -> array parallel to var_index
+        self.by_batch = defaultdict(list)         # (batch_id, day_idx, time_idx) -> literals
+        self.by_room = defaultdict(list)          # (classroom_id, day_idx, time_idx) -> literals
+        self.by_faculty = defaultdict(list)       # (faculty_id, day_idx, time_idx) -> literals
+        self.by_faculty_day = defaultdict(list)   # (faculty_id, day_idx) -> (literal, length)
+        self.intervals_by_room = defaultdict(list)  # representative of a room group -> optional intervals
+        self.num_constraints = 0
+        self.num_terms = 0  # literal occurrences across all constraints
+
+    def add_assignment(self, batch_id: int, day_idx: int, time_idx: int,
+                       classroom_id: int, subject_id: int, faculty_id: int, length: int = 1):
+        name = f'{batch_id}_{day_idx}_{time_idx}_{classroom_id}_{subject_id}_{faculty_id}_{length}'
+        literal = self.model.NewBoolVar(f'schedule_{name}')
+        self.literals.append(literal)
+        self.keys.append((batch_id, day_idx, time_idx, classroom_id, subject_id, faculty_id, length))
+        for slot in range(time_idx, time_idx + length):
+            self.by_batch[(batch_id, day_idx, slot)].append(literal)
+            self.by_room[(classroom_id, day_idx, slot)].append(literal)
+            self.by_faculty[(faculty_id, day_idx, slot)].append(literal)
+        self.by_faculty_day[(faculty_id, day_idx)].append((literal, length))
+        
+        if len(self.room_classes.get(classroom_id, ())) > 1:
+            # Week-long time axis: day_idx * slots per day + slot
+            interval = self.model.NewOptionalFixedSizeIntervalVar(
+                day_idx * len(TIME_SLOTS) + time_idx, length, literal, f'session_{name}'
+            )
+            self.intervals_by_room[classroom_id].append(interval)
+        return literal
+
+    def add_at_most(self, literals: List, limit: int):
+        # A single literal can never violate a bound of one or more
+        if len(literals) > limit:
+            self.model.Add(sum(literals) <= limit)
+            self.num_constraints += 1
+            self.num_terms += len(literals)
+
+    def add_load_limit(self, terms: List[Tuple[Any, int]], limit: int):
+        """Bound the total slots of (literal, length) sessions"""
+        if sum(length for _, length in terms) > limit:
+            self.model.Add(sum(length * literal for literal, length in terms) <= limit)
+            self.num_constraints += 1
+            self.num_terms += len(terms)
+
+    def add_cumulative(self, intervals: List, capacity: int):
+        """At most `capacity` of the intervals may run at the same time"""
+        if len(intervals) > capacity:
+            self.model.AddCumulative(intervals, [1] * len(intervals), capacity)
+            self.num_constraints += 1
+            self.num_terms += len(intervals)
+
+    def freeze(self):
+        """Move the assignment keys into flat NumPy arrays once the model is built"""
+        self.var_index = np.fromiter(
+            (literal.Index() for literal in self.literals), dtype=np.int64, count=len(self.literals)
+        )
+        keys = np.array(self.keys, dtype=np.int64).reshape(-1, len(self.KEY_COLUMNS))
+        self.columns = {name: keys[:, i] for i, name in enumerate(self.KEY_COLUMNS)}
+        self.keys = None
+
+    def selected(self, solution) -> Dict[str, np.ndarray]:
+        """
+        Key columns of the literals set to 1 in a CP-SAT solution vector
+        (response.solution), read in one vectorized pass
+        """
+        values = np.asarray(solution, dtype=np.int64)
+        mask = values[self.var_index] == 1
+        return {name: column[mask] for name, column in self.columns.items()}
+
+    def assign_rooms(self, selected: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Replace room-group representatives with concrete classrooms. A group never
+        hosts more overlapping sessions than it has rooms, so handing rooms out in
+        start order (interval partitioning) always succeeds.
+        """
+        if all(len(room_ids) == 1 for room_ids in self.room_classes.values()):
+            return selected
+        
+        classroom_ids = selected['classroom_id'].copy()
+        free_from = {}  # (classroom_id, day_idx) -> first free slot
+        order = np.lexsort((selected['time_idx'], selected['day_idx'], selected['classroom_id']))
+        for i in order.tolist():
+            day_idx = int(selected['day_idx'][i])
+            start = int(selected['time_idx'][i])
+            representative = int(selected['classroom_id'][i])
+            for classroom_id in self.room_classes.get(representative, [representative]):
+                if free_from.get((classroom_id, day_idx), 0) <= start:
+                    free_from[(classroom_id, day_idx)] = start + int(selected['length'][i])
+                    classroom_ids[i] = classroom_id
+                    break
+        return {**selected, 'classroom_id': classroom_ids}
+
+    def timetable_columns(self, solution) -> Dict[str, np.ndarray]:
+        """Slot-level key columns of a solution, with concrete classrooms"""
+        return _expand_blocks(self.assign_rooms(self.selected(solution)))
+
+
+def _expand_blocks(selected: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Slot-level key columns: every multi-slot block is repeated over the slots it covers"""
+    lengths = selected['length']
+    expanded = {name: np.repeat(column, lengths) for name, column in selected.items() if name != 'length'}
+    # Offset of each expanded row inside its block
+    block_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    expanded['time_idx'] = expanded['time_idx'] + np.arange(len(block_start)) - block_start
+    return expanded
+
+
+def _sessions(
+    rows: List[Dict[str, Any]],
+    classrooms: List[Classroom],
+    lab_block_slots: int = LAB_BLOCK_SLOTS
+) -> List[Dict[str, Any]]:
+    """
+    Slot-level timetable rows grouped back into the sessions the model placed:
+    one per lecture slot, and lab blocks cut from each run of adjacent lab
+    slots the way _lab_blocks splits weekly lab hours. Each session is an
+    entry starting at its first slot, with an id, its 'length' and 'kind'.
+    """
+    lab_rooms = {c.id for c in classrooms if c.type in LAB_ROOM_TYPES}
+    slots = defaultdict(list)  # (batch, subject, faculty, classroom, day, is_fixed) -> time slot indices
+    for row in rows:
+        key = (row['batch_id'], row['subject_id'], row['faculty_id'], row['classroom_id'],
+               row['day'], bool(row.get('is_fixed')))
+        slots[key].append(TIME_SLOTS.index(row['time_slot']))
+    
+    sessions = []
+    for (batch_id, subject_id, faculty_id, classroom_id, day, is_fixed), time_indices in slots.items():
+        kind = 'lab' if classroom_id in lab_rooms else 'lecture'
+        runs = []
+        for time_idx in sorted(time_indices):
+            if runs and time_idx == runs[-1][-1] + 1 and runs[-1][-1] not in SESSION_BREAKS:
+                runs[-1].append(time_idx)
+            else:
+                runs.append([time_idx])
+        for run in runs:
+            lengths = _lab_blocks(len(run), lab_block_slots) if kind == 'lab' else [1] * len(run)
+            offset = 0
+            for length in lengths:
+                sessions.append({
+                    'id': len(sessions),
+                    'batch_id': batch_id,
+                    'day': day,
+                    'time_slot': TIME_SLOTS[run[offset]],
+                    'classroom_id': classroom_id,
+                    'subject_id': subject_id,
+                    'faculty_id': faculty_id,
+                    'is_fixed': is_fixed,
+                    'kind': kind,
+                    'length': length
+                })
+                offset += length
+    return sessions
+
+
+def _session_rows(session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Slot-level timetable rows of a session from _sessions"""
+    start = TIME_SLOTS.index(session['time_slot'])
+    rows = []
+    for time_idx in range(start, start + session['length']):
+        row = {
+            'batch_id': session['batch_id'],
+            'day': session['day'],
+            'time_slot': TIME_SLOTS[time_idx],
+            'classroom_id': session['classroom_id'],
+            'subject_id': session['subject_id'],
+            'faculty_id': session['faculty_id']
+        }
+        if session['is_fixed']:
+            row['is_fixed'] = True
+        rows.append(row)
+    return rows
+
+
+class SolutionRecorder(cp_model.CpSolverSolutionCallback):
+    """
+    Records every improving solution CP-SAT finds (objective, bound, wall time)
+    and streams it to an optional progress queue. Full timetables are attached
+    at most every `rows_interval` seconds to keep large models cheap.
+    """
+
+    def __init__(self, schedule: ScheduleModel, progress: Optional[Any] = None, rows_interval: float = 2.0):
+        super().__init__()
+        self.schedule = schedule
+        self.progress = progress
+        self.rows_interval = rows_interval
+        self.history = []
+        self._last_rows_at = None
+
+    def on_solution_callback(self):
+        solution = {
+            'objective': self.ObjectiveValue(),
+            'bound': self.BestObjectiveBound(),
+            'wall_time': round(self.WallTime(), 3)
+        }
+        self.history.append(solution)
+        
+        if self.progress is None:
+            return
+        
+        event = {'event': 'solution', **solution}
+        if self._last_rows_at is None or solution['wall_time'] - self._last_rows_at >= self.rows_interval:
+            event['timetable'] = _timetable_rows(self.schedule.timetable_columns(self.Response().solution))
+            self._last_rows_at = solution['wall_time']
+        self.progress.put(event)
+
+
+def _timetable_rows(selected: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Turn slot-level key columns (see _expand_blocks) into timetable rows"""
+    return [
+        {
+            'batch_id': batch_id,
+            'day': DAYS[day_idx],
+            'time_slot': TIME_SLOTS[time_idx],
+            'classroom_id': classroom_id,
+            'subject_id': subject_id,
+            'faculty_id': faculty_id
+        }
+        for batch_id, day_idx, time_idx, classroom_id, subject_id, faculty_id in zip(
+            *(selected[name].tolist() for name in ScheduleModel.KEY_COLUMNS[:-1])
+        )
+    ]
+
+
 class TimetableGenerator:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        solver_params: Optional[Dict[str, Any]] = None,
+        cancel_event: Optional[Any] = None,
+        accept_event: Optional[Any] = None,
+        progress: Optional[Any] = None
+    ):
         self.db = db
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
+        self.cancel_event = cancel_event
+        self.accept_event = accept_event
+        self.progress = progress
+        self.solver_params = {**DEFAULT_SOLVER_PARAMS, **(solver_params or {})}
+        self.recorder = None
+        self.lns_history = []
+        self.solution_columns = None
+        self.model_stats = {}
+        self.profile = {}
+        self.solver_stats = {}
+        self._configure_solver(self.solver_params)
+    
+    def _configure_solver(self, params: Dict[str, Any]):
+        """Apply time budget, parallelism and gap limit to the CP-SAT solver"""
+        self.solver.parameters.max_time_in_seconds = float(params['max_time_in_seconds'])
+        self.solver.parameters.num_search_workers = int(params['num_search_workers'])
+        self.solver.parameters.relative_gap_limit = float(params['relative_gap_limit'])
+        self.solver.parameters.cp_model_probing_level = PRESOLVE_PROBING_LEVEL
+    
+    @contextmanager
+    def _phase(self, name: str):
+        """Accumulate wall time per generation phase into self.profile"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.profile[name] = round(self.profile.get(name, 0.0) + time.perf_counter() - start, 4)
+    
+    def _collect_solver_stats(self, status: int) -> Dict[str, Any]:
+        """CP-SAT response statistics of the last solve"""
+        stats = {
+            'status': self.solver.StatusName(status),
+            'conflicts': self.solver.NumConflicts(),
+            'branches': self.solver.NumBranches(),
+            'wall_time': round(self.solver.WallTime(), 4),
+            'objective': None,
+            'bound': None,
+            'relative_gap': None
+        }
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            objective = self.solver.ObjectiveValue()
+            bound = self.solver.BestObjectiveBound()
+            stats.update({
+                'objective': objective,
+                'bound': bound,
+                'relative_gap': round(abs(bound - objective) / max(1.0, abs(objective)), 6)
+            })
+        return stats
+    
+    def _is_cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+    
+    def _is_accepted(self) -> bool:
+        return self.accept_event is not None and self.accept_event.is_set()
+    
+    def _emit(self, event: str, **payload):
+        if self.progress is not None:
+            self.progress.put({'event': event, **payload})
+    
+    def _cancelled_result(self) -> Dict[str, Any]:
+        return {
+            'status': 'cancelled',
+            'message': 'Generation cancelled',
+            'conflicts': [],
+            'suggestions': []
+        }
+    
+    def _solve(self, recorder: Optional[SolutionRecorder] = None) -> int:
+        """Run CP-SAT, stopping the search early if the job is cancelled or its incumbent accepted"""
+        if self.cancel_event is None and self.accept_event is None:
+            return self.solver.Solve(self.model, recorder)
+        
+        finished = threading.Event()
+        
+        def watch_stop_requests():
+            while not finished.is_set():
+                try:
+                    stop = self._is_cancelled() or self._is_accepted()
+                except (EOFError, OSError):
+                    # Job manager went away: treat it as a cancellation
+                    stop = True
+                if stop:
+                    # Keep stopping: a stop issued before Solve() starts its search is ignored
+                    self.solver.StopSearch()
+                finished.wait(0.2)
+        
+        watcher = threading.Thread(target=watch_stop_requests, daemon=True)
+        watcher.start()
+        try:
+            return self.solver.Solve(self.model, recorder)
+        finally:
+            finished.set()
+            watcher.join()
         
     async def generate_optimized_timetable(
         self, 
         batch_ids: List[int], 
         constraints: Dict[str, Any],
-        use_ai_suggestions: bool = True
+        use_ai_suggestions: bool = True,
+        decompose: bool = False,
+        warm_start: bool = False,
+        lns: bool = False
     ) -> Dict[str, Any]:
         """
-        Generate optimized timetable using Constraint Satisfaction Problem (CSP)
+        Generate optimized timetable using Constraint Satisfaction Problem (CSP).
+        With warm_start, the most recent approved timetable of the batches seeds
+        the search and its fixed entries are kept as hard assignments. With lns,
+        a greedy timetable is improved neighbourhood by neighbourhood instead of
+        solving one model of the whole instance (see lns.py).
         """
         
         # Fetch data
-        batches = self.db.query(Batch).filter(Batch.id.in_(batch_ids)).all()
-        classrooms = self.db.query(Classroom).all()
-        faculty = self.db.query(Faculty).all()
-        subjects = self.db.query(Subject).all()
-        
-        # Define time slots (5 days, 8 slots per day)
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-        time_slots = [
-            '09:00-10:00', '10:00-11:00', '11:00-12:00', '12:00-13:00',
-            '14:00-15:00', '15:00-16:00', '16:00-17:00', '17:00-18:00'
-        ]
-        
-        # Create decision variables
-        # schedule[b][d][t][c][s][f] = 1 if batch b has subject s with faculty f in classroom c on day d at time t
-        schedule = {}
+        with self._phase('load'):
+            batches, classrooms, faculty, subjects, availability = self._load_inputs(batch_ids, constraints)
+            previous = latest_approved(self.db, batch_ids) if warm_start else []
         
-        for batch in batches:
-            schedule[batch.id] = {}
-            for day_idx, day in enumerate(days):
-                schedule[batch.id][day_idx] = {}
-                for time_idx, time_slot in enumerate(time_slots):
-                    schedule[batch.id][day_idx][time_idx] = {}
-                    for classroom in classrooms:
-                        schedule[batch.id][day_idx][time_idx][classroom.id] = {}
-                        for subject in subjects:
-                            schedule[batch.id][day_idx][time_idx][classroom.id][subject.id] = {}
-                            for fac in faculty:
-                                schedule[batch.id][day_idx][time_idx][classroom.id][subject.id][fac.id] = \
-                                    self.model.NewBoolVar(f'schedule_{batch.id}_{day_idx}_{time_idx}_{classroom.id}_{subject.id}_{fac.id}')
-        
-        # Constraint 1: Each batch can have at most one class at any time
-        for batch in batches:
-            for day_idx in range(len(days)):
-                for time_idx in range(len(time_slots)):
-                    self.model.Add(
-                        sum(
-                            schedule[batch.id][day_idx][time_idx][c.id][s.id][f.id]
-                            for c in classrooms
-                            for s in subjects
-                            for f in faculty
-                        ) <= 1
-                    )
+        if self._is_cancelled():
+            return self._cancelled_result()
         
-        # Constraint 2: Each classroom can host at most one class at any time
-        for classroom in classrooms:
-            for day_idx in range(len(days)):
-                for time_idx in range(len(time_slots)):
-                    self.model.Add(
-                        sum(
-                            schedule[b.id][day_idx][time_idx][classroom.id][s.id][f.id]
-                            for b in batches
-                            for s in subjects
-                            for f in faculty
-                        ) <= 1
-                    )
-        
-        # Constraint 3: Each faculty can teach at most one class at any time
-        for fac in faculty:
-            for day_idx in range(len(days)):
-                for time_idx in range(len(time_slots)):
-                    self.model.Add(
-                        sum(
-                            schedule[b.id][day_idx][time_idx][c.id][s.id][fac.id]
-                            for b in batches
-                            for c in classrooms
-                            for s in subjects
-                        ) <= 1
-                    )
-        
-        # Constraint 4: Faculty daily workload limit
-        for fac in faculty:
-            for day_idx in range(len(days)):
-                self.model.Add(
-                    sum(
-                        schedule[b.id][day_idx][time_idx][c.id][s.id][fac.id]
-                        for b in batches
-                        for time_idx in range(len(time_slots))
-                        for c in classrooms
-                        for s in subjects
-                    ) <= fac.max_daily_classes
-                )
-        
-        # Constraint 5: Subject-faculty assignment
-        for fac in faculty:
-            assigned_subjects = json.loads(fac.assigned_subjects) if fac.assigned_subjects else []
-            for subject in subjects:
-                if subject.id not in assigned_subjects:
-                    for batch in batches:
-                        for day_idx in range(len(days)):
-                            for time_idx in range(len(time_slots)):
-                                for classroom in classrooms:
-                                    self.model.Add(
-                                        schedule[batch.id][day_idx][time_idx][classroom.id][subject.id][fac.id] == 0
-                                    )
-        
-        # Objective: Maximize classroom utilization and minimize faculty workload variance
-        utilization_vars = []
-        for classroom in classrooms:
-            for day_idx in range(len(days)):
-                for time_idx in range(len(time_slots)):
-                    utilization_vars.append(
-                        sum(
-                            schedule[b.id][day_idx][time_idx][classroom.id][s.id][f.id]
-                            for b in batches
-                            for s in subjects
-                            for f in faculty
-                        )
-                    )
+        # Counting arguments catch most impossible inputs in milliseconds, before any solve
+        with self._phase('diagnose'):
+            conflicts = self._identify_conflicts(
+                batches, classrooms, faculty, subjects, constraints, availability, core=False
+            )
+        if conflicts:
+            return {
+                'status': 'failed',
+                'message': 'The input data admits no timetable',
+                'conflicts': conflicts,
+                'model_stats': self.model_stats,
+                'profile': self.profile,
+                'solver_stats': self.solver_stats,
+                'suggestions': []
+            }
         
-        self.model.Maximize(sum(utilization_vars))
+        clusters = []
+        if decompose and not lns:
+            clusters = _decompose_batches(
+                batches, faculty, subjects,
+                constraints.get('max_cluster_batches', DECOMPOSITION_MAX_CLUSTER_BATCHES)
+            )
         
-        # Solve the model
-        status = self.solver.Solve(self.model)
+        if lns:
+            status, timetable_data = self._solve_lns(
+                batches, classrooms, faculty, subjects, constraints, availability
+            )
+        elif len(clusters) > 1:
+            status, timetable_data = self._solve_decomposed(
+                clusters, classrooms, faculty, subjects, constraints, availability, previous
+            )
+        else:
+            status, timetable_data = self._solve_sparse(
+                batches, classrooms, faculty, subjects, constraints, availability, previous
+            )
         
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            # Extract solution
-            timetable_data = []
-            
-            for batch in batches:
-                for day_idx, day in enumerate(days):
-                    for time_idx, time_slot in enumerate(time_slots):
-                        for classroom in classrooms:
-                            for subject in subjects:
-                                for fac in faculty:
-                                    if self.solver.Value(schedule[batch.id][day_idx][time_idx][classroom.id][subject.id][fac.id]) == 1:
-                                        timetable_data.append({
-                                            'batch_id': batch.id,
-                                            'day': day,
-                                            'time_slot': time_slot,
-                                            'classroom_id': classroom.id,
-                                            'subject_id': subject.id,
-                                            'faculty_id': fac.id
-                                        })
-            
-            # Save to database
-            for entry in timetable_data:
-                timetable_entry = Timetable(**entry)
-                self.db.add(timetable_entry)
-            
-            self.db.commit()
+            # Save to database, replacing the previous unapproved generation
+            with self._phase('persist'):
+                generation_id = replace_generation(self.db, [batch.id for batch in batches], timetable_data)
             
             # Calculate metrics
-            metrics = self._calculate_metrics(timetable_data, classrooms, faculty)
+            with self._phase('metrics'):
+                metrics = self._calculate_metrics(timetable_data, classrooms, faculty, self.solution_columns)
+            metrics['model_stats'] = self.model_stats
+            metrics['persist_seconds'] = self.profile['persist']
+            metrics['profile'] = self.profile
             
             return {
-                'status': 'success',
+                'status': 'cancelled' if self._is_cancelled() else 'success',
+                'generation_id': generation_id,
+                'solver_status': self.solver.StatusName(status),
+                'stopped_early': self._is_cancelled() or self._is_accepted(),
                 'timetable': timetable_data,
                 'metrics': metrics,
+                'solutions': self.recorder.history if self.recorder else self.lns_history,
+                'solver_stats': self.solver_stats,
                 'conflicts': [],
                 'suggestions': []
             }
         
+        elif self._is_cancelled():
+            return self._cancelled_result()
+        
+        elif self.model_stats.get('coordination_unplaced'):
+            return {
+                'status': 'failed',
+                'message': 'The clusters could not share their rooms and faculty; generate without decompose',
+                'conflicts': [
+                    {
+                        'type': 'coordination',
+                        'message': (
+                            f"Batch {session['batch_id']} lost a {session['length']}-slot {session['kind']} "
+                            f"of subject {session['subject_id']} with faculty {session['faculty_id']}"
+                        ),
+                        'severity': 'high',
+                        **session
+                    }
+                    for session in self.model_stats['coordination_unplaced']
+                ],
+                'model_stats': self.model_stats,
+                'profile': self.profile,
+                'solver_stats': self.solver_stats,
+                'suggestions': []
+            }
+        
         else:
             return {
                 'status': 'failed',
                 'message': 'No feasible solution found',
-                'conflicts': self._identify_conflicts(batches, classrooms, faculty, subjects),
+                # A conflicting core needs the monolithic model that LNS exists to avoid
+                'conflicts': self._identify_conflicts(
+                    batches, classrooms, faculty, subjects, constraints, availability, core=not lns
+                ),
+                'model_stats': self.model_stats,
+                'profile': self.profile,
+                'solver_stats': self.solver_stats,
                 'suggestions': []
             }
     
-    def _calculate_metrics(self, timetable_data: List[Dict], classrooms: List[Classroom], faculty: List[Faculty]) -> Dict[str, Any]:
-        """Calculate utilization and workload metrics"""
+    def _load_inputs(self, batch_ids: List[int], constraints: Dict[str, Any]):
+        """Rows a generation reads, plus the availability bitsets for the target week"""
+        snapshot = ProblemSnapshot.load(self.db, batch_ids, constraints.get('week_start'))
+        return snapshot.batches, snapshot.classrooms, snapshot.faculty, snapshot.subjects, snapshot.availability
+    
+    def _solve_sparse(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Optional[Dict[str, Any]] = None,
+        availability: Optional[WeeklyAvailability] = None,
+        previous: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Build the sparse model, solve it and extract the timetable"""
+        
+        # Create decision variables only for feasible assignments
+        with self._phase('build'):
+            schedule = self._build_sparse_model(
+                batches, classrooms, faculty, subjects, constraints, availability, previous
+            )
+        
+        # Solve the model, streaming improving solutions as they are found
+        self._emit('solving', model_stats=self.model_stats)
+        self.recorder = SolutionRecorder(schedule, self.progress)
+        with self._phase('solve'):
+            status = self._solve(self.recorder)
+        self.solver_stats = self._collect_solver_stats(status)
+        
+        if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+            return status, []
+        
+        # Extract solution in one pass over the response; on cancel or timeout this is the last incumbent
+        with self._phase('extract'):
+            self.solution_columns = schedule.timetable_columns(self.solver.ResponseProto().solution)
+            timetable_data = _timetable_rows(self.solution_columns)
+        
+        # Fixed entries were kept as hard assignments; carry the flag over to the new rows
+        fixed = {(e['batch_id'], e['day'], e['time_slot']) for e in previous or [] if e['is_fixed']}
+        for row in timetable_data:
+            if (row['batch_id'], row['day'], row['time_slot']) in fixed:
+                row['is_fixed'] = True
+        
+        return status, timetable_data
+    
+    def _solve_decomposed(
+        self,
+        clusters: List[List[Batch]],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Dict[str, Any],
+        availability: WeeklyAvailability,
+        previous: List[Dict[str, Any]]
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Solve each cluster as its own model on separate cores, then settle shared resources"""
+        
+        workers = min(len(clusters), os.cpu_count() or 1)
+        params = dict(self.solver_params)
+        params['num_search_workers'] = max(1, int(params['num_search_workers']) // workers)
+        
+        self._emit('solving', clusters=[len(cluster) for cluster in clusters])
+        context = multiprocessing.get_context('spawn')
+        with self._phase('solve'), ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    _solve_cluster, cluster, classrooms, faculty, subjects, constraints, availability,
+                    previous, params, self.cancel_event
+                )
+                for cluster in clusters
+            ]
+            results = [future.result() for future in futures]
+        
+        statuses = [status for status, _, _ in results]
+        self.model_stats = {
+            'clusters': len(clusters),
+            'cluster_batches': [len(cluster) for cluster in clusters],
+            'cluster_status': [self.solver.StatusName(status) for status in statuses],
+            'variables': sum(stats['variables'] for _, _, stats in results),
+            'constraints': sum(stats['constraints'] for _, _, stats in results),
+            'build_seconds': max(stats['build_seconds'] for _, _, stats in results),
+            'peak_rss_mb': max(stats['peak_rss_mb'] for _, _, stats in results),
+            'cluster_solve_seconds': self.profile['solve']
+        }
+        # Clusters run side by side, so the slowest one bounds each phase
+        for _, _, stats in results:
+            for phase, seconds in stats['profile'].items():
+                key = f'cluster.{phase}'
+                self.profile[key] = max(self.profile.get(key, 0.0), seconds)
+        
+        cluster_solver_stats = [stats['solver_stats'] for _, _, stats in results]
+        worst_status = next((status for status in statuses if status != cp_model.OPTIMAL), cp_model.OPTIMAL)
+        self.solver_stats = {
+            'status': self.solver.StatusName(worst_status),
+            'conflicts': sum(stats['conflicts'] for stats in cluster_solver_stats),
+            'branches': sum(stats['branches'] for stats in cluster_solver_stats),
+            'wall_time': max(stats['wall_time'] for stats in cluster_solver_stats),
+            'relative_gap': max((stats['relative_gap'] or 0.0) for stats in cluster_solver_stats)
+        }
+        
+        failed = [status for status in statuses if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE]
+        if failed:
+            return failed[0], []
+        
+        # Coordination pass: clusters only share rooms and a few faculty
+        self._emit('coordinating')
+        batches = [batch for cluster in clusters for batch in cluster]
+        timetable_data = [row for _, rows, _ in results for row in rows]
+        with self._phase('coordinate'):
+            timetable_data, moved, unplaced = self._coordinate(
+                timetable_data, batches, classrooms, faculty, subjects, availability,
+                int(constraints.get('lab_block_slots', LAB_BLOCK_SLOTS))
+            )
+        self.model_stats.update({
+            'coordination_moves': moved,
+            'coordination_dropped': len(unplaced),
+            'coordination_unplaced': unplaced,
+            'coordination_seconds': self.profile['coordinate']
+        })
+        
+        # A timetable short of weekly hours is no solution; the caller reports the lost sessions
+        if unplaced:
+            return cp_model.UNKNOWN, []
+        if moved or any(status != cp_model.OPTIMAL for status in statuses):
+            return cp_model.FEASIBLE, timetable_data
+        return cp_model.OPTIMAL, timetable_data
+    
+    def _solve_lns(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Dict[str, Any],
+        availability: WeeklyAvailability
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Greedy timetable improved by large neighbourhood search until the time limit or a stop request"""
+        # lns imports TimetableGenerator and the model helpers from here; at module level the import would be circular
+        from lns import LNS_ITERATION_SECONDS, LNS_MAX_SESSIONS, Instance, LargeNeighbourhoodSearch
+        
+        start = time.perf_counter()
+        deadline = start + float(self.solver_params['max_time_in_seconds'])
+        with self._phase('build'):
+            search = LargeNeighbourhoodSearch(
+                Instance(batches, classrooms, faculty, subjects, constraints, availability),
+                workers=min(int(self.solver_params['num_search_workers']), os.cpu_count() or 1),
+                seed=int(constraints.get('lns_seed', 0)),
+                iteration_seconds=float(constraints.get('lns_iteration_seconds', LNS_ITERATION_SECONDS)),
+                max_sessions=int(constraints.get('lns_max_sessions', LNS_MAX_SESSIONS))
+            )
+        
+        def record():
+            solution = {
+                'objective': search.objective,
+                'bound': None,
+                'wall_time': round(time.perf_counter() - start, 3)
+            }
+            self.lns_history.append(solution)
+            self._emit('solution', **solution)
+        
+        def stop_requested() -> bool:
+            try:
+                return self._is_cancelled() or self._is_accepted()
+            except (EOFError, OSError):
+                return True
+        
+        # The greedy timetable is the first incumbent
+        record()
+        self._emit('solving', model_stats={'sessions': len(search.sessions), 'unplaced': search.unplaced})
+        with self._phase('solve'):
+            search.run(deadline, stop_requested, record)
+        
+        self.model_stats = {
+            'sessions': len(search.sessions),
+            'unplaced': search.unplaced,
+            'lns_initial_objective': search.initial_objective,
+            'lns_max_neighbourhood_sessions': search.max_neighbourhood,
+            **{f'lns_{name}': count for name, count in search.stats.items()}
+        }
+        status = cp_model.FEASIBLE if not search.unplaced else cp_model.UNKNOWN
+        self.solver_stats = {
+            'status': self.solver.StatusName(status),
+            'conflicts': 0,
+            'branches': 0,
+            'wall_time': round(time.perf_counter() - start, 4),
+            'objective': search.objective,
+            'bound': None,
+            'relative_gap': None
+        }
+        if search.unplaced:
+            return status, []
+        
+        with self._phase('extract'):
+            timetable_data = search.timetable_rows()
+        return status, timetable_data
+    
+    def _coordinate(
+        self,
+        timetable_data: List[Dict[str, Any]],
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        availability: WeeklyAvailability,
+        lab_block_slots: int = LAB_BLOCK_SLOTS
+    ) -> Tuple[List[Dict[str, Any]], int, List[Dict[str, Any]]]:
+        """
+        Merge cluster solutions session by session: keep the first use of every
+        room/faculty slot, free each lecture or lab block that clashes or takes
+        its teacher past the daily limit, and re-place it whole, with the teacher
+        its cluster chose, around the rest.
+        Returns the merged rows, the number of moved sessions and the sessions
+        that could not be placed.
+        """
+        
+        sessions = _sessions(timetable_data, classrooms, lab_block_slots)
+        max_daily = {fac.id: fac.max_daily_classes for fac in faculty}
+        used_rooms, used_faculty = set(), set()
+        faculty_load = defaultdict(int)
+        freed = set()
+        
+        for session in sessions:
+            day_idx, start = DAYS.index(session['day']), TIME_SLOTS.index(session['time_slot'])
+            slots = range(start, start + session['length'])
+            if (any((session['classroom_id'], day_idx, t) in used_rooms
+                    or (session['faculty_id'], day_idx, t) in used_faculty for t in slots)
+                    or faculty_load[(session['faculty_id'], day_idx)] + session['length']
+                    > max_daily[session['faculty_id']]):
+                freed.add(session['id'])
+                continue
+            for t in slots:
+                used_rooms.add((session['classroom_id'], day_idx, t))
+                used_faculty.add((session['faculty_id'], day_idx, t))
+            faculty_load[(session['faculty_id'], day_idx)] += session['length']
+        
+        if not freed:
+            return timetable_data, 0, []
+        
+        self.solver.parameters.max_time_in_seconds = min(
+            self.solver.parameters.max_time_in_seconds, COORDINATION_MAX_SECONDS
+        )
+        placements, _ = self._repair_entries(
+            sessions, freed, batches, classrooms, faculty, subjects, availability, keep_faculty=True
+        )
+        placements = placements or {}
+        
+        merged, unplaced = [], []
+        for session in sessions:
+            if session['id'] in freed:
+                placement = placements.get(session['id'])
+                if placement is None:
+                    unplaced.append({
+                        key: session[key] for key in ('batch_id', 'subject_id', 'faculty_id', 'kind', 'length')
+                    })
+                    continue
+                day_idx, time_idx, classroom_id, _ = placement
+                session.update({'day': DAYS[day_idx], 'time_slot': TIME_SLOTS[time_idx], 'classroom_id': classroom_id})
+            merged.extend(_session_rows(session))
+        
+        return merged, len(freed) - len(unplaced), unplaced
+    
+    def reschedule_for_leave(self, leave_id: int, apply: bool = True) -> Dict[str, Any]:
+        """
+        Repair the current timetable after a faculty leave is approved.
+        Every entry that does not involve the absent faculty on the leave day is
+        pinned; only the affected sessions are re-solved on a small neighbourhood
+        model, a lab block moving whole into a lab room and the sessions of one
+        batch, subject and kind sharing a substitute. Entries marked is_fixed
+        keep their slot and room and only get a substitute faculty. Returns the
+        minimal diff of moved entries.
+        """
+        
+        start = time.perf_counter()
+        leave = self.db.query(Leave).filter(Leave.id == leave_id).first()
+        if leave is None or leave.status != 'approved':
+            raise ValueError('Only approved leaves can be rescheduled')
+        
+        weekday = leave.date.weekday()
+        if weekday >= len(DAYS):
+            return {'status': 'success', 'moved': [], 'unresolved': [], 'solve_seconds': 0.0}
+        leave_day = DAYS[weekday]
+        
+        # Superseded generations stay in the table; only what each batch currently shows is repaired
+        rows = current_rows(self.db, {batch_id for (batch_id,) in self.db.query(Timetable.batch_id).distinct()})
+        if not any(row.faculty_id == leave.faculty_id and row.day == leave_day for row in rows):
+            return {'status': 'success', 'moved': [], 'unresolved': [], 'solve_seconds': 0.0}
+        
+        classrooms = load_classrooms(self.db)
+        faculty = load_faculty(self.db)
+        # Lab blocks move as a whole and keep to lab rooms, as in _coordinate
+        sessions = _sessions([{
+            'batch_id': row.batch_id,
+            'day': row.day,
+            'time_slot': row.time_slot,
+            'classroom_id': row.classroom_id,
+            'subject_id': row.subject_id,
+            'faculty_id': row.faculty_id,
+            'is_fixed': row.is_fixed
+        } for row in rows], classrooms)
+        rows_by_slot = {(row.batch_id, row.day, row.time_slot): row for row in rows}
+        session_rows = {
+            session['id']: [rows_by_slot[(row['batch_id'], row['day'], row['time_slot'])]
+                            for row in _session_rows(session)]
+            for session in sessions
+        }
+        affected = {
+            session['id']: session for session in sessions
+            if session['faculty_id'] == leave.faculty_id and session['day'] == leave_day
+        }
+        affected_rows = {row.id: row for session_id in affected for row in session_rows[session_id]}
+        
+        batches = self.db.query(Batch).filter(
+            Batch.id.in_({session['batch_id'] for session in affected.values()})
+        ).all()
+        subjects = self.db.query(Subject).filter(
+            Subject.id.in_({session['subject_id'] for session in affected.values()})
+        ).all()
+        
+        # The new leave plus any other approved leave that week, on top of the standing availability
+        availability = WeeklyAvailability.load(classrooms, faculty, approved_leaves(self.db, leave.date))
+        placements, model_stats = self._repair_entries(
+            sessions, set(affected), batches, classrooms, faculty, subjects, availability
+        )
+        if placements is None:
+            return {
+                'status': 'failed',
+                'message': 'No repair found within the time limit',
+                'moved': [],
+                'unresolved': list(affected_rows),
+                'solve_seconds': round(time.perf_counter() - start, 4)
+            }
+        
+        moved, unresolved = [], []
+        for session_id, session in affected.items():
+            placement = placements[session_id]
+            if placement is None:
+                unresolved.extend(row.id for row in session_rows[session_id])
+                continue
+            
+            day_idx, time_idx, classroom_id, faculty_id = placement
+            for offset, row in enumerate(session_rows[session_id]):
+                moved.append({
+                    'timetable_id': row.id,
+                    'batch_id': row.batch_id,
+                    'subject_id': row.subject_id,
+                    'from': {
+                        'day': row.day,
+                        'time_slot': row.time_slot,
+                        'classroom_id': row.classroom_id,
+                        'faculty_id': row.faculty_id
+                    },
+                    'to': {
+                        'day': DAYS[day_idx],
+                        'time_slot': TIME_SLOTS[time_idx + offset],
+                        'classroom_id': classroom_id,
+                        'faculty_id': faculty_id
+                    }
+                })
+        
+        if apply:
+            for change in moved:
+                row = affected_rows[change['timetable_id']]
+                row.day = change['to']['day']
+                row.time_slot = change['to']['time_slot']
+                row.classroom_id = change['to']['classroom_id']
+                row.faculty_id = change['to']['faculty_id']
+            self.db.flush()
+            refresh_batches(
+                self.db,
+                {change['batch_id'] for change in moved},
+                {change['from']['faculty_id'] for change in moved},
+                {change['from']['classroom_id'] for change in moved}
+            )
+            self.db.commit()
+        
+        return {
+            'status': 'success' if not unresolved else 'partial',
+            'leave_id': leave_id,
+            'moved': moved,
+            'unresolved': unresolved,
+            'model_stats': model_stats,
+            'solve_seconds': round(time.perf_counter() - start, 4)
+        }
+    
+    def _repair_entries(
+        self,
+        entries: List[Dict[str, Any]],
+        freed_ids: set,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        availability: Optional[WeeklyAvailability] = None,
+        keep_faculty: bool = False
+    ) -> Tuple[Optional[Dict[Any, Optional[Tuple[int, int, int, int]]]], Dict[str, Any]]:
+        """
+        Re-place the freed entries around the pinned rest of the timetable,
+        only in slots where both the room and the faculty are available.
+        An entry with a 'length' is a block starting at its time slot and moves
+        as a whole; one with a 'kind' ('lecture' or 'lab') only goes to rooms of
+        that kind. With keep_faculty entries keep their teacher instead of
+        getting a qualified substitute; otherwise the freed entries of one
+        batch, subject and kind all get the same teacher.
+        Returns entry id -> (day_idx, time_idx, classroom_id, faculty_id), or None
+        for an entry that could not be placed; the mapping itself is None when
+        the neighbourhood model could not be solved.
+        """
+        
+        availability = availability or WeeklyAvailability()
+        batches = {b.id: b for b in batches}
+        subjects = {s.id: s for s in subjects}
+        qualified_faculty = _qualified_faculty(faculty)
+        max_daily = {fac.id: fac.max_daily_classes for fac in faculty}
+        
+        # Occupancy of the pinned part of the timetable
+        busy_batch, busy_room, busy_faculty = set(), set(), set()
+        faculty_load = defaultdict(int)
+        for e in entries:
+            if e['id'] in freed_ids:
+                continue
+            day_idx, start = DAYS.index(e['day']), TIME_SLOTS.index(e['time_slot'])
+            length = e.get('length', 1)
+            for time_idx in range(start, start + length):
+                busy_batch.add((e['batch_id'], day_idx, time_idx))
+                busy_room.add((e['classroom_id'], day_idx, time_idx))
+                busy_faculty.add((e['faculty_id'], day_idx, time_idx))
+            faculty_load[(e['faculty_id'], day_idx)] += length
+        
+        # Neighbourhood model: candidate (day, slot, room, faculty) per freed entry
+        schedule = ScheduleModel(self.model)
+        options = defaultdict(list)  # entry id -> [(literal, day_idx, time_idx, classroom_id, faculty_id)]
+        teacher_choice = defaultdict(dict)  # (batch, subject, kind) -> faculty id -> chosen literal
+        cost_terms = []
+        
+        for e in entries:
+            if e['id'] not in freed_ids:
+                continue
+            
+            batch = batches[e['batch_id']]
+            subject = subjects[e['subject_id']]
+            origin = (DAYS.index(e['day']), TIME_SLOTS.index(e['time_slot']))
+            length = e.get('length', 1)
+            room_types = {'lecture': LECTURE_ROOM_TYPES, 'lab': LAB_ROOM_TYPES}.get(e.get('kind')) or _room_types(subject)
+            rooms = sorted(
+                (c for c in classrooms
+                 if c.type in room_types and (c.capacity or 0) >= (batch.student_count or 0)),
+                key=lambda c: (c.id != e['classroom_id'], c.capacity or 0)
+            )
+            teachers = [e['faculty_id']] if keep_faculty else qualified_faculty.get(e['subject_id'], [])
+            group = teacher_choice[(e['batch_id'], e['subject_id'], e.get('kind'))]
+            
+            if e.get('is_fixed'):
+                cells = [origin]
+            else:
+                cells = [(d, t) for d in range(len(DAYS)) for t in block_starts(length)]
+            
+            for day_idx, time_idx in cells:
+                slots = range(time_idx, time_idx + length)
+                if any((e['batch_id'], day_idx, t) in busy_batch for t in slots):
+                    continue
+                # Keep the neighbourhood small: the original room plus the few tightest free fits
+                free_rooms = [
+                    c.id for c in rooms
+                    if not any((c.id, day_idx, t) in busy_room for t in slots)
+                    and is_free(availability.room(c.id), day_idx, time_idx, length)
+                ][:REPAIR_ROOM_CANDIDATES]
+                if e.get('is_fixed'):
+                    free_rooms = [r for r in free_rooms if r == e['classroom_id']]
+                
+                for faculty_id in teachers:
+                    if not is_free(availability.teacher(faculty_id), day_idx, time_idx, length):
+                        continue
+                    if any((faculty_id, day_idx, t) in busy_faculty for t in slots):
+                        continue
+                    if faculty_load[(faculty_id, day_idx)] + length > max_daily[faculty_id]:
+                        continue
+                    for classroom_id in free_rooms:
+                        literal = schedule.add_assignment(
+                            e['batch_id'], day_idx, time_idx, classroom_id, e['subject_id'], faculty_id, length
+                        )
+                        options[e['id']].append((literal, day_idx, time_idx, classroom_id, faculty_id))
+                        if not keep_faculty:
+                            if faculty_id not in group:
+                                group[faculty_id] = self.model.NewBoolVar(
+                                    f"teaches_{e['batch_id']}_{e['subject_id']}_{faculty_id}"
+                                )
+                            self.model.AddImplication(literal, group[faculty_id])
+                        # Minimal diff: a substitute costs less than a new slot, which costs less than a new room
+                        cost = 0
+                        if faculty_id != e['faculty_id']:
+                            cost += 1
+                        if (day_idx, time_idx) != origin:
+                            cost += 2
+                        if classroom_id != e['classroom_id']:
+                            cost += 1
+                        if cost:
+                            cost_terms.append(cost * literal)
+            
+            # Each freed entry is placed at most once; leaving it out is heavily penalised
+            literals = [option[0] for option in options[e['id']]]
+            unplaced = self.model.NewBoolVar(f"unplaced_{e['id']}")
+            self.model.AddExactlyOne(literals + [unplaced])
+            cost_terms.append(REPAIR_UNPLACED_PENALTY * unplaced)
+        
+        for index in (schedule.by_batch, schedule.by_room, schedule.by_faculty):
+            for literals in index.values():
+                schedule.add_at_most(literals, 1)
+        for (faculty_id, day_idx), terms in schedule.by_faculty_day.items():
+            schedule.add_load_limit(terms, max_daily[faculty_id] - faculty_load[(faculty_id, day_idx)])
+        for group in teacher_choice.values():
+            if len(group) > 1:
+                self.model.AddAtMostOne(group.values())
+        
+        self.model.Minimize(sum(cost_terms))
+        status = self._solve()
+        model_stats = {'variables': len(schedule.literals), 'constraints': schedule.num_constraints}
+        if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+            return None, model_stats
+        
+        placements = {}
+        for entry_id in freed_ids:
+            chosen = next((o for o in options[entry_id] if self.solver.Value(o[0]) == 1), None)
+            placements[entry_id] = chosen[1:] if chosen else None
+        
+        return placements, model_stats
+    
+    def _feasible_assignments(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        room_classes: Optional[Dict[int, List[int]]] = None
+    ) -> List[Tuple[int, int, int, int, str]]:
+        """
+        Enumerate (batch, subject, faculty, classroom, kind) tuples that can ever be
+        scheduled: the subject is in the batch's curriculum, the faculty is assigned
+        to it, the room type matches the session kind ('lecture' or 'lab', present
+        only when the subject has hours of that kind) and the room seats the whole batch.
+        With room_classes, only the representative of each room group is enumerated.
+        """
+        
+        if room_classes is not None:
+            classrooms = [c for c in classrooms if c.id in room_classes]
+        qualified_faculty = _qualified_faculty(faculty)
+        curriculum = {batch.id: _batch_subject_ids(batch, subjects) for batch in batches}
+        
+        tuples = []
+        for subject in subjects:
+            faculty_ids = qualified_faculty.get(subject.id)
+            if not faculty_ids:
+                continue
+            
+            for kind, hours, room_types in (
+                ('lecture', subject.lecture_hours, LECTURE_ROOM_TYPES),
+                ('lab', subject.lab_hours, LAB_ROOM_TYPES)
+            ):
+                if not hours:
+                    continue
+                rooms = [c for c in classrooms if c.type in room_types]
+                
+                for batch in batches:
+                    if subject.id not in curriculum[batch.id]:
+                        continue
+                    student_count = batch.student_count or 0
+                    for classroom in rooms:
+                        if (classroom.capacity or 0) < student_count:
+                            continue
+                        for faculty_id in faculty_ids:
+                            tuples.append((batch.id, subject.id, faculty_id, classroom.id, kind))
+        
+        return tuples
+    
+    def _weekly_demand(
+        self,
+        batches: List[Batch],
+        subjects: List[Subject],
+        lab_block_slots: int
+    ) -> Dict[Tuple[int, int, str, int], int]:
+        """
+        (batch_id, subject_id, kind, block length) -> number of sessions the batch
+        must get per week: lecture hours as single slots, lab hours as blocks
+        """
+        demand = {}
+        for batch in batches:
+            curriculum = _batch_subject_ids(batch, subjects)
+            for subject in subjects:
+                if subject.id not in curriculum:
+                    continue
+                if subject.lecture_hours:
+                    demand[(batch.id, subject.id, 'lecture', 1)] = subject.lecture_hours
+                for length in _lab_blocks(subject.lab_hours or 0, lab_block_slots):
+                    key = (batch.id, subject.id, 'lab', length)
+                    demand[key] = demand.get(key, 0) + 1
+        return demand
+    
+    def _build_sparse_model(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Optional[Dict[str, Any]] = None,
+        availability: Optional[WeeklyAvailability] = None,
+        previous: Optional[List[Dict[str, Any]]] = None,
+        assumptions: Optional[Dict[Tuple, Any]] = None
+    ) -> ScheduleModel:
+        """
+        Demand-driven model: every batch gets exactly the weekly lecture hours of
+        each subject it takes, and its lab hours as contiguous blocks. Sessions are
+        optional intervals, so clashes are AddNoOverlap constraints; the objective
+        only scores soft preferences (idle gaps, daily workload balance).
+        Blocks outside the room's or the faculty's availability never get a variable.
+        A previous timetable, if given, becomes the solution hint (see _warm_start).
+        With an `assumptions` dict the model is built for conflict analysis: each
+        requirement and each faculty's daily limit is only enforced under a
+        literal stored there, keyed ('requirement', batch_id, subject_id, kind)
+        or ('workload', faculty_id), and no hint or objective is added.
+        """
+        
+        constraints = constraints or {}
+        availability = availability or WeeklyAvailability()
+        batch_ids = {batch.id for batch in batches}
+        previous = [e for e in previous or [] if e['batch_id'] in batch_ids]
+        lab_block_slots = int(constraints.get('lab_block_slots', LAB_BLOCK_SLOTS))
+        start = time.perf_counter()
+        rss_before = _peak_rss_mb()
+        
+        # Identical rooms share one set of variables; concrete rooms are assigned after solving
+        room_classes = _room_classes(
+            classrooms, availability, {e['classroom_id'] for e in previous if e['is_fixed']}
+        )
+        schedule = ScheduleModel(self.model, room_classes=room_classes)
+        # Constraint 5 (subject-faculty assignment) holds by construction:
+        # unqualified pairs never get a variable
+        with self._phase('build.assignments'):
+            assignments = self._feasible_assignments(batches, classrooms, faculty, subjects, room_classes)
+            demand = self._weekly_demand(batches, subjects, lab_block_slots)
+            block_lengths = defaultdict(list)  # (batch_id, subject_id, kind) -> block lengths
+            for batch_id, subject_id, kind, length in demand:
+                block_lengths[(batch_id, subject_id, kind)].append(length)
+        
+        sessions = defaultdict(list)  # (batch_id, subject_id, kind, length) -> literal positions
+        taught_by = defaultdict(lambda: defaultdict(list))  # (batch_id, subject_id, kind) -> faculty_id -> (literal, length)
+        # Constraint 7: Rooms and faculty are only used in their available slots,
+        # enforced by pruning domains on the intersected bitsets
+        starts = {}  # (free mask, length) -> usable block starts, shared across assignments
+        candidates = 0
+        with self._phase('build.variables'):
+            for batch_id, subject_id, faculty_id, classroom_id, kind in assignments:
+                free = availability.room(classroom_id) & availability.teacher(faculty_id)
+                for length in block_lengths[(batch_id, subject_id, kind)]:
+                    candidates += len(DAYS) * len(block_starts(length))
+                    if (free, length) not in starts:
+                        starts[(free, length)] = list(free_block_starts(free, length))
+                    for day_idx, time_idx in starts[(free, length)]:
+                        literal = schedule.add_assignment(
+                            batch_id, day_idx, time_idx, classroom_id, subject_id, faculty_id, length
+                        )
+                        sessions[(batch_id, subject_id, kind, length)].append(len(schedule.literals) - 1)
+                        taught_by[(batch_id, subject_id, kind)][faculty_id].append((literal, length))
+        
+        # Constraint 0: Exact weekly hours per (batch, subject); a requirement with
+        # no feasible session leaves the model infeasible rather than silently short
+        with self._phase('build.demand'):
+            for key, count in demand.items():
+                constraint = self.model.Add(sum(schedule.literals[i] for i in sessions.get(key, [])) == count)
+                if assumptions is not None:
+                    constraint.OnlyEnforceIf(self._assumption(assumptions, ('requirement',) + key[:3]))
+                schedule.num_constraints += 1
+                schedule.num_terms += len(sessions.get(key, []))
+        
+        # Constraint 6: One faculty teaches all lectures (or all labs) of a subject to a batch
+        with self._phase('build.faculty_choice'):
+            for (batch_id, subject_id, kind), options in taught_by.items():
+                if len(options) < 2:
+                    continue
+                total = sum(
+                    length * demand[(batch_id, subject_id, kind, length)]
+                    for length in block_lengths[(batch_id, subject_id, kind)]
+                )
+                choices = []
+                for faculty_id, terms in options.items():
+                    choice = self.model.NewBoolVar(f'teaches_{batch_id}_{subject_id}_{kind}_{faculty_id}')
+                    self.model.Add(sum(length * literal for literal, length in terms) <= total * choice)
+                    choices.append(choice)
+                self.model.AddExactlyOne(choices)
+                schedule.num_constraints += len(choices) + 1
+        
+        # Constraint 1: Each batch can have at most one class at any time
+        # Constraint 3: Each faculty can teach at most one class at any time
+        # (a block's literal sits in every slot it covers; per-slot at-most-one
+        # presolves far faster than NoOverlap over thousands of unit intervals)
+        for phase, index in (
+            ('build.batch_overlap', schedule.by_batch),
+            ('build.faculty_overlap', schedule.by_faculty)
+        ):
+            with self._phase(phase):
+                for literals in index.values():
+                    schedule.add_at_most(literals, 1)
+        
+        # Constraint 2: Each classroom can host at most one class at any time,
+        # i.e. a room group runs at most as many sessions at once as it has rooms
+        with self._phase('build.room_overlap'):
+            for (classroom_id, day_idx, time_idx), literals in schedule.by_room.items():
+                if len(room_classes[classroom_id]) == 1:
+                    schedule.add_at_most(literals, 1)
+            for representative, intervals in schedule.intervals_by_room.items():
+                schedule.add_cumulative(intervals, len(room_classes[representative]))
+        
+        # Constraint 4: Faculty daily workload limit, counted in slots; the load
+        # variables are shared with the balance objective
+        with self._phase('build.faculty_workload'):
+            max_daily = {fac.id: fac.max_daily_classes for fac in faculty}
+            daily_load = {}  # (faculty_id, day_idx) -> slots taught
+            for (faculty_id, day_idx), terms in schedule.by_faculty_day.items():
+                if assumptions is None:
+                    load = self.model.NewIntVar(0, max_daily[faculty_id], f'load_{faculty_id}_{day_idx}')
+                else:
+                    load = self.model.NewIntVar(0, len(TIME_SLOTS), f'load_{faculty_id}_{day_idx}')
+                    self.model.Add(load <= max_daily[faculty_id]).OnlyEnforceIf(
+                        self._assumption(assumptions, ('workload', faculty_id))
+                    )
+                self.model.Add(load == sum(length * literal for literal, length in terms))
+                daily_load[(faculty_id, day_idx)] = load
+                schedule.num_constraints += 1
+                schedule.num_terms += len(terms)
+        
+        warm_stats = {}
+        hint_completed = False
+        if assumptions is None:
+            preferred = None
+            if previous:
+                with self._phase('build.warm_start'):
+                    preferred, warm_stats = self._warm_start(schedule, previous)
+            
+            with self._phase('build.hint'):
+                placed = self._first_fit_hint(schedule, sessions, demand, max_daily, preferred)
+            
+            with self._phase('build.objective'):
+                self._add_soft_objective(schedule, batches, daily_load, constraints)
+                # Place sessions greedily before optimizing: turning literals on first finds a
+                # complete timetable quickly, the soft objective is then improved from there
+                self.model.AddDecisionStrategy(schedule.literals, cp_model.CHOOSE_FIRST, cp_model.SELECT_MAX_VALUE)
+            
+            with self._phase('build.hint_completion'):
+                hint_completed = self._complete_hint(placed)
+        
+        self.model_stats = {
+            'feasible_assignments': len(assignments),
+            'room_groups': len(room_classes),
+            'required_sessions': sum(demand.values()),
+            'variables': len(schedule.literals),
+            'pruned_variables': candidates - len(schedule.literals),
+            'constraints': schedule.num_constraints,
+            'literals': schedule.num_terms,
+            **availability.free_slots(),
+            **warm_stats,
+            'hint_completed': hint_completed,
+            'build_seconds': round(time.perf_counter() - start, 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'rss_growth_mb': round(_peak_rss_mb() - rss_before, 1)
+        }
+        
+        schedule.freeze()
+        return schedule
+    
+    def _assumption(self, assumptions: Dict[Tuple, Any], label: Tuple):
+        """Literal guarding the constraints named by `label`, created on first use"""
+        if label not in assumptions:
+            assumptions[label] = self.model.NewBoolVar('assume_' + '_'.join(map(str, label)))
+        return assumptions[label]
+    
+    def _first_fit_hint(
+        self,
+        schedule: ScheduleModel,
+        sessions: Dict[Tuple[int, int, str, int], List[int]],
+        demand: Dict[Tuple[int, int, str, int], int],
+        max_daily: Dict[int, int],
+        preferred: Optional[np.ndarray] = None
+    ) -> List:
+        """
+        Hint CP-SAT with a first-fit timetable: long blocks and the requirements
+        with the fewest candidates are placed first, each into the first free
+        slot. Even a partial placement gives the search a near-feasible start.
+        Preferred literals (the previous timetable) are tried before the rest.
+        Returns the placed literals of the requirements that were fully placed.
+        """
+        busy = set()  # ('batch' | 'faculty', id, day_idx, time_idx)
+        room_load = defaultdict(int)  # (classroom_id, day_idx, time_idx) -> sessions in the room group
+        faculty_load = defaultdict(int)  # (faculty_id, day_idx) -> slots
+        teacher = {}  # (batch_id, subject_id, kind) -> faculty_id
+        chosen = np.zeros(len(schedule.literals), dtype=bool)
+        placed = defaultdict(list)  # (batch_id, subject_id, kind) -> placed literal positions
+        short = set()  # (batch_id, subject_id, kind) with sessions left unplaced
+        
+        for key in sorted(demand, key=lambda k: (-k[3], len(sessions.get(k, [])))):
+            batch_id, subject_id, kind, length = key
+            remaining = demand[key]
+            placed_days = set()
+            candidates = sessions.get(key, [])
+            if preferred is not None:
+                candidates = sorted(candidates, key=lambda i: not preferred[i])
+            for i in candidates:
+                if remaining == 0:
+                    break
+                _, day_idx, time_idx, classroom_id, _, faculty_id, _ = schedule.keys[i]
+                # Spread repeated sessions over different days while days are left
+                if day_idx in placed_days and len(placed_days) < len(DAYS) and not (
+                    preferred is not None and preferred[i]
+                ):
+                    continue
+                if teacher.get((batch_id, subject_id, kind), faculty_id) != faculty_id:
+                    continue
+                if faculty_load[(faculty_id, day_idx)] + length > max_daily[faculty_id]:
+                    continue
+                slots = range(time_idx, time_idx + length)
+                capacity = len(schedule.room_classes.get(classroom_id, [classroom_id]))
+                if any(
+                    ('batch', batch_id, day_idx, t) in busy or ('faculty', faculty_id, day_idx, t) in busy
+                    or room_load[(classroom_id, day_idx, t)] >= capacity
+                    for t in slots
+                ):
+                    continue
+                
+                for t in slots:
+                    busy.add(('batch', batch_id, day_idx, t))
+                    busy.add(('faculty', faculty_id, day_idx, t))
+                    room_load[(classroom_id, day_idx, t)] += 1
+                faculty_load[(faculty_id, day_idx)] += length
+                teacher[(batch_id, subject_id, kind)] = faculty_id
+                placed_days.add(day_idx)
+                chosen[i] = True
+                placed[(batch_id, subject_id, kind)].append(i)
+                remaining -= 1
+            if remaining:
+                short.add((batch_id, subject_id, kind))
+        
+        for literal, value in zip(schedule.literals, chosen.tolist()):
+            self.model.AddHint(literal, value)
+        return [
+            schedule.literals[i]
+            for requirement, positions in placed.items() if requirement not in short
+            for i in positions
+        ]
+    
+    def _complete_hint(self, placed: List) -> bool:
+        """
+        Turn the first-fit hint into a complete solution: pin the fully placed
+        requirements in a copy of the model and solve the small remainder (the
+        requirements the greedy pass left short, faculty choice, loads, objective
+        terms). CP-SAT takes a complete, feasible hint as its first solution
+        immediately; a partial one only guides a hint search that can take as
+        long as a cold start.
+        Returns False, keeping the partial hint, when the pinned sessions admit no
+        completion within the time budget.
+        """
+        completion_model = self.model.Clone()
+        completion_model.AddBoolAnd([
+            completion_model.GetBoolVarFromProtoIndex(literal.Index()) for literal in placed
+        ])
+        completion = cp_model.CpSolver()
+        completion.parameters.max_time_in_seconds = HINT_COMPLETION_MAX_SECONDS
+        completion.parameters.num_search_workers = 1
+        completion.parameters.stop_after_first_solution = True
+        status = completion.Solve(completion_model)
+        if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+            return False
+        
+        self.model.ClearHints()
+        for index, value in enumerate(completion.ResponseProto().solution):
+            self.model.AddHint(self.model.GetIntVarFromProtoIndex(index), value)
+        return True
+    
+    def _warm_start(
+        self,
+        schedule: ScheduleModel,
+        previous: List[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, Dict[str, int]]:
+        """
+        Match previous timetable entries to model literals. A literal matches when
+        every slot its block covers held the same subject, faculty and room group
+        for the batch. Fixed entries become hard assignments: one literal covering
+        their slot with the same subject, faculty and room must be selected, so a
+        fixed entry that no longer fits leaves the model infeasible.
+        Returns the matched literals as a boolean mask plus model statistics.
+        """
+        group_of = {room_id: rep for rep, room_ids in schedule.room_classes.items() for room_id in room_ids}
+        held = {}  # (batch_id, day_idx, time_idx) -> (subject_id, faculty_id, room group)
+        fixed = []
+        for e in previous:
+            if e['day'] not in DAYS or e['time_slot'] not in TIME_SLOTS:
+                continue
+            cell = (e['batch_id'], DAYS.index(e['day']), TIME_SLOTS.index(e['time_slot']))
+            held[cell] = (e['subject_id'], e['faculty_id'], group_of.get(e['classroom_id']))
+            if e['is_fixed']:
+                fixed.append(cell)
+        
+        preferred = np.zeros(len(schedule.literals), dtype=bool)
+        covering = defaultdict(list)  # cell -> matched literals covering it
+        for i, (batch_id, day_idx, time_idx, classroom_id, subject_id, faculty_id, length) in enumerate(schedule.keys):
+            cells = [(batch_id, day_idx, t) for t in range(time_idx, time_idx + length)]
+            if all(held.get(cell) == (subject_id, faculty_id, classroom_id) for cell in cells):
+                preferred[i] = True
+                for cell in cells:
+                    covering[cell].append(schedule.literals[i])
+        
+        for cell in fixed:
+            self.model.AddBoolOr(covering[cell])
+            schedule.num_constraints += 1
+            schedule.num_terms += len(covering[cell])
+        
+        return preferred, {
+            'warm_start_entries': len(held),
+            'warm_start_matched': int(preferred.sum()),
+            'warm_start_fixed': len(fixed)
+        }
+    
+    def _add_soft_objective(
+        self,
+        schedule: ScheduleModel,
+        batches: List[Batch],
+        daily_load: Dict[Tuple[int, int], Any],
+        constraints: Dict[str, Any]
+    ):
+        """
+        Minimize idle slots between a batch's classes within a day and, per faculty,
+        the busiest day's load (which spreads teaching evenly across the week)
+        """
+        
+        gap_weight = int(constraints.get('gap_weight', DEFAULT_GAP_WEIGHT))
+        balance_weight = int(constraints.get('balance_weight', DEFAULT_BALANCE_WEIGHT))
+        terms = []
+        
+        if gap_weight:
+            for batch in batches:
+                for day_idx in range(len(DAYS)):
+                    cells = [schedule.by_batch.get((batch.id, day_idx, t), []) for t in range(len(TIME_SLOTS))]
+                    if not any(cells):
+                        continue
+                    # One occupancy literal per slot (batch intervals never overlap, so the sum is 0/1)
+                    busy = []
+                    for time_idx, literals in enumerate(cells):
+                        occupied = self.model.NewBoolVar(f'occupied_{batch.id}_{day_idx}_{time_idx}')
+                        self.model.Add(occupied == sum(literals))
+                        busy.append(occupied)
+                    # Every run of back-to-back classes after the first one of the day follows a gap;
+                    # the lunch break does not count as one
+                    runs = []
+                    for time_idx in range(len(TIME_SLOTS)):
+                        run = self.model.NewBoolVar(f'run_{batch.id}_{day_idx}_{time_idx}')
+                        self.model.Add(run >= busy[time_idx] - (busy[time_idx - 1] if time_idx else 0))
+                        runs.append(run)
+                    active = self.model.NewBoolVar(f'active_{batch.id}_{day_idx}')
+                    self.model.Add(active <= sum(busy))
+                    terms.append(gap_weight * (sum(runs) - active))
+                    schedule.num_constraints += 2 * len(TIME_SLOTS) + 1
+        
+        if balance_weight:
+            by_faculty = defaultdict(list)
+            for (faculty_id, day_idx), load in daily_load.items():
+                by_faculty[faculty_id].append(load)
+            for faculty_id, loads in by_faculty.items():
+                peak = self.model.NewIntVar(0, len(TIME_SLOTS), f'peak_load_{faculty_id}')
+                for load in loads:
+                    self.model.Add(peak >= load)
+                # Redundant averaging cut: the peak is at least the mean daily load, which tightens the bound
+                self.model.Add(len(DAYS) * peak >= sum(loads))
+                terms.append(balance_weight * peak)
+                schedule.num_constraints += len(loads) + 1
+        
+        self.model.Minimize(sum(terms))
+    
+    def _calculate_metrics(
+        self,
+        timetable_data: List[Dict],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        columns: Optional[Dict[str, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """Calculate utilization and workload metrics from the solution's key columns"""
+        
+        if columns is None:
+            columns = {'faculty_id': np.fromiter(
+                (entry['faculty_id'] for entry in timetable_data), dtype=np.int64, count=len(timetable_data)
+            )}
         
         total_slots = len(classrooms) * 5 * 8  # 5 days, 8 slots per day
-        used_slots = len(timetable_data)
+        used_slots = len(columns['faculty_id'])
         
         classroom_utilization = (used_slots / total_slots) * 100
         
         # Faculty workload distribution
-        faculty_workload = {}
-        for entry in timetable_data:
-            fac_id = entry['faculty_id']
-            faculty_workload[fac_id] = faculty_workload.get(fac_id, 0) + 1
+        faculty_ids, counts = np.unique(columns['faculty_id'], return_counts=True)
+        faculty_workload = dict(zip(faculty_ids.tolist(), counts.tolist()))
         
-        avg_workload = sum(faculty_workload.values()) / len(faculty) if faculty else 0
+        avg_workload = used_slots / len(faculty) if faculty else 0
         
         return {
             'classroom_utilization': round(classroom_utilization, 2),
@@ -205,23 +1669,27 @@ class TimetableGenerator:
             'faculty_workload_distribution': faculty_workload
         }
     
-    def _identify_conflicts(self, batches, classrooms, faculty, subjects) -> List[Dict[str, Any]]:
-        """Identify potential conflicts that prevented solution"""
-        conflicts = []
-        
-        # Check for over-constrained resources
-        total_required_slots = sum(
-            json.loads(batch.elective_groups).get('total_hours', 30) 
-            for batch in batches
-        )
-        
-        available_slots = len(classrooms) * 5 * 8
-        
-        if total_required_slots > available_slots:
-            conflicts.append({
-                'type': 'resource_shortage',
-                'message': f'Required {total_required_slots} slots but only {available_slots} available',
-                'severity': 'high'
-            })
-        
-        return conflicts
+    def _identify_conflicts(
+        self,
+        batches: List[Batch],
+        classrooms: List[Classroom],
+        faculty: List[Faculty],
+        subjects: List[Subject],
+        constraints: Optional[Dict[str, Any]] = None,
+        availability: Optional[WeeklyAvailability] = None,
+        core: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Identify conflicts that prevent a solution (see diagnostics.diagnose)"""
+        # diagnostics re-solves with TimetableGenerator to shrink a core, which makes the two modules mutually dependent
+        from diagnostics import diagnose
+        return diagnose(batches, classrooms, faculty, subjects, constraints, availability, core=core)
+    
+    def diagnose(self, batch_ids: List[int], constraints: Dict[str, Any]) -> Dict[str, Any]:
+        """Explain why the batches cannot be scheduled, without a full solve"""
+        start = time.perf_counter()
+        batches, classrooms, faculty, subjects, availability = self._load_inputs(batch_ids, constraints)
+        conflicts = self._identify_conflicts(batches, classrooms, faculty, subjects, constraints, availability)
+        return {
+            'conflicts': conflicts,
+            'seconds': round(time.perf_counter() - start, 4)
+        }
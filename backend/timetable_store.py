@@ -0,0 +1,95 @@
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any
+from datetime import datetime
+import csv
+import io
+import uuid
+
+from models import Timetable
+from timetable_views import batch_entities, refresh_batches
+
+# Columns written for every generated entry, in COPY order
+TIMETABLE_COLUMNS = [
+    'batch_id', 'day', 'time_slot', 'classroom_id', 'subject_id', 'faculty_id',
+    'is_fixed', 'is_approved', 'generation_id', 'created_at'
+]
+
+
+def _copy_rows(db: Session, rows: List[Dict[str, Any]]):
+    """Stream rows through PostgreSQL COPY on the session's own connection/transaction"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in TIMETABLE_COLUMNS])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {Timetable.__tablename__} ({', '.join(TIMETABLE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def replace_generation(db: Session, batch_ids: List[int], entries: List[Dict[str, Any]]) -> str:
+    """
+    Atomically replace the unapproved timetable of `batch_ids` with `entries`.
+    The delete, the bulk insert and the rebuild of the affected dashboard grids
+    share one transaction, so readers see either the previous schedule or the
+    new one, never a half-written mix.
+    Returns the generation id every new row is tagged with.
+    """
+    generation_id = uuid.uuid4().hex
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            **entry,
+            'is_fixed': entry.get('is_fixed', False),
+            'is_approved': False,
+            'generation_id': generation_id,
+            'created_at': created_at
+        }
+        for entry in entries
+    ]
+
+    try:
+        # Faculty and rooms of the rows about to go still show them in their grids
+        stale_faculty, stale_classrooms = batch_entities(db, batch_ids)
+        db.execute(
+            delete(Timetable)
+            .where(Timetable.batch_id.in_(batch_ids), Timetable.is_approved == False)
+            .execution_options(synchronize_session=False)
+        )
+        if rows:
+            if db.get_bind().dialect.name == 'postgresql':
+                _copy_rows(db, rows)
+            else:
+                # Single executemany / multi-row VALUES insert
+                db.execute(insert(Timetable), rows)
+        refresh_batches(db, batch_ids, stale_faculty, stale_classrooms)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return generation_id
+
+
+def latest_approved(db: Session, batch_ids: List[int]) -> List[Dict[str, Any]]:
+    """Entries of the most recent approved generation of each batch"""
+    rows = db.query(Timetable).filter(
+        Timetable.batch_id.in_(batch_ids), Timetable.is_approved == True
+    ).order_by(Timetable.created_at).all()
+    latest = {row.batch_id: row.generation_id for row in rows}
+    return [{
+        'batch_id': row.batch_id,
+        'day': row.day,
+        'time_slot': row.time_slot,
+        'classroom_id': row.classroom_id,
+        'subject_id': row.subject_id,
+        'faculty_id': row.faculty_id,
+        'is_fixed': bool(row.is_fixed)
+    } for row in rows if row.generation_id == latest[row.batch_id]]
@@ -0,0 +1,186 @@
+"""
+Materialized weekly timetable grids per batch, faculty member and room.
+
+Dashboards read one pre-serialized JSON row by (entity, entity_id) instead of
+joining Timetable with four tables on every request. Grids are rebuilt in the
+transaction that saves or approves a timetable (refresh_batches), and built on
+first read for entities that have none yet. The usage aggregates behind the
+reports (see analytics.py) are rewritten alongside.
+
+A grid shows the current timetable of every batch involved: its most recent
+approved generation, or its latest draft while nothing is approved.
+"""
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime
+import json
+
+from analytics import store_usage
+from availability import DAYS, TIME_SLOTS
+from models import Batch, Classroom, Faculty, Timetable, TimetableView, upsert
+
+# View entity -> Timetable column it groups by, and the table the id refers to
+ENTITIES = {
+    'batch': (Timetable.batch_id, Batch),
+    'faculty': (Timetable.faculty_id, Faculty),
+    'room': (Timetable.classroom_id, Classroom)
+}
+
+
+def current_generations(db: Session, batch_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Generation shown for each batch: its latest approved one, else its latest draft"""
+    rows = db.query(
+        Timetable.batch_id, Timetable.generation_id, Timetable.is_approved, func.max(Timetable.created_at)
+    ).filter(
+        Timetable.batch_id.in_(set(batch_ids))
+    ).group_by(Timetable.batch_id, Timetable.generation_id, Timetable.is_approved).all()
+
+    best = {}
+    for batch_id, generation_id, is_approved, created_at in rows:
+        rank = (bool(is_approved), created_at or datetime.min)
+        if batch_id not in best or rank > best[batch_id][0]:
+            best[batch_id] = (rank, generation_id)
+    return {batch_id: generation_id for batch_id, (_, generation_id) in best.items()}
+
+
+def current_rows(db: Session, batch_ids: Iterable[int]) -> List[Timetable]:
+    """Rows of the timetable each batch currently shows"""
+    current = current_generations(db, batch_ids)
+    if not current:
+        return []
+    rows = db.query(Timetable).filter(
+        Timetable.batch_id.in_(current), Timetable.generation_id.in_(set(current.values()))
+    ).all()
+    return [row for row in rows if current[row.batch_id] == row.generation_id]
+
+
+def _entry(row: Timetable) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'batch_id': row.batch_id,
+        'batch_name': row.batch.name if row.batch else None,
+        'subject_id': row.subject_id,
+        'subject_code': row.subject.code if row.subject else None,
+        'subject_name': row.subject.name if row.subject else None,
+        'faculty_id': row.faculty_id,
+        'faculty_name': row.faculty.name if row.faculty else None,
+        'classroom_id': row.classroom_id,
+        'classroom_name': row.classroom.name if row.classroom else None,
+        'is_fixed': bool(row.is_fixed),
+        'is_approved': bool(row.is_approved)
+    }
+
+
+def build_grid(entity: str, entity_id: int, rows: List[Timetable], updated_at: datetime) -> Dict[str, Any]:
+    """day -> time slot -> entries; a list per cell, since drafts of different batches may overlap"""
+    days = {day: {time_slot: [] for time_slot in TIME_SLOTS} for day in DAYS}
+    for row in sorted(rows, key=lambda r: r.id):
+        if row.day in days and row.time_slot in days[row.day]:
+            days[row.day][row.time_slot].append(_entry(row))
+    return {
+        'entity': entity,
+        'entity_id': entity_id,
+        'generation_ids': sorted({row.generation_id for row in rows if row.generation_id}),
+        'updated_at': updated_at.isoformat(),
+        'days': days
+    }
+
+
+def refresh_views(
+    db: Session,
+    batch_ids: Iterable[int] = (),
+    faculty_ids: Iterable[int] = (),
+    classroom_ids: Iterable[int] = ()
+):
+    """
+    Rebuild the grids of the given entities from one eager-loaded query.
+    Does not commit: callers refresh inside the transaction that changed the rows.
+    """
+    wanted = {
+        'batch': {i for i in batch_ids if i is not None},
+        'faculty': {i for i in faculty_ids if i is not None},
+        'room': {i for i in classroom_ids if i is not None}
+    }
+    wanted = {entity: ids for entity, ids in wanted.items() if ids}
+    if not wanted:
+        return
+
+    rows = db.query(Timetable).options(
+        joinedload(Timetable.batch),
+        joinedload(Timetable.classroom),
+        joinedload(Timetable.subject),
+        joinedload(Timetable.faculty)
+    ).filter(or_(*(ENTITIES[entity][0].in_(ids) for entity, ids in wanted.items()))).all()
+    current = current_generations(db, {row.batch_id for row in rows})
+
+    grouped = defaultdict(list)
+    for row in rows:
+        if current.get(row.batch_id) != row.generation_id:
+            continue
+        for entity, (column, _) in ENTITIES.items():
+            entity_id = getattr(row, column.key)
+            if entity_id in wanted.get(entity, ()):
+                grouped[(entity, entity_id)].append(row)
+
+    now = datetime.utcnow()
+    # Upserted in place: concurrent refreshes of one entity never collide on its unique key
+    statement = upsert(db, TimetableView.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['entity', 'entity_id'],
+        set_={'grid': statement.excluded.grid, 'updated_at': statement.excluded.updated_at}
+    )
+    db.execute(statement, [
+        {
+            'entity': entity,
+            'entity_id': entity_id,
+            'grid': json.dumps(build_grid(entity, entity_id, grouped[(entity, entity_id)], now)),
+            'updated_at': now
+        }
+        for entity, ids in wanted.items() for entity_id in ids
+    ])
+    store_usage(db, wanted, grouped)
+
+
+def batch_entities(db: Session, batch_ids: Iterable[int]) -> Tuple[set, set]:
+    """Faculty and classrooms appearing in any timetable row of the batches"""
+    rows = db.query(Timetable.faculty_id, Timetable.classroom_id).filter(
+        Timetable.batch_id.in_(set(batch_ids))
+    ).distinct().all()
+    return {faculty_id for faculty_id, _ in rows}, {classroom_id for _, classroom_id in rows}
+
+
+def refresh_batches(
+    db: Session,
+    batch_ids: Iterable[int],
+    faculty_ids: Iterable[int] = (),
+    classroom_ids: Iterable[int] = ()
+):
+    """
+    Rebuild everything a change to the batches' timetables can show up in: the
+    batches, and every faculty member and room in their rows. Pass the faculty
+    and rooms of rows that were deleted or moved away as extras.
+    """
+    batch_ids = set(batch_ids)
+    faculty, classrooms = batch_entities(db, batch_ids)
+    refresh_views(db, batch_ids, faculty | set(faculty_ids), classrooms | set(classroom_ids))
+
+
+def get_view(db: Session, entity: str, entity_id: int) -> Optional[str]:
+    """Stored JSON grid of an entity, built on first read; None when the entity does not exist"""
+    grid = db.query(TimetableView.grid).filter(
+        TimetableView.entity == entity, TimetableView.entity_id == entity_id
+    ).scalar()
+    if grid is not None:
+        return grid
+
+    model = ENTITIES[entity][1]
+    if db.query(model.id).filter(model.id == entity_id).first() is None:
+        return None
+    ids = {name: [entity_id] if name == entity else [] for name in ENTITIES}
+    refresh_views(db, ids['batch'], ids['faculty'], ids['room'])
+    db.commit()
+    return db.query(TimetableView.grid).filter(
+        TimetableView.entity == entity, TimetableView.entity_id == entity_id
+    ).scalar()
@@ -0,0 +1,419 @@
+"""
+What-if simulation: candidate edits to the classrooms, faculty, subjects and
+batches of a generation, evaluated side by side without writing anything.
+
+The problem is read once into plain rows (WhatIfBase). Each scenario is that
+base with its deltas applied, which takes microseconds and never goes back to
+the database; the rows are then rebuilt as transient ORM objects inside a
+pool process, where the usual counting checks and sparse model run under a
+short time budget. Scenarios share one spawn pool and are solved side by
+side, so a batch of them costs about as much as the slowest one rather than
+the sum, and a loose gap limit lets each stop as soon as its metrics are
+settled.
+
+Deltas name an entity and an action:
+
+    {"entity": "classroom", "action": "add", "values": {"name": "R9", "capacity": 60, "type": "lab"}}
+    {"entity": "faculty", "id": 4, "values": {"subject_ids": [7, 9]}}
+    {"entity": "faculty", "values": {"max_daily_classes": 5}}        every row, capped at 5
+    {"entity": "batch", "id": 2, "action": "remove"}
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy.orm import Session
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Set, Union
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+from availability import FULL_WEEK, WeeklyAvailability, parse_availability
+from models import Batch, Classroom, Faculty, Subject
+from problem_snapshot import ProblemSnapshot
+from timetable_engine import DEFAULT_SOLVER_PARAMS, TimetableGenerator
+
+# Scenarios solved at the same time; each one gets its share of the cores as CP-SAT workers
+WHATIF_WORKERS = int(os.getenv("WHATIF_WORKERS", str(os.cpu_count() or 1)))
+# CP-SAT budget of one scenario unless the request sets its own
+WHATIF_SCENARIO_SECONDS = float(os.getenv("WHATIF_SCENARIO_SECONDS", "10"))
+# A scenario within this relative gap of its bound is good enough to compare
+WHATIF_RELATIVE_GAP = float(os.getenv("WHATIF_RELATIVE_GAP", "0.05"))
+WHATIF_MAX_SCENARIOS = int(os.getenv("WHATIF_MAX_SCENARIOS", "20"))
+
+# Availability columns, replaced by their bitsets in the base rows
+MASK_FIELDS = {"available_slots", "availability"}
+# Limits an update of every row caps at its value, so rows already below it keep theirs
+LIMIT_FIELDS = {"faculty": {"max_daily_classes"}}
+
+# Scalar metrics reported relative to the baseline
+COMPARED_METRICS = ("classroom_utilization", "average_faculty_workload", "total_classes_scheduled", "workload_spread")
+
+
+# The availability JSON forms parse_availability reads, decoded or as text
+Availability = Union[Dict[str, Union[bool, str, List[str]]], List[Union[str, Dict[str, str]]]]
+
+
+class _DeltaValues(BaseModel):
+    """Columns a delta may set; validated here so a bad value is a 400, not a failure in the pool"""
+
+    # Columns an explicit null may clear
+    nullable: ClassVar[Set[str]] = set()
+
+    @field_validator("*")
+    @classmethod
+    def _reject_null(cls, value, info):
+        if value is None and info.field_name not in cls.nullable:
+            raise ValueError("may not be null")
+        return value
+
+    @field_validator(*MASK_FIELDS, "elective_groups", mode="before", check_fields=False)
+    @classmethod
+    def _decode_json_text(cls, value):
+        if isinstance(value, str):
+            try:
+                return json.loads(value) if value else {}
+            except ValueError:
+                raise ValueError("not valid JSON")
+        return value
+
+
+# Fields default to None only so a delta may leave them out; an explicit null is rejected unless nullable
+class ClassroomValues(_DeltaValues):
+    name: Optional[str] = None
+    capacity: Optional[int] = Field(None, ge=0)
+    type: Optional[str] = None
+    available_slots: Optional[Availability] = None
+
+
+class FacultyValues(_DeltaValues):
+    name: Optional[str] = None
+    max_daily_classes: Optional[int] = Field(None, ge=0)
+    availability: Optional[Availability] = None
+    subject_ids: Optional[List[int]] = None
+
+
+class SubjectValues(_DeltaValues):
+    nullable: ClassVar[Set[str]] = {"code", "elective_group"}
+
+    name: Optional[str] = None
+    code: Optional[str] = None
+    lecture_hours: Optional[int] = Field(None, ge=0)
+    lab_hours: Optional[int] = Field(None, ge=0)
+    elective_group: Optional[str] = None
+
+
+class BatchValues(_DeltaValues):
+    nullable: ClassVar[Set[str]] = {"program", "semester", "elective_groups"}
+
+    name: Optional[str] = None
+    program: Optional[str] = None
+    semester: Optional[int] = None
+    student_count: Optional[int] = Field(None, ge=0)
+    elective_groups: Optional[Union[Dict[str, Any], List[Any]]] = None
+
+
+VALUE_MODELS = {
+    "classroom": ClassroomValues,
+    "faculty": FacultyValues,
+    "subject": SubjectValues,
+    "batch": BatchValues,
+}
+# Columns a delta may set, per entity; the JSON columns are given as their decoded values
+EDITABLE_FIELDS = {entity: set(model.model_fields) for entity, model in VALUE_MODELS.items()}
+
+
+class WhatIfDelta(BaseModel):
+    entity: Literal["classroom", "faculty", "subject", "batch"]
+    action: Literal["add", "update", "remove"] = "update"
+    # Without an id an update applies to every row of the entity, capping its LIMIT_FIELDS
+    id: Optional[int] = None
+    values: Dict[str, Any] = {}
+
+
+class WhatIfScenario(BaseModel):
+    name: str
+    deltas: List[WhatIfDelta] = []
+    # Merged over the request constraints
+    constraints: Dict[str, Any] = {}
+
+
+class WhatIfRequest(BaseModel):
+    batch_ids: List[int]
+    constraints: Dict[str, Any] = {}
+    scenarios: List[WhatIfScenario] = Field(..., min_length=1, max_length=WHATIF_MAX_SCENARIOS)
+    max_time_in_seconds: float = Field(WHATIF_SCENARIO_SECONDS, gt=0, le=120)
+    # Also evaluate the unchanged data, as the reference of the comparison
+    include_baseline: bool = True
+
+
+def _columns(row, names) -> Dict[str, Any]:
+    return {name: getattr(row, name) for name in names}
+
+
+class WhatIfBase:
+    """Plain rows of one generation's inputs, the shared starting point of every scenario"""
+
+    def __init__(self, rows: Dict[str, Dict[int, Dict[str, Any]]]):
+        self.rows = rows
+
+    @classmethod
+    def load(cls, db: Session, batch_ids: List[int], week_start: Optional[str] = None) -> 'WhatIfBase':
+        snapshot = ProblemSnapshot.load(db, batch_ids, week_start)
+        availability = snapshot.availability
+        rows = {
+            "classroom": {
+                room.id: {
+                    **_columns(room, ("id", "name", "capacity", "type")),
+                    "available_slots": availability.room(room.id)
+                }
+                for room in snapshot.classrooms
+            },
+            "faculty": {
+                fac.id: {
+                    **_columns(fac, ("id", "name", "max_daily_classes")),
+                    "availability": availability.teacher(fac.id),
+                    "subject_ids": [subject.id for subject in fac.subjects],
+                    # Weekdays cleared by approved leaves stay cleared when the availability is edited
+                    "leave_mask": _stored_mask(fac.availability_mask, fac.availability) & ~availability.teacher(fac.id)
+                }
+                for fac in snapshot.faculty
+            },
+            "subject": {
+                subject.id: _columns(subject, ("id", "name", "code", "lecture_hours", "lab_hours", "elective_group"))
+                for subject in snapshot.subjects
+            },
+            "batch": {
+                batch.id: _columns(batch, ("id", "name", "program", "semester", "student_count", "elective_groups"))
+                for batch in snapshot.batches
+            },
+        }
+        return cls(rows)
+
+    def apply(self, deltas: List[WhatIfDelta]) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        """Rows of a scenario; raises ValueError for deltas that do not fit the data"""
+        rows = {entity: {row_id: dict(row) for row_id, row in table.items()} for entity, table in self.rows.items()}
+        for delta in deltas:
+            table = rows[delta.entity]
+            unknown = set(delta.values) - EDITABLE_FIELDS[delta.entity]
+            if unknown:
+                raise ValueError(f"Cannot set {', '.join(sorted(unknown))} on {delta.entity}")
+            values = _decode(delta.entity, _validate(delta.entity, delta.values))
+
+            if delta.action == "add":
+                new_id = delta.id if delta.id is not None else max(table, default=0) + 1
+                if new_id in table:
+                    raise ValueError(f"{delta.entity} {new_id} already exists")
+                table[new_id] = {**_defaults(delta.entity), **values, "id": new_id}
+                continue
+
+            if delta.id is not None and delta.id not in table:
+                raise ValueError(f"{delta.entity} {delta.id} not found")
+            targets = [delta.id] if delta.id is not None else list(table)
+            if delta.action == "remove":
+                for row_id in targets:
+                    del table[row_id]
+            else:
+                capped = LIMIT_FIELDS.get(delta.entity, set()) & set(values) if delta.id is None else set()
+                for row_id in targets:
+                    row = table[row_id]
+                    row.update({field: value for field, value in values.items() if field not in capped})
+                    for field in capped:
+                        row[field] = values[field] if row[field] is None else min(row[field], values[field])
+
+        # Removed subjects are no longer taught by anyone
+        for fac in rows["faculty"].values():
+            fac["subject_ids"] = [subject_id for subject_id in fac["subject_ids"] if subject_id in rows["subject"]]
+        return rows
+
+
+def _stored_mask(mask: Optional[int], raw: Optional[str]) -> int:
+    return mask if mask is not None else parse_availability(raw)
+
+
+def _validate(entity: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    """The values a delta sets, checked and coerced by the entity's model; raises ValueError"""
+    try:
+        validated = VALUE_MODELS[entity].model_validate(values)
+    except ValidationError as e:
+        errors = "; ".join(f"{error['loc'][0]}: {error['msg']}" for error in e.errors())
+        raise ValueError(f"Invalid {entity} values: {errors}")
+    # Only the given fields: the rest keep the row's values, or the defaults of an added row
+    return validated.model_dump(exclude_unset=True)
+
+
+def _decode(entity: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Delta values in the form of the base rows: bitsets for availability, JSON text for elective groups"""
+    decoded = dict(values)
+    for field in MASK_FIELDS & set(decoded):
+        value = decoded[field]
+        decoded[field] = parse_availability(value if isinstance(value, str) else json.dumps(value))
+    if entity == "batch" and isinstance(decoded.get("elective_groups"), (dict, list)):
+        decoded["elective_groups"] = json.dumps(decoded["elective_groups"])
+    return decoded
+
+
+def _defaults(entity: str) -> Dict[str, Any]:
+    """Column defaults of added rows, as the models define them"""
+    return {
+        "classroom": {"name": "New classroom", "capacity": 0, "type": "lecture", "available_slots": FULL_WEEK},
+        "faculty": {
+            "name": "New faculty", "max_daily_classes": 6, "availability": FULL_WEEK,
+            "subject_ids": [], "leave_mask": 0
+        },
+        "subject": {"name": "New subject", "code": None, "lecture_hours": 0, "lab_hours": 0, "elective_group": None},
+        "batch": {"name": "New batch", "program": None, "semester": None, "student_count": 0, "elective_groups": None},
+    }[entity]
+
+
+def _materialize(rows: Dict[str, Dict[int, Dict[str, Any]]]):
+    """Transient ORM objects and availability bitsets of a scenario, as ProblemSnapshot.load returns them"""
+    subjects = {row_id: Subject(**row) for row_id, row in rows["subject"].items()}
+    classrooms = []
+    room_masks = {}
+    for row in rows["classroom"].values():
+        room = {name: value for name, value in row.items() if name != "available_slots"}
+        classrooms.append(Classroom(**room, availability_mask=row["available_slots"]))
+        room_masks[row["id"]] = row["available_slots"]
+    faculty = []
+    faculty_masks = {}
+    for row in rows["faculty"].values():
+        fac = Faculty(
+            id=row["id"], name=row["name"], max_daily_classes=row["max_daily_classes"],
+            availability_mask=row["availability"]
+        )
+        fac.subjects = [subjects[subject_id] for subject_id in row["subject_ids"]]
+        faculty.append(fac)
+        faculty_masks[row["id"]] = row["availability"] & ~row["leave_mask"]
+    batches = [Batch(**row) for row in rows["batch"].values()]
+    return batches, classrooms, faculty, list(subjects.values()), WeeklyAvailability(room_masks, faculty_masks)
+
+
+def _workload_spread(metrics: Dict[str, Any], faculty: List[Faculty]) -> Dict[str, Any]:
+    """Spread of the classes per faculty member, counting the qualified faculty left without classes"""
+    distribution = metrics["faculty_workload_distribution"]
+    loads = np.array([distribution.get(fac.id, 0) for fac in faculty if fac.subjects], dtype=np.int64)
+    if not len(loads):
+        return {"workload_spread": 0, "workload_stddev": 0.0}
+    return {
+        "workload_spread": int(loads.max() - loads.min()),
+        "workload_stddev": round(float(loads.std()), 2)
+    }
+
+
+def evaluate_scenario(
+    rows: Dict[str, Dict[int, Dict[str, Any]]],
+    constraints: Dict[str, Any],
+    solver_params: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Solve one scenario inside a pool process; nothing is persisted"""
+    start = time.perf_counter()
+    batches, classrooms, faculty, subjects, availability = _materialize(rows)
+    generator = TimetableGenerator(None, solver_params=solver_params)
+
+    conflicts = generator._identify_conflicts(
+        batches, classrooms, faculty, subjects, constraints, availability, core=False
+    )
+    if conflicts:
+        return {
+            'feasible': False,
+            'solver_status': None,
+            'conflicts': conflicts,
+            'metrics': None,
+            'model_stats': {},
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+    status, timetable_data = generator._solve_sparse(
+        batches, classrooms, faculty, subjects, constraints, availability
+    )
+    feasible = status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+    metrics = None
+    if feasible:
+        metrics = generator._calculate_metrics(timetable_data, classrooms, faculty, generator.solution_columns)
+        metrics.update(_workload_spread(metrics, faculty))
+    return {
+        'feasible': feasible,
+        'solver_status': generator.solver.StatusName(status),
+        'conflicts': [],
+        'metrics': metrics,
+        'model_stats': generator.model_stats,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def _compare(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not baseline or not baseline['metrics'] or not result['metrics']:
+        return None
+    return {
+        name: round(result['metrics'][name] - baseline['metrics'][name], 2)
+        for name in COMPARED_METRICS
+    }
+
+
+class WhatIfSimulator:
+    """
+    Evaluates scenarios in a process pool of its own, so a batch of what-ifs
+    never queues behind (or ahead of) real generations in the job pool.
+    """
+
+    def __init__(self, max_workers: int = WHATIF_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_started(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the API process runs threads and an event loop
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._executor
+
+    async def run(self, base: WhatIfBase, request: WhatIfRequest) -> Dict[str, Any]:
+        """Side-by-side results of the baseline and every scenario, in request order"""
+        scenarios = list(request.scenarios)
+        if request.include_baseline:
+            scenarios.insert(0, WhatIfScenario(name="baseline"))
+        # Validate every scenario before any solve starts
+        scenario_rows = [base.apply(scenario.deltas) for scenario in scenarios]
+
+        concurrent = min(len(scenarios), self.max_workers)
+        solver_params = {
+            **DEFAULT_SOLVER_PARAMS,
+            'max_time_in_seconds': request.max_time_in_seconds,
+            'num_search_workers': max(1, (os.cpu_count() or 1) // concurrent),
+            'relative_gap_limit': WHATIF_RELATIVE_GAP
+        }
+
+        start = time.perf_counter()
+        executor = self._ensure_started()
+        futures = [
+            executor.submit(
+                evaluate_scenario, rows, {**request.constraints, **scenario.constraints}, solver_params
+            )
+            for scenario, rows in zip(scenarios, scenario_rows)
+        ]
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+        baseline = results[0] if request.include_baseline else None
+        return {
+            'scenarios': [
+                {'name': scenario.name, **result, 'change': _compare(result, baseline)}
+                for scenario, result in zip(scenarios, results)
+            ],
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+whatif_simulator = WhatIfSimulator()